@@ -1,11 +1,16 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# Optional seed for the PyTensor compile cache (`python -m bea_bad warmup --compiledir build/pytensor_cache`).
+# It only hits when the exe runs from the same install path it was warmed at; otherwise the app
+# compiles the models in the background on first launch (see bea_bad/compilecache.py).
+datas = [('build/pytensor_cache', 'pytensor_cache')] if os.path.isdir('build/pytensor_cache') else []
 
 a = Analysis(
     ['app_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=datas,
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -1,14 +1,19 @@
 # app_gui.py  (Windows GUI launcher for BEA→BAD, with tunable sampling settings)
-import sys
+import multiprocessing
+import time
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 
 
 def browse_csv(var):
     p = filedialog.askopenfilename(
-        title="Select CSV file",
-        filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        title="Select input table",
+        filetypes=[
+            ("Tables", "*.csv *.parquet *.feather *.xlsx"),
+            ("CSV files", "*.csv"),
+            ("All files", "*.*"),
+        ]
     )
     if p:
         var.set(p)
@@ -42,7 +47,32 @@ def _parse_float(name: str, value: str, min_v=None, max_v=None) -> float:
     return v
 
 
-def run_pipeline():
+# Current run (bea_bad.progress.PipelineWorker) and progress display state
+_worker = None
+_fit_state = {}
+_cancel_time = None
+_warmup = None          # background compile-cache warm-up (bea_bad.compilecache.warmup_worker)
+POLL_MS = 200
+CANCEL_GRACE_S = 30.0   # terminate the worker if it has not stopped this long after Cancel
+
+
+def _fmt_s(seconds) -> str:
+    if seconds is None:
+        return "–"
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+    if seconds >= 60:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds} s"
+
+
+def run_pipeline(preview: bool = False):
+    """Start a full run, or with preview=True the ~1 s approximate quick look (no MCMC)."""
+    global _worker, _cancel_time
+    if _worker is not None and _worker.is_alive():
+        return
+
     zircon = zircon_var.get().strip()
     tiepoints = tiepoints_var.get().strip()
     outdir = outdir_var.get().strip() or "out"
@@ -64,115 +94,290 @@ def run_pipeline():
         max_span_ma = _parse_float("Max span (Ma)", max_span_var.get(), 0.0, 100.0)
         depth_sigma_m = _parse_float("Depth sigma (m)", depth_sigma_var.get(), 0.0, 10.0)
         target_accept = _parse_float("target_accept", target_accept_var.get(), 0.6, 0.999)
-
-        no_bootstrap = bool(no_bootstrap_var.get())
-
-        # Call the internal CLI entry point
-        from bea_bad.cli import main
-
-        # Build argv
-        argv = [
-            "bea_bad",
-            "--zircon", zircon,
-            "--tiepoints", tiepoints,
-            "--outdir", outdir,
-
-            "--bea_draws", str(bea_draws),
-            "--bea_tune", str(bea_tune),
-            "--bad_draws", str(bad_draws),
-            "--bad_tune", str(bad_tune),
-
-            "--max_span_ma", str(max_span_ma),
-            "--depth_sigma_m", str(depth_sigma_m),
-        ]
-
-        # If your cli.py doesn't have --target_accept yet, either add it there,
-        # or remove these two lines.
-        argv += ["--target_accept", str(target_accept)]
-
-        if no_bootstrap:
-            argv.append("--no_bootstrap_prior")
-
-        sys.argv = argv
-        main()
-
-        messagebox.showinfo("Done", f"Finished!\nOutputs saved to:\n{Path(outdir).resolve()}")
-
+        ess_target = _parse_float("Target ESS", ess_target_var.get(), 50.0, 100000.0)
+        sedrate_corr_m = _parse_float("Rate corr. (m)", sedrate_corr_var.get(), 0.0)
+        if sedrate_corr_m > 0 and bad_model_var.get() != "scalable":
+            raise ValueError("Rate corr. > 0 needs the 'scalable' BAD model.")
     except Exception as e:
         messagebox.showerror("Error", str(e))
+        return
 
+    # Typed pipeline API, run in a separate process so the window stays responsive
+    from bea_bad.cli import PipelineConfig
+    from bea_bad.progress import PipelineWorker
+
+    config = PipelineConfig(
+        zircon=zircon,
+        tiepoints=tiepoints,
+        outdir=outdir,
+        bea_draws=bea_draws,
+        bea_tune=bea_tune,
+        bad_draws=bad_draws,
+        bad_tune=bad_tune,
+        max_span_ma=max_span_ma,
+        depth_sigma_m=depth_sigma_m,
+        target_accept=target_accept,
+        no_bootstrap_prior=bool(no_bootstrap_var.get()),
+        sampler=sampler_var.get(),
+        bad_model=bad_model_var.get(),
+        sedrate_corr_m=sedrate_corr_m,
+        adaptive=bool(adaptive_var.get()),
+        ess_target=ess_target,
+        resume=bool(resume_var.get()),
+        preview=preview,
+    )
 
-# --- GUI layout ---
-root = tk.Tk()
-root.title("BEA → BAD (Bayesian eruption age + age–depth)")
-root.geometry("860x420")
-
-zircon_var = tk.StringVar()
-tiepoints_var = tk.StringVar()
-outdir_var = tk.StringVar(value="out")
-
-# Defaults (sane for a first run)
-bea_draws_var = tk.StringVar(value="2000")
-bea_tune_var = tk.StringVar(value="2000")
-bad_draws_var = tk.StringVar(value="3000")
-bad_tune_var = tk.StringVar(value="3000")
-
-max_span_var = tk.StringVar(value="1.0")
-depth_sigma_var = tk.StringVar(value="0.03")
-target_accept_var = tk.StringVar(value="0.9")
-
-no_bootstrap_var = tk.IntVar(value=0)
-
-padx = 10
-pady = 8
-
-# ---- Inputs frame
-inputs = tk.LabelFrame(root, text="Inputs", padx=10, pady=10)
-inputs.pack(fill="x", padx=10, pady=10)
-
-tk.Label(inputs, text="Zircon CSV").grid(row=0, column=0, sticky="w", padx=padx, pady=pady)
-tk.Entry(inputs, textvariable=zircon_var, width=78).grid(row=0, column=1, padx=padx, pady=pady)
-tk.Button(inputs, text="Browse", command=lambda: browse_csv(zircon_var)).grid(row=0, column=2, padx=padx, pady=pady)
-
-tk.Label(inputs, text="Tiepoints CSV").grid(row=1, column=0, sticky="w", padx=padx, pady=pady)
-tk.Entry(inputs, textvariable=tiepoints_var, width=78).grid(row=1, column=1, padx=padx, pady=pady)
-tk.Button(inputs, text="Browse", command=lambda: browse_csv(tiepoints_var)).grid(row=1, column=2, padx=padx, pady=pady)
-
-tk.Label(inputs, text="Output folder").grid(row=2, column=0, sticky="w", padx=padx, pady=pady)
-tk.Entry(inputs, textvariable=outdir_var, width=78).grid(row=2, column=1, padx=padx, pady=pady)
-tk.Button(inputs, text="Browse", command=lambda: browse_outdir(outdir_var)).grid(row=2, column=2, padx=padx, pady=pady)
-
-# ---- Parameters frame
-params = tk.LabelFrame(root, text="Model / Sampling parameters", padx=10, pady=10)
-params.pack(fill="x", padx=10, pady=10)
+    _fit_state.clear()
+    _cancel_time = None
+    log_text.delete("1.0", "end")
+    ash_bar["value"] = 0
+    fit_bar["value"] = 0
+    stage_var.set("Starting…")
+    ash_var.set("")
+    fit_var.set("")
+
+    _worker = PipelineWorker(config).start()
+    run_button.config(state="disabled")
+    preview_button.config(state="disabled")
+    cancel_button.config(state="normal")
+    root.after(POLL_MS, poll_worker)
+
+
+def cancel_run():
+    global _cancel_time
+    if _worker is not None and _worker.is_alive() and not _worker.cancelled:
+        _worker.cancel()
+        _cancel_time = time.monotonic()
+        stage_var.set("Cancelling…")
+        cancel_button.config(state="disabled")
+
+
+def _log(line: str):
+    log_text.insert("end", line + "\n")
+    log_text.see("end")
+
+
+def _handle_event(ev) -> bool:
+    """Update the progress display; returns True once the run has ended (done / cancelled / error)."""
+    kind = ev["event"]
+    if kind == "stage":
+        if ev["status"] == "start":
+            stage_var.set(f"Stage: {ev['stage']}")
+        else:
+            _log(f"{ev['stage']}: {ev['wall_s']:.1f} s")
+    elif kind == "ash":
+        ash_bar["value"] = 100.0 * ev["done"] / max(ev["total"], 1)
+        ash_var.set(
+            f"BEA ashes {ev['done']}/{ev['total']} (last: {ev['ash_id']}), "
+            f"elapsed {_fmt_s(ev['elapsed_s'])}, ETA {_fmt_s(ev['eta_s'])}"
+        )
+    elif kind == "fit":
+        _fit_state.update(label=ev["fit"], chains=ev["chains"], total=ev["total"], draws={})
+        fit_bar["value"] = 0
+        fit_var.set(f"{ev['fit']}: starting {ev['chains']} chains")
+    elif kind == "draws" and _fit_state:
+        _fit_state["draws"][ev["chain"]] = ev["draw"]
+        frac = sum(_fit_state["draws"].values()) / max(_fit_state["total"] * _fit_state["chains"], 1)
+        fit_bar["value"] = 100.0 * frac
+        phase = "tuning" if ev["tuning"] else "sampling"
+        fit_var.set(f"{_fit_state['label']}: {phase}, {frac:.0%} of {_fit_state['chains']} chains")
+    elif kind == "done":
+        stage_var.set(f"Finished in {_fmt_s(ev['wall_s'])}")
+        messagebox.showinfo("Done", f"Finished!\nOutputs saved to:\n{Path(ev['outdir']).resolve()}")
+        return True
+    elif kind == "cancelled":
+        stage_var.set("Cancelled")
+        return True
+    elif kind == "error":
+        stage_var.set("Failed")
+        _log(ev["traceback"])
+        messagebox.showerror("Error", ev["message"])
+        return True
+    return False
+
+
+def _finish():
+    run_button.config(state="normal")
+    preview_button.config(state="normal")
+    cancel_button.config(state="disabled")
+
+
+def poll_worker():
+    alive = _worker.is_alive()
+    for ev in _worker.poll():
+        if _handle_event(ev):
+            _finish()
+            return
+    if not alive:
+        # Worker exited without a final event (killed, crashed)
+        stage_var.set(f"Worker exited (code {_worker.process.exitcode})")
+        _finish()
+        return
+    if _cancel_time is not None and time.monotonic() - _cancel_time > CANCEL_GRACE_S:
+        _worker.terminate()
+        stage_var.set("Cancelled (worker terminated)")
+        _finish()
+        return
+    root.after(POLL_MS, poll_worker)
 
-# Row 0
-tk.Label(params, text="BEA draws").grid(row=0, column=0, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=bea_draws_var, width=12).grid(row=0, column=1, sticky="w", padx=padx, pady=pady)
 
-tk.Label(params, text="BEA tune").grid(row=0, column=2, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=bea_tune_var, width=12).grid(row=0, column=3, sticky="w", padx=padx, pady=pady)
+def start_warmup():
+    """Precompile the standard models into the persistent compile cache in a background process (first launch only)."""
+    global _warmup
+    from bea_bad import compilecache
 
-tk.Label(params, text="BAD draws").grid(row=0, column=4, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=bad_draws_var, width=12).grid(row=0, column=5, sticky="w", padx=padx, pady=pady)
+    compiledir = compilecache.configure()
+    if compilecache.is_warm(compiledir):
+        return
+    _warmup = multiprocessing.get_context("spawn").Process(
+        target=compilecache.warmup_worker, args=(compiledir,), daemon=True
+    )
+    _warmup.start()
+    _log(f"Preparing compiled models in the background (first launch only): {compiledir}")
+    root.after(POLL_MS, poll_warmup)
 
-tk.Label(params, text="BAD tune").grid(row=0, column=6, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=bad_tune_var, width=12).grid(row=0, column=7, sticky="w", padx=padx, pady=pady)
 
-# Row 1
-tk.Label(params, text="Max span (Ma)").grid(row=1, column=0, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=max_span_var, width=12).grid(row=1, column=1, sticky="w", padx=padx, pady=pady)
+def poll_warmup():
+    if _warmup.is_alive():
+        root.after(POLL_MS, poll_warmup)
+    elif _warmup.exitcode == 0:
+        _log("Compiled models ready: later runs start sampling within seconds")
+    else:
+        _log(f"Background model compilation failed (code {_warmup.exitcode}); runs compile on first use")
 
-tk.Label(params, text="Depth sigma (m)").grid(row=1, column=2, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=depth_sigma_var, width=12).grid(row=1, column=3, sticky="w", padx=padx, pady=pady)
 
-tk.Label(params, text="target_accept").grid(row=1, column=4, sticky="w", padx=padx, pady=pady)
-tk.Entry(params, textvariable=target_accept_var, width=12).grid(row=1, column=5, sticky="w", padx=padx, pady=pady)
+if __name__ == "__main__":
+    # The worker process is spawned: the frozen exe needs freeze_support(), and the layout
+    # lives under this guard so the child re-importing this module does not open a window
+    multiprocessing.freeze_support()
 
-tk.Checkbutton(params, text="Disable bootstrap prior (BEA)", variable=no_bootstrap_var)\
-    .grid(row=1, column=6, columnspan=2, sticky="w", padx=padx, pady=pady)
+    # --- GUI layout ---
+    root = tk.Tk()
+    root.title("BEA → BAD (Bayesian eruption age + age–depth)")
+    root.geometry("860x760")
 
-# ---- Run button
-tk.Button(root, text="Run", command=run_pipeline, height=2, width=14).pack(pady=18)
+    zircon_var = tk.StringVar()
+    tiepoints_var = tk.StringVar()
+    outdir_var = tk.StringVar(value="out")
 
-root.mainloop()
+    # Defaults (sane for a first run)
+    bea_draws_var = tk.StringVar(value="2000")
+    bea_tune_var = tk.StringVar(value="2000")
+    bad_draws_var = tk.StringVar(value="3000")
+    bad_tune_var = tk.StringVar(value="3000")
+
+    max_span_var = tk.StringVar(value="1.0")
+    depth_sigma_var = tk.StringVar(value="0.03")
+    target_accept_var = tk.StringVar(value="0.9")
+
+    no_bootstrap_var = tk.IntVar(value=0)
+    sampler_var = tk.StringVar(value="pymc")
+    adaptive_var = tk.IntVar(value=0)
+    ess_target_var = tk.StringVar(value="400")
+    resume_var = tk.IntVar(value=0)
+    bad_model_var = tk.StringVar(value="ordered")
+    sedrate_corr_var = tk.StringVar(value="0")
+
+    padx = 10
+    pady = 8
+
+    # ---- Inputs frame
+    inputs = tk.LabelFrame(root, text="Inputs", padx=10, pady=10)
+    inputs.pack(fill="x", padx=10, pady=10)
+
+    tk.Label(inputs, text="Zircon CSV").grid(row=0, column=0, sticky="w", padx=padx, pady=pady)
+    tk.Entry(inputs, textvariable=zircon_var, width=78).grid(row=0, column=1, padx=padx, pady=pady)
+    tk.Button(inputs, text="Browse", command=lambda: browse_csv(zircon_var)).grid(row=0, column=2, padx=padx, pady=pady)
+
+    tk.Label(inputs, text="Tiepoints CSV").grid(row=1, column=0, sticky="w", padx=padx, pady=pady)
+    tk.Entry(inputs, textvariable=tiepoints_var, width=78).grid(row=1, column=1, padx=padx, pady=pady)
+    tk.Button(inputs, text="Browse", command=lambda: browse_csv(tiepoints_var)).grid(row=1, column=2, padx=padx, pady=pady)
+
+    tk.Label(inputs, text="Output folder").grid(row=2, column=0, sticky="w", padx=padx, pady=pady)
+    tk.Entry(inputs, textvariable=outdir_var, width=78).grid(row=2, column=1, padx=padx, pady=pady)
+    tk.Button(inputs, text="Browse", command=lambda: browse_outdir(outdir_var)).grid(row=2, column=2, padx=padx, pady=pady)
+
+    # ---- Parameters frame
+    params = tk.LabelFrame(root, text="Model / Sampling parameters", padx=10, pady=10)
+    params.pack(fill="x", padx=10, pady=10)
+
+    # Row 0
+    tk.Label(params, text="BEA draws").grid(row=0, column=0, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=bea_draws_var, width=12).grid(row=0, column=1, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="BEA tune").grid(row=0, column=2, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=bea_tune_var, width=12).grid(row=0, column=3, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="BAD draws").grid(row=0, column=4, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=bad_draws_var, width=12).grid(row=0, column=5, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="BAD tune").grid(row=0, column=6, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=bad_tune_var, width=12).grid(row=0, column=7, sticky="w", padx=padx, pady=pady)
+
+    # Row 1
+    tk.Label(params, text="Max span (Ma)").grid(row=1, column=0, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=max_span_var, width=12).grid(row=1, column=1, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="Depth sigma (m)").grid(row=1, column=2, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=depth_sigma_var, width=12).grid(row=1, column=3, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="target_accept").grid(row=1, column=4, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=target_accept_var, width=12).grid(row=1, column=5, sticky="w", padx=padx, pady=pady)
+
+    tk.Checkbutton(params, text="Disable bootstrap prior (BEA)", variable=no_bootstrap_var)\
+        .grid(row=1, column=6, columnspan=2, sticky="w", padx=padx, pady=pady)
+
+    # Row 2
+    tk.Label(params, text="Sampler").grid(row=2, column=0, sticky="w", padx=padx, pady=pady)
+    tk.OptionMenu(params, sampler_var, "pymc", "nutpie", "numpyro", "blackjax")\
+        .grid(row=2, column=1, sticky="w", padx=padx, pady=pady)
+
+    tk.Checkbutton(params, text="Adaptive sampling (ignores draws/tune)", variable=adaptive_var)\
+        .grid(row=2, column=2, columnspan=2, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="Target ESS").grid(row=2, column=4, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=ess_target_var, width=12).grid(row=2, column=5, sticky="w", padx=padx, pady=pady)
+
+    tk.Checkbutton(params, text="Resume interrupted run (same output folder)", variable=resume_var)\
+        .grid(row=3, column=0, columnspan=4, sticky="w", padx=padx, pady=pady)
+
+    # Row 3: 'scalable' for sections with many tie points (tens to hundreds)
+    tk.Label(params, text="BAD model").grid(row=3, column=4, sticky="w", padx=padx, pady=pady)
+    tk.OptionMenu(params, bad_model_var, "ordered", "scalable")\
+        .grid(row=3, column=5, sticky="w", padx=padx, pady=pady)
+
+    tk.Label(params, text="Rate corr. (m)").grid(row=3, column=6, sticky="w", padx=padx, pady=pady)
+    tk.Entry(params, textvariable=sedrate_corr_var, width=12).grid(row=3, column=7, sticky="w", padx=padx, pady=pady)
+
+    # ---- Progress frame
+    prog = tk.LabelFrame(root, text="Progress", padx=10, pady=10)
+    prog.pack(fill="both", expand=True, padx=10, pady=10)
+
+    stage_var = tk.StringVar(value="Idle")
+    ash_var = tk.StringVar()
+    fit_var = tk.StringVar()
+
+    tk.Label(prog, textvariable=stage_var, anchor="w").pack(fill="x")
+    ash_bar = ttk.Progressbar(prog, maximum=100.0)
+    ash_bar.pack(fill="x", pady=(4, 0))
+    tk.Label(prog, textvariable=ash_var, anchor="w").pack(fill="x")
+    fit_bar = ttk.Progressbar(prog, maximum=100.0)
+    fit_bar.pack(fill="x", pady=(4, 0))
+    tk.Label(prog, textvariable=fit_var, anchor="w").pack(fill="x")
+    log_text = tk.Text(prog, height=6)
+    log_text.pack(fill="both", expand=True, pady=(4, 0))
+
+    # ---- Run / Cancel buttons
+    buttons = tk.Frame(root)
+    buttons.pack(pady=12)
+    run_button = tk.Button(buttons, text="Run", command=run_pipeline, height=2, width=14)
+    run_button.pack(side="left", padx=10)
+    preview_button = tk.Button(buttons, text="Quick preview", command=lambda: run_pipeline(preview=True),
+                               height=2, width=14)
+    preview_button.pack(side="left", padx=10)
+    cancel_button = tk.Button(buttons, text="Cancel", command=cancel_run, height=2, width=14, state="disabled")
+    cancel_button.pack(side="left", padx=10)
+
+    # Runs started while the warm-up is still compiling share the same cache (PyTensor locks it)
+    root.after(0, start_warmup)
+    root.mainloop()
@@ -1,2 +1,2 @@
-__all__ = ["cli", "dataio", "utils", "bea", "bad", "plot"]
+__all__ = ["cli", "dataio", "utils", "bea", "bea_model", "bea_grid", "bad", "plot", "parallel", "cache", "checkpoint", "progress", "sampling", "bench", "report", "store", "query", "batch", "sbc", "sweep", "bad_model", "compilecache", "preview"]
 __version__ = "0.1.0"
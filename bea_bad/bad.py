@@ -1,10 +1,24 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Tuple
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import pymc as pm
+
+from .report import cpu_time
+from .sampling import AdaptiveSettings, SampleStats, TuningState, run_sampler
+from .store import StoreSettings, write_idata
+from .utils import hdi_from_sorted, quantile_from_sorted
+
+if TYPE_CHECKING:
+    import pymc as pm
+
+# BAD 的两种参数化（后验相同，见 build_bad_model）
+BAD_MODELS = ("ordered", "scalable")
+
+# scalable 模型的平滑累计最大值只对窗口内的项求和：窗口外各项的相对贡献 < exp(-_SOFT_WINDOW)
+_SOFT_WINDOW = 30.0
 
 
 @dataclass
@@ -12,6 +26,9 @@ class BADOutputs:
     tie_summary: pd.DataFrame
     query_summary: pd.DataFrame
     posterior_path: str
+    stats: Optional[SampleStats] = None
+    # build_s, compile_s, sample_s, netcdf_write_s, postprocess_s, wall_s, cpu_s（缓存命中时为空）
+    timings: Dict[str, float] = field(default_factory=dict)
 
 
 def _piecewise_age_one_draw(d_tie: np.ndarray, age0: float, rates: np.ndarray, d_query: np.ndarray) -> np.ndarray:
@@ -26,6 +43,362 @@ def _piecewise_age_one_draw(d_tie: np.ndarray, age0: float, rates: np.ndarray, d
     return age_tie[idx] + rates[idx] * (d_query - d_tie[idx])
 
 
+def _piecewise_age_draws(
+    d_tie: np.ndarray, age0: np.ndarray, rates: np.ndarray, d_query: np.ndarray
+) -> np.ndarray:
+    """
+    _piecewise_age_one_draw 的批量版本：对所有 draws 同时求值，返回 (draws, queries)。
+    d_tie: (S, K) 每行单调递增；age0: (S,)；rates: (S, K-1)
+    段索引按 searchsorted(side="right") - 1 并截断到 [0, K-2]，通过逐个内部节点累加比较得到，
+    只需 O(S × Q) 内存。
+    """
+    S, K = d_tie.shape
+    age_tie = _tie_age_draws(d_tie, age0, rates)
+    # 每段写成 age = intercept + rate * depth，求值时只需两次 gather
+    intercept = (age_tie[:, :-1] - rates * d_tie[:, :-1]).ravel()
+    slope = rates.ravel()
+
+    q = np.asarray(d_query, dtype=float)[None, :]
+    idx = np.zeros((S, q.shape[1]), dtype=np.int32 if K > 2**15 else np.int16)
+    for k in range(1, K - 1):
+        np.add(idx, d_tie[:, k:k + 1] <= q, out=idx, casting="unsafe")
+
+    flat = idx + (np.arange(S, dtype=np.intp) * (K - 1))[:, None]
+    return intercept.take(flat) + slope.take(flat) * q
+
+
+def _tie_age_draws(d_tie: np.ndarray, age0: np.ndarray, rates: np.ndarray) -> np.ndarray:
+    seg_len = np.diff(d_tie, axis=1)
+    return np.concatenate(
+        [age0[:, None], age0[:, None] + np.cumsum(rates * seg_len, axis=1)], axis=1
+    )
+
+
+def _piecewise_depth_draws(
+    d_tie: np.ndarray, age_tie: np.ndarray, rates: np.ndarray, a_query: np.ndarray
+) -> np.ndarray:
+    """
+    _piecewise_age_draws 的反函数：每个 draw 的 age(depth) 严格单调（rates > 0），
+    按年龄找段并线性反解深度，返回 (draws, queries)。段外沿首/末段外推，与正向求值一致。
+    """
+    S, K = d_tie.shape
+    intercept = (d_tie[:, :-1] - age_tie[:, :-1] / rates).ravel()
+    inv_slope = (1.0 / rates).ravel()
+
+    a = np.asarray(a_query, dtype=float)[None, :]
+    idx = np.zeros((S, a.shape[1]), dtype=np.int32 if K > 2**15 else np.int16)
+    for k in range(1, K - 1):
+        np.add(idx, age_tie[:, k:k + 1] <= a, out=idx, casting="unsafe")
+
+    flat = idx + (np.arange(S, dtype=np.intp) * (K - 1))[:, None]
+    return intercept.take(flat) + inv_slope.take(flat) * a
+
+
+def _summary_columns(x: np.ndarray, prefix: str, unit: str = "ma") -> dict:
+    """均值 + 95% HDI（最窄区间）+ 95% 等尾区间（ETI），x 为 (draws, n)。"""
+    xs = np.sort(x, axis=0)
+    hdi_low, hdi_high = hdi_from_sorted(xs, 0.95)
+    return {
+        f"{prefix}_mean_{unit}": x.mean(axis=0),
+        f"{prefix}_hdi95_low_{unit}": hdi_low,
+        f"{prefix}_hdi95_high_{unit}": hdi_high,
+        f"{prefix}_eti95_low_{unit}": quantile_from_sorted(xs, 0.025),
+        f"{prefix}_eti95_high_{unit}": quantile_from_sorted(xs, 0.975),
+    }
+
+
+def _summarize_chunked(evaluate, q: np.ndarray, S: int, key: str, prefix: str, unit: str,
+                       max_chunk_bytes: int) -> pd.DataFrame:
+    # 每个 query 列大约需要：结果、排序副本、段索引与 gather 的中间结果
+    chunk = max(1, int(max_chunk_bytes // (S * 8 * 6)))
+
+    parts = []
+    for start in range(0, max(q.size, 1), chunk):
+        qc = q[start:start + chunk]
+        cols = _summary_columns(evaluate(qc), prefix, unit)
+        parts.append(pd.DataFrame({key: qc, **cols}))
+    return pd.concat(parts, ignore_index=True).sort_values(key)
+
+
+def summarize_query_ages(
+    d_tie: np.ndarray,
+    age0: np.ndarray,
+    rates: np.ndarray,
+    d_query: np.ndarray,
+    *,
+    max_chunk_bytes: int = 64 * 2**20,
+) -> pd.DataFrame:
+    """
+    按 query 分块求值并汇总，单块 (draws × chunk) 的工作内存不超过 max_chunk_bytes，
+    不会构建完整的 draws × queries 矩阵。
+    """
+    return _summarize_chunked(
+        lambda qc: _piecewise_age_draws(d_tie, age0, rates, qc),
+        np.asarray(d_query, dtype=float), d_tie.shape[0], "depth_m", "age", "ma", max_chunk_bytes
+    )
+
+
+def summarize_query_depths(
+    d_tie: np.ndarray,
+    age0: np.ndarray,
+    rates: np.ndarray,
+    a_query: np.ndarray,
+    *,
+    max_chunk_bytes: int = 64 * 2**20,
+) -> pd.DataFrame:
+    """给定年龄反查深度（每个 draw 单调反解），列为 age_ma + depth_*_m，分块方式同 summarize_query_ages。"""
+    age_tie = _tie_age_draws(d_tie, age0, rates)
+    return _summarize_chunked(
+        lambda qc: _piecewise_depth_draws(d_tie, age_tie, rates, qc),
+        np.asarray(a_query, dtype=float), d_tie.shape[0], "age_ma", "depth", "m", max_chunk_bytes
+    )
+
+
+def sort_tiepoints(
+    tie_depths_m: np.ndarray, tie_age_mean_ma: np.ndarray, tie_age_sd_ma: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    d_obs = np.asarray(tie_depths_m, dtype=float)
+    E_obs = np.asarray(tie_age_mean_ma, dtype=float)
+    E_sd = np.asarray(tie_age_sd_ma, dtype=float)
+
+    # 排序很关键（ordered transform 需要单调深度）；稳定排序使等深度的 tie points 保持输入顺序
+    order = np.argsort(d_obs, kind="stable")
+    return d_obs[order], E_obs[order], E_sd[order]
+
+
+def sedrate_rho(d_obs: np.ndarray, corr_m: float) -> np.ndarray:
+    """
+    相邻两段 log 沉积速率的 AR(1) 系数 exp(-段中点间距 / corr_m)，长度 K-2：
+    log 速率沿深度是均值回复的随机游走（OU 过程），每段的边缘分布仍是 Normal(mu, sigma)。
+    corr_m <= 0 时全为 0，即各段独立（与 ordered 模型的先验相同）。
+    """
+    mid = 0.5 * (d_obs[1:] + d_obs[:-1])
+    if corr_m <= 0:
+        return np.zeros(max(mid.size - 1, 0))
+    return np.minimum(np.exp(-np.diff(mid) / corr_m), 1.0 - 1e-9)
+
+
+def _soft_window(anchor: np.ndarray, c: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    平滑累计最大值 c·log Σ_{j≤k} exp(y_j / c) 第 k 行需要求和的项（y ≈ anchor）：
+    返回 (索引 (K, W)，掩码 (K, W)，参考值 (K,) = 前 k 个 anchor 的最大值 / c)。
+    比参考值低 _SOFT_WINDOW·c 以上的更早项不参与求和；间隔远大于 c 的序列 W = 1，密集序列 W 为几十。
+    """
+    K = anchor.size
+    ref = np.maximum.accumulate(anchor) / c
+    near = (ref[:, None] - anchor[None, :] / c < _SOFT_WINDOW) & np.tri(K, dtype=bool)
+    lo = near.argmax(axis=1)
+    back = np.arange(int((np.arange(K) - lo).max()) + 1)
+    idx = np.arange(K)[:, None] - back[None, :]
+    mask = back[None, :] <= (np.arange(K) - lo)[:, None]
+    return np.where(mask, idx, 0), mask.astype(float), ref
+
+
+def scalable_inputs(
+    d_obs: np.ndarray,
+    E_obs: np.ndarray,
+    E_sd: np.ndarray,
+    *,
+    depth_sigma_m: float,
+    sedrate_logn_mu: float,
+    sedrate_logn_sigma: float,
+    sedrate_corr_m: float = 0.0,
+) -> Dict[str, Any]:
+    """scalable BAD 图的全部数值输入（build_bad_model 作为常数、bad_model.ReusableBADModel 作为 pm.Data）。"""
+    d_c = float(np.sqrt(2.0) * depth_sigma_m)
+    a_c = float(np.sqrt(2.0) * np.median(E_sd))
+    d_idx, d_mask, d_ref = _soft_window(d_obs, d_c)
+    a_idx, a_mask, a_ref = _soft_window(E_obs, a_c)
+    return dict(
+        d_obs=d_obs, E_obs=E_obs, E_sd=E_sd, depth_sigma_m=float(depth_sigma_m),
+        depth_c=d_c, depth_idx=d_idx, depth_mask=d_mask, depth_ref=d_ref,
+        age_c=a_c, age_idx=a_idx, age_mask=a_mask, age_ref=a_ref,
+        sedrate_logn_mu=float(sedrate_logn_mu), sedrate_logn_sigma=float(sedrate_logn_sigma),
+        sedrate_rho=sedrate_rho(d_obs, sedrate_corr_m),
+        age0_sd=max(float(E_sd[0] * 5), 0.2),
+    )
+
+
+def ordered_inputs(
+    d_obs: np.ndarray,
+    E_obs: np.ndarray,
+    E_sd: np.ndarray,
+    *,
+    depth_sigma_m: float,
+    sedrate_logn_mu: float,
+    sedrate_logn_sigma: float,
+) -> Dict[str, Any]:
+    """ordered BAD 图的全部数值输入（用法同 scalable_inputs）。"""
+    return dict(
+        d_obs=d_obs, E_obs=E_obs, E_sd=E_sd, depth_sigma_m=float(depth_sigma_m),
+        sedrate_logn_mu=float(sedrate_logn_mu), sedrate_logn_sigma=float(sedrate_logn_sigma),
+        age0_sd=max(float(E_sd[0] * 5), 0.2),
+    )
+
+
+def _ordered_graph(K: int, v: Dict[str, Any]) -> None:
+    """
+    在当前 pm.Model 中构建 ordered BAD（v 为 ordered_inputs 的结果，数组或 pm.Data）：
+    d_true 用 ordered transform，每段独立的 LogNormal 速率，age_ties 由 age0 与各段累加得到。
+    """
+    import pymc as pm
+
+    d_true = pm.Normal(
+        "d_true",
+        mu=v["d_obs"],
+        sigma=v["depth_sigma_m"],
+        shape=K,
+        transform=pm.distributions.transforms.ordered,
+        initval=v["d_obs"]
+    )
+
+    rates = pm.LogNormal("rates", mu=v["sedrate_logn_mu"], sigma=v["sedrate_logn_sigma"], shape=K - 1)
+
+    age0 = pm.Normal("age0", mu=v["E_obs"][0], sigma=v["age0_sd"])
+
+    seg_len = d_true[1:] - d_true[:-1]
+    age_ties = pm.Deterministic("age_ties", pm.math.concatenate([[age0], age0 + pm.math.cumsum(rates * seg_len)]))
+
+    pm.Normal("E_like", mu=age_ties, sigma=v["E_sd"], observed=v["E_obs"])
+
+
+def _soft_ordered(anchor, scale, z, c, ref, idx, mask):
+    """
+    y = anchor + scale·z 的平滑累计最大值 x_k = c·log Σ_{j≤k} exp(y_j / c)：x 严格递增，
+    y 有序且间隔远大于 c 时 x ≈ y（各 z 近似独立），乱序处 x_k 平滑地贴住 x_{k-1}，只影响相邻几项。
+    返回 (x，相邻增量（> 0，用 softplus 直接计算以免相减抵消），log|dx/dz| 中与 z 有关的部分)。
+    """
+    import pytensor.tensor as pt
+
+    y = anchor + scale * z
+    x = c * (ref + pt.log(pt.sum(mask * pt.exp(y[idx] / c - ref[:, None]), axis=1)))
+    v = (y[1:] - x[:-1]) / c
+    return x, c * pt.softplus(v), -pt.sum(pt.softplus(-v))
+
+
+def _scalable_graph(K: int, v: Dict[str, Any]) -> None:
+    """
+    在当前 pm.Model 中构建 scalable BAD（v 为 scalable_inputs 的结果，数组或 pm.Data）。
+
+    与 ordered 模型是同一个后验，只换了参数化：采样变量是标准化的深度 / 年龄偏差 depth_z、age_z，
+    经 _soft_ordered 映射为有序的 d_true 与 age_ties，rates = 年龄增量 / 深度增量；
+    深度先验、age0 先验、rates 先验与两个映射的 Jacobian 一起写进 Potential。
+    ordered 模型在 log 间隔 / log 速率空间采样，后验相关性随 K 增长（步数约 ∝ K）；
+    这里的坐标近似独立，每个 draw 的 leapfrog 步数基本不随 K 变化，logp 与梯度的开销为 O(K·W)。
+    log 速率先验为 OU 过程（sedrate_rho 全为 0 时即各段独立的 LogNormal）。
+    """
+    import pymc as pm
+    import pytensor.tensor as pt
+
+    depth_z = pm.Flat("depth_z", shape=K, initval=np.zeros(K))
+    age_z = pm.Flat("age_z", shape=K, initval=np.zeros(K))
+    d_true, seg_len, jac_d = _soft_ordered(v["d_obs"], v["depth_sigma_m"], depth_z, v["depth_c"],
+                                           v["depth_ref"], v["depth_idx"], v["depth_mask"])
+    age_ties, age_inc, jac_a = _soft_ordered(v["E_obs"], v["E_sd"], age_z, v["age_c"],
+                                             v["age_ref"], v["age_idx"], v["age_mask"])
+    log_rates = pt.log(age_inc) - pt.log(seg_len)
+    pm.Deterministic("d_true", d_true)
+    pm.Deterministic("rates", pt.exp(log_rates))
+    pm.Deterministic("age0", age_ties[0])
+    pm.Deterministic("age_ties", age_ties)
+
+    sigma, rho = v["sedrate_logn_sigma"], v["sedrate_rho"]
+    dev = log_rates - v["sedrate_logn_mu"]
+    innov = dev[1:] - rho * dev[:-1]
+    rates_logp = (
+        pm.logp(pm.Normal.dist(0.0, sigma), dev[0])
+        + pt.sum(pm.logp(pm.Normal.dist(0.0, sigma * pt.sqrt(1.0 - rho ** 2)), innov))
+        - pt.sum(log_rates)                     # p(rates) = p(log rates) / rates
+    )
+    pm.Potential(
+        "prior",
+        pt.sum(pm.logp(pm.Normal.dist(v["d_obs"], v["depth_sigma_m"]), d_true))
+        + pm.logp(pm.Normal.dist(v["E_obs"][0], v["age0_sd"]), age_ties[0])
+        + rates_logp
+        - pt.sum(pt.log(seg_len))               # (age0, rates) → age_ties 的 Jacobian
+        + jac_d + jac_a
+    )
+    pm.Normal("E_like", mu=age_ties, sigma=v["E_sd"], observed=v["E_obs"])
+
+
+def build_bad_model(
+    d_obs: np.ndarray,
+    E_obs: np.ndarray,
+    E_sd: np.ndarray,
+    *,
+    depth_sigma_m: float = 0.03,
+    sedrate_logn_mu: float = np.log(0.05),
+    sedrate_logn_sigma: float = 1.0,
+    model: str = "ordered",
+    sedrate_corr_m: float = 0.0,
+) -> pm.Model:
+    """
+    单调 age–depth 模型；d_obs 需已按深度排序（见 sort_tiepoints）。
+    model: "ordered"   d_true 用 ordered transform、每段独立的 LogNormal 速率（几个到几十个 tie points）
+           "scalable"  同一后验的局部非中心化参数化，采样开销约随 K 线性增长（见 _scalable_graph）；
+                       sedrate_corr_m > 0 时相邻段的 log 速率相关（OU 过程，相关长度 sedrate_corr_m 米）
+    """
+    import pymc as pm
+
+    K = d_obs.size
+    if K < 2:
+        raise ValueError("BAD 至少需要 2 个 tie points")
+    if model not in BAD_MODELS:
+        raise ValueError(f"未知的 BAD 模型 {model!r}（可选：{', '.join(BAD_MODELS)}）")
+    if sedrate_corr_m > 0 and model != "scalable":
+        raise ValueError("sedrate_corr_m > 0（相关的沉积速率）需要 model='scalable'")
+
+    if model == "scalable":
+        with pm.Model() as m:
+            _scalable_graph(K, scalable_inputs(
+                d_obs, E_obs, E_sd, depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu,
+                sedrate_logn_sigma=sedrate_logn_sigma, sedrate_corr_m=sedrate_corr_m
+            ))
+        return m
+
+    with pm.Model() as m:
+        _ordered_graph(K, ordered_inputs(
+            d_obs, E_obs, E_sd, depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu,
+            sedrate_logn_sigma=sedrate_logn_sigma
+        ))
+    return m
+
+
+def summarize_bad(
+    idata, d_obs: np.ndarray, E_obs: np.ndarray, E_sd: np.ndarray, query_depths_m: np.ndarray
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """由后验 draws 计算 (tie_summary, query_summary)。"""
+    K = d_obs.size
+    return summarize_draws(
+        idata.posterior["d_true"].values.reshape(-1, K),
+        idata.posterior["age0"].values.reshape(-1),
+        idata.posterior["rates"].values.reshape(-1, K - 1),
+        d_obs, E_obs, E_sd, query_depths_m
+    )
+
+
+def summarize_draws(
+    d_true_draws: np.ndarray, age0_draws: np.ndarray, rates_draws: np.ndarray,
+    d_obs: np.ndarray, E_obs: np.ndarray, E_sd: np.ndarray, query_depths_m: np.ndarray
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """summarize_bad 的核心：draws 为 (S, K)、(S,)、(S, K-1) 的数组（也用于 preview 的重采样结果）。"""
+    q = np.asarray(query_depths_m, dtype=float)
+
+    # query ages（分块、向量化）
+    query_summary = summarize_query_ages(d_true_draws, age0_draws, rates_draws, q)
+
+    # tie ages summary
+    tie_ages = _tie_age_draws(d_true_draws, age0_draws, rates_draws)
+
+    tie_summary = pd.DataFrame({
+        "depth_obs_m": d_obs,
+        "eruption_obs_ma": E_obs,
+        "eruption_obs_sd_ma": E_sd,
+        **_summary_columns(tie_ages, "age_model"),
+    })
+    return tie_summary, query_summary
+
+
 def fit_bad(
     tie_depths_m: np.ndarray,
     tie_age_mean_ma: np.ndarray,
@@ -35,96 +408,80 @@ def fit_bad(
     depth_sigma_m: float = 0.03,            # 约等于 ±3 cm 的层位不确定度实现
     sedrate_logn_mu: float = np.log(0.05),  # Ma/m（你可按剖面规模改）
     sedrate_logn_sigma: float = 1.0,
+    model: str = "ordered",
+    sedrate_corr_m: float = 0.0,
     draws: int = 3000,
     tune: int = 3000,
     chains: int = 2,
+    cores: Optional[int] = None,
     target_accept: float = 0.9,
     seed: int = 42,
     outdir: str = "out",
+    sampler: str = "pymc",
+    adaptive: Optional[AdaptiveSettings] = None,
+    store: Optional[StoreSettings] = None,
+    warm_start: Optional[TuningState] = None,
+    warm_tune: int = 200,
+    reuse_model: bool = False,
+    progressbar: bool = True,
 ) -> BADOutputs:
+    """
+    model / sedrate_corr_m: BAD 的参数化与沉积速率的相关长度（见 build_bad_model）；输出相同
+    store: bad_posterior.nc 的存储方式（分块压缩；可选 float32 / 抽稀，见 store.StoreSettings）。
+           汇总始终基于内存中完整精度的全部 draws。
+    warm_start: 上次运行的 BAD 调参状态（stats.tuning），只调参 warm_tune 步（见 sampling.run_sampler）
+    reuse_model: True 时使用本进程按 K 只编译一次、超参数为 pm.Data 的模型（bad_model.ReusableBADModel），
+                 连续拟合多组超参数（sweep）时不重新构建/编译；只适用于 pymc 后端
+    """
     import os
     from .utils import ensure_dir
 
     ensure_dir(outdir)
 
-    d_obs = np.asarray(tie_depths_m, dtype=float)
-    E_obs = np.asarray(tie_age_mean_ma, dtype=float)
-    E_sd = np.asarray(tie_age_sd_ma, dtype=float)
-    q = np.asarray(query_depths_m, dtype=float)
+    w0, c0 = time.perf_counter(), cpu_time()
+    d_obs, E_obs, E_sd = sort_tiepoints(tie_depths_m, tie_age_mean_ma, tie_age_sd_ma)
+    hyper = dict(depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu, sedrate_logn_sigma=sedrate_logn_sigma,
+                 sedrate_corr_m=sedrate_corr_m)
+    if reuse_model and sampler == "pymc":
+        from .bad_model import get_reusable_bad_model
 
-    # 排序很关键（ordered transform 需要单调深度）
-    order = np.argsort(d_obs)
-    d_obs = d_obs[order]
-    E_obs = E_obs[order]
-    E_sd = E_sd[order]
-
-    K = d_obs.size
-    if K < 2:
-        raise ValueError("BAD 至少需要 2 个 tie points")
-
-    with pm.Model() as m:
-        d_true = pm.Normal(
-            "d_true",
-            mu=d_obs,
-            sigma=depth_sigma_m,
-            shape=K,
-            transform=pm.distributions.transforms.ordered,
-            initval=d_obs
+        rm = get_reusable_bad_model(d_obs.size, target_accept=target_accept, model=model)
+        build_s = time.perf_counter() - w0
+        idata, stats = rm.sample(
+            d_obs, E_obs, E_sd, **hyper,
+            draws=draws, tune=tune, chains=chains, cores=cores, seed=seed,
+            progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
         )
+    else:
+        m = build_bad_model(d_obs, E_obs, E_sd, model=model, **hyper)
+        build_s = time.perf_counter() - w0
 
-        rates = pm.LogNormal("rates", mu=sedrate_logn_mu, sigma=sedrate_logn_sigma, shape=K - 1)
-
-        age0 = pm.Normal("age0", mu=E_obs[0], sigma=max(float(E_sd[0] * 5), 0.2))
-
-        seg_len = d_true[1:] - d_true[:-1]
-        age_ties = pm.Deterministic("age_ties", pm.math.concatenate([[age0], age0 + pm.math.cumsum(rates * seg_len)]))
-
-        pm.Normal("E_like", mu=age_ties, sigma=E_sd, observed=E_obs)
-
-        idata = pm.sample(
-            draws=draws, tune=tune, chains=chains,
-            target_accept=target_accept, random_seed=seed,
-            progressbar=True
+        idata, stats = run_sampler(
+            m, sampler=sampler,
+            draws=draws, tune=tune, chains=chains, cores=cores,
+            target_accept=target_accept, seed=seed,
+            progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
         )
 
+    t0 = time.perf_counter()
     posterior_path = os.path.join(outdir, "bad_posterior.nc")
-    idata.to_netcdf(posterior_path)
-
-    # posterior arrays
-    d_true_draws = idata.posterior["d_true"].values.reshape(-1, K)
-    age0_draws = idata.posterior["age0"].values.reshape(-1)
-    rates_draws = idata.posterior["rates"].values.reshape(-1, K - 1)
-
-    # query ages
-    ages_q = np.empty((d_true_draws.shape[0], q.size), dtype=float)
-    for i in range(d_true_draws.shape[0]):
-        ages_q[i] = _piecewise_age_one_draw(d_true_draws[i], age0_draws[i], rates_draws[i], q)
-
-    query_summary = pd.DataFrame({
-        "depth_m": q,
-        "age_mean_ma": ages_q.mean(axis=0),
-        "age_hdi95_low_ma": np.quantile(ages_q, 0.025, axis=0),
-        "age_hdi95_high_ma": np.quantile(ages_q, 0.975, axis=0),
-    }).sort_values("depth_m")
-
-    # tie ages summary
-    tie_ages = np.empty((d_true_draws.shape[0], K), dtype=float)
-    for i in range(d_true_draws.shape[0]):
-        seg_len = np.diff(d_true_draws[i])
-        tie_ages[i, 0] = age0_draws[i]
-        tie_ages[i, 1:] = age0_draws[i] + np.cumsum(rates_draws[i] * seg_len)
+    write_idata(idata, posterior_path, store)
+    write_s = time.perf_counter() - t0
 
-    tie_summary = pd.DataFrame({
-        "depth_obs_m": d_obs,
-        "eruption_obs_ma": E_obs,
-        "eruption_obs_sd_ma": E_sd,
-        "age_model_mean_ma": tie_ages.mean(axis=0),
-        "age_model_hdi95_low_ma": np.quantile(tie_ages, 0.025, axis=0),
-        "age_model_hdi95_high_ma": np.quantile(tie_ages, 0.975, axis=0),
-    })
+    t0 = time.perf_counter()
+    tie_summary, query_summary = summarize_bad(idata, d_obs, E_obs, E_sd, query_depths_m)
+    post_s = time.perf_counter() - t0
 
     return BADOutputs(
         tie_summary=tie_summary,
         query_summary=query_summary,
-        posterior_path=posterior_path
+        posterior_path=posterior_path,
+        stats=stats,
+        timings=dict(
+            build_s=build_s, compile_s=stats.compile_time_s, sample_s=stats.wall_time_s,
+            netcdf_write_s=write_s, postprocess_s=post_s,
+            wall_s=time.perf_counter() - w0, cpu_s=cpu_time() - c0
+        )
     )
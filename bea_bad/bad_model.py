@@ -0,0 +1,135 @@
+from __future__ import annotations
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pymc as pm
+
+from .bad import BAD_MODELS, _ordered_graph, _scalable_graph, ordered_inputs, scalable_inputs
+from .sampling import AdaptiveSettings, TuningState, reset_initial_mean, run_sampler
+
+
+class ReusableBADModel:
+    """
+    只构建/编译一次的 BAD 模型（同一 tie point 个数 K）：tie 深度、年龄、误差以及超参数
+    depth_sigma_m、sedrate_logn_mu、sedrate_logn_sigma 都是 pm.Data，
+    换剖面或换超参数（如 sweep 的各个网格点）只需 pm.set_data。
+
+    图与 bad.build_bad_model 相同（bad._ordered_graph / bad._scalable_graph），只是数值输入
+    （bad.ordered_inputs / bad.scalable_inputs）都是 pm.Data；scalable 的平滑累计最大值窗口
+    随数据变化也不需要重新编译。
+    """
+
+    def __init__(self, K: int, *, target_accept: float = 0.9, model: str = "ordered"):
+        if K < 2:
+            raise ValueError("BAD 至少需要 2 个 tie points")
+        if model not in BAD_MODELS:
+            raise ValueError(f"未知的 BAD 模型 {model!r}（可选：{', '.join(BAD_MODELS)}）")
+        self.K = int(K)
+        self.model_name = model
+
+        t0 = time.perf_counter()
+        with pm.Model() as m:
+            placeholder = np.arange(self.K, dtype=float)
+            hyper = dict(depth_sigma_m=0.03, sedrate_logn_mu=np.log(0.05), sedrate_logn_sigma=1.0)
+            if model == "scalable":
+                inputs = scalable_inputs(placeholder, placeholder, np.ones(self.K), **hyper)
+                _scalable_graph(self.K, {k: pm.Data(k, v) for k, v in inputs.items()})
+            else:
+                inputs = ordered_inputs(placeholder, np.zeros(self.K), np.ones(self.K), **hyper)
+                _ordered_graph(self.K, {k: pm.Data(k, v) for k, v in inputs.items()})
+
+            # 编译 logp/dlogp（每个进程、每个 K 只做一次）
+            self.step = pm.NUTS(target_accept=target_accept)
+
+        self.model = m
+        self.compile_time_s = time.perf_counter() - t0
+        self._compile_reported = False
+
+    def set_inputs(self, d_obs: np.ndarray, E_obs: np.ndarray, E_sd: np.ndarray, *, depth_sigma_m: float,
+                   sedrate_logn_mu: float, sedrate_logn_sigma: float, sedrate_corr_m: float = 0.0) -> None:
+        """d_obs 需已按深度排序（见 bad.sort_tiepoints）。"""
+        if d_obs.size != self.K:
+            raise ValueError(f"{d_obs.size} 个 tie points 与模型的 K={self.K} 不一致")
+        if self.model_name == "scalable":
+            pm.set_data(scalable_inputs(
+                d_obs, E_obs, E_sd, depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu,
+                sedrate_logn_sigma=sedrate_logn_sigma, sedrate_corr_m=sedrate_corr_m
+            ), model=self.model)
+            return
+        if sedrate_corr_m > 0:
+            raise ValueError("sedrate_corr_m > 0（相关的沉积速率）需要 model='scalable'")
+        pm.set_data(ordered_inputs(
+            d_obs, E_obs, E_sd, depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu,
+            sedrate_logn_sigma=sedrate_logn_sigma
+        ), model=self.model)
+
+    def _initvals(self, d_obs: np.ndarray, E_obs: np.ndarray, E_sd: np.ndarray, depth_sigma_m: float,
+                  sedrate_logn_mu: float, chains: int, seed: int) -> List[Dict[str, np.ndarray]]:
+        # 重用 step 时 pm.sample 不做 jitter 初始化，这里按链给出随机初值（深度扰动不超过最小间距的 1/8，保持有序）
+        rng = np.random.default_rng(seed)
+        if self.model_name == "scalable":
+            # 标准化的深度 / 年龄偏差
+            return [{"depth_z": rng.uniform(-0.5, 0.5, size=self.K), "age_z": rng.uniform(-0.5, 0.5, size=self.K)}
+                    for _ in range(chains)]
+        jitter = min(float(depth_sigma_m), float(np.min(np.diff(d_obs))) / 2)
+        out = []
+        for _ in range(chains):
+            out.append({
+                "d_true": d_obs + rng.uniform(-0.25, 0.25, size=self.K) * jitter,
+                "rates": np.exp(sedrate_logn_mu) * rng.uniform(0.5, 1.5, size=self.K - 1),
+                "age0": np.float64(E_obs[0] + E_sd[0] * rng.uniform(-1.0, 1.0)),
+            })
+        return out
+
+    def sample(
+        self,
+        d_obs: np.ndarray,
+        E_obs: np.ndarray,
+        E_sd: np.ndarray,
+        *,
+        depth_sigma_m: float = 0.03,
+        sedrate_logn_mu: float = np.log(0.05),
+        sedrate_logn_sigma: float = 1.0,
+        sedrate_corr_m: float = 0.0,
+        draws: int = 3000,
+        tune: int = 3000,
+        chains: int = 2,
+        cores: Optional[int] = None,
+        seed: int = 42,
+        progressbar: bool = True,
+        adaptive: Optional[AdaptiveSettings] = None,
+        warm_start: Optional[TuningState] = None,
+        warm_tune: int = 200,
+    ):
+        """返回 (idata, SampleStats)。"""
+        hyper = dict(depth_sigma_m=depth_sigma_m, sedrate_logn_mu=sedrate_logn_mu,
+                     sedrate_logn_sigma=sedrate_logn_sigma)
+        self.set_inputs(d_obs, E_obs, E_sd, sedrate_corr_m=sedrate_corr_m, **hyper)
+        initvals = self._initvals(d_obs, E_obs, E_sd, depth_sigma_m, sedrate_logn_mu, chains, seed)
+        reset_initial_mean(self.model, self.step, initvals)
+        idata, stats = run_sampler(
+            self.model, sampler="pymc",
+            draws=draws, tune=tune, chains=chains, cores=cores,
+            step=self.step, seed=seed,
+            initvals=initvals,
+            progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
+        )
+        if not self._compile_reported:
+            stats.compile_time_s = self.compile_time_s
+            self._compile_reported = True
+        return idata, stats
+
+
+# 每个进程一份：sweep 的每个 worker 对每个 (K, 模型) 各编译一次
+_MODELS: Dict[Tuple[int, float, str], ReusableBADModel] = {}
+
+
+def get_reusable_bad_model(K: int, *, target_accept: float = 0.9, model: str = "ordered") -> ReusableBADModel:
+    key = (int(K), float(target_accept), model)
+    rm = _MODELS.get(key)
+    if rm is None:
+        rm = ReusableBADModel(key[0], target_accept=target_accept, model=model)
+        _MODELS[key] = rm
+    return rm
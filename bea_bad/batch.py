@@ -0,0 +1,249 @@
+from __future__ import annotations
+import argparse
+import contextlib
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from .utils import ensure_dir
+
+# 清单里的路径列（相对路径按清单文件所在目录解析）
+_PATH_COLUMNS = ("zircon", "tiepoints", "query", "warm_start")
+
+
+def read_manifest(path: str) -> pd.DataFrame:
+    """
+    读取剖面清单（CSV 或 JSON 记录列表），必须包含 section_id, zircon, tiepoints；
+    可选 query，以及任意流水线选项列（如 max_span_ma, seed），按剖面覆盖命令行的默认值。
+    """
+    if path.lower().endswith(".json"):
+        df = pd.read_json(path, orient="records", dtype=False)
+    else:
+        df = pd.read_csv(path, dtype={"section_id": str})
+    missing = [c for c in ("section_id", "zircon", "tiepoints") if c not in df.columns]
+    if missing:
+        raise ValueError(f"清单 {path} 缺少列：{missing}")
+    df["section_id"] = df["section_id"].astype(str).str.strip()
+    dup = df["section_id"][df["section_id"].duplicated()].unique().tolist()
+    if dup:
+        raise ValueError(f"清单 {path} 中 section_id 重复：{dup}")
+
+    base = os.path.dirname(os.path.abspath(path))
+    for col in _PATH_COLUMNS:
+        if col in df.columns:
+            df[col] = [
+                None if pd.isna(v) or str(v).strip() == "" else os.path.join(base, str(v).strip())
+                for v in df[col]
+            ]
+    return df
+
+
+def section_args(defaults: argparse.Namespace, row: Dict[str, Any], outdir: str) -> argparse.Namespace:
+    """一个剖面的 args：命令行默认值 + 清单中该行的覆盖值（按 PipelineConfig 字段的类型转换，见 cli.parse_option）。"""
+    from .cli import PipelineConfig, parse_option
+
+    names = {f.name for f in fields(PipelineConfig)}
+    args = argparse.Namespace(**vars(defaults))
+    for k, v in row.items():
+        if k == "section_id" or v is None or (not isinstance(v, str) and pd.isna(v)):
+            continue
+        if k in _PATH_COLUMNS:
+            setattr(args, k, v)
+            continue
+        if k not in names or k in ("outdir", "jobs", "cores"):
+            raise ValueError(f"清单列 {k!r} 不是可按剖面设置的选项")
+        setattr(args, k, parse_option(k, v))
+    args.query = getattr(args, "query", None)
+    args.outdir = os.path.join(outdir, row["section_id"])
+    return args
+
+
+@contextlib.contextmanager
+def _redirect_output(path: str):
+    """
+    把本进程的 stdout/stderr 在文件描述符级别重定向到 path。
+    不替换 sys.stdout 对象：PyMC 的日志与进度条会长期持有它们第一次见到的流对象，
+    替换后下一个剖面会写到上一个剖面已关闭的日志文件上。
+    """
+    import sys
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    with open(path, "w", encoding="utf-8") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            log.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved:
+                os.close(fd)
+
+
+def _run_section(task) -> Dict[str, Any]:
+    """
+    在当前进程里跑一个剖面；异常被捕获并记录，不影响其他剖面。
+    剖面的 stdout/stderr 写到 <section outdir>/log.txt。
+    本进程中编译过的 BEA 模型（bea_model 的进程级缓存）会被后续剖面继续使用。
+    """
+    from .cli import PipelineConfig, run_pipeline
+
+    section_id, args = task
+    ensure_dir(args.outdir)
+    rec: Dict[str, Any] = {"section_id": section_id, "outdir": args.outdir}
+    t0 = time.perf_counter()
+    with _redirect_output(os.path.join(args.outdir, "log.txt")):
+        try:
+            report = run_pipeline(PipelineConfig.from_namespace(args))
+        except Exception as e:
+            traceback.print_exc()
+            rec.update(status="failed", error=f"{type(e).__name__}: {e}")
+        else:
+            bea = report.get("bea") or []
+            bad = report.get("bad") or {}
+            rec.update(
+                status="ok",
+                error="",
+                n_ash=len(bea),
+                n_ash_cached=sum(bool(r.get("cached")) for r in bea),
+                n_ash_flagged=sum(bool(r.get("flags")) for r in bea),
+                bad_divergences=bad.get("divergences"),
+                bad_rhat_max=bad.get("rhat_max"),
+                bad_ess_bulk_min=bad.get("ess_bulk_min"),
+            )
+    rec["wall_s"] = time.perf_counter() - t0
+    return rec
+
+
+def _collect(records: List[Dict[str, Any]], name: str) -> Optional[pd.DataFrame]:
+    frames = []
+    for rec in records:
+        path = os.path.join(rec["outdir"], name)
+        if rec["status"] == "ok" and os.path.exists(path):
+            frames.append(pd.read_csv(path).assign(section_id=rec["section_id"]))
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    return df[["section_id"] + [c for c in df.columns if c != "section_id"]]
+
+
+def run_batch(
+    manifest: pd.DataFrame,
+    defaults: argparse.Namespace,
+    *,
+    outdir: str,
+    cores: Optional[int] = None,
+    jobs: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    用一个进程池跑清单里的所有剖面：每个 worker 依次处理多个剖面，在 worker 内编译的 BEA 模型
+    跨剖面重用；核预算按 parallel.plan_core_budget 在并发剖面与链之间分配（剖面内 ash 顺序拟合）。
+    写出：
+      <outdir>/<section_id>/...        各剖面的常规输出 + log.txt
+      batch_summary.csv                每个剖面一行（状态、错误、耗时、诊断）
+      batch_bea_summary.csv            所有成功剖面的 BEA 结果（带 section_id）
+      batch_tiepoint_summary.csv       所有成功剖面的 BAD tie point 结果（带 section_id）
+    """
+    from .parallel import _init_worker, limit_blas_threads, plan_core_budget
+
+    ensure_dir(outdir)
+    budget = plan_core_budget(len(manifest), chains=2, cores=cores, jobs=jobs)
+
+    tasks = []
+    for row in manifest.to_dict(orient="records"):
+        args = section_args(defaults, row, outdir)
+        args.cores = budget.chain_cores
+        args.jobs = 1
+        tasks.append((row["section_id"], args))
+
+    records: Dict[str, Dict[str, Any]] = {}
+
+    def done(rec: Dict[str, Any]) -> None:
+        records[rec["section_id"]] = rec
+        msg = f"{rec['wall_s']:.1f} s" if rec["status"] == "ok" else f"FAILED ({rec['error']})"
+        print(f"[{len(records)}/{len(tasks)}] {rec['section_id']}: {msg}", flush=True)
+
+    with limit_blas_threads(budget.blas_threads):
+        if budget.jobs == 1:
+            for t in tasks:
+                done(_run_section(t))
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(
+                max_workers=budget.jobs,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(budget.blas_threads,),
+            ) as ex:
+                futures = {ex.submit(_run_section, t): t for t in tasks}
+                for fut in as_completed(futures):
+                    section_id, args = futures[fut]
+                    try:
+                        rec = fut.result()
+                    except Exception as e:  # worker 进程崩溃等
+                        rec = dict(section_id=section_id, outdir=args.outdir, status="failed",
+                                   error=f"{type(e).__name__}: {e}", wall_s=float("nan"))
+                    done(rec)
+
+    ordered = [records[sid] for sid, _ in tasks]
+    summary = pd.DataFrame(ordered)
+    for col in ("n_ash", "n_ash_cached", "n_ash_flagged", "bad_divergences"):
+        if col in summary.columns:
+            summary[col] = summary[col].astype("Int64")
+    summary.to_csv(os.path.join(outdir, "batch_summary.csv"), index=False)
+    for name, out_name in (("bea_eruption_age_summary.csv", "batch_bea_summary.csv"),
+                           ("tiepoint_summary.csv", "batch_tiepoint_summary.csv")):
+        df = _collect(ordered, name)
+        if df is not None:
+            df.to_csv(os.path.join(outdir, out_name), index=False)
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    from .cli import add_pipeline_options
+
+    ap = argparse.ArgumentParser("bea_bad batch")
+    ap.add_argument("--manifest", required=True,
+                    help="CSV/JSON with section_id, zircon, tiepoints, [query], [per-section option columns]")
+    ap.add_argument("--outdir", default="batch_out", help="per-section outputs go to <outdir>/<section_id>")
+    ap.add_argument("--qa_plots", action="store_true",
+                    help="after the batch, render a QA figure per section into <outdir>/qa (see `bea_bad plots`)")
+    add_pipeline_options(
+        ap,
+        jobs_help="number of sections processed concurrently (default: cores // chains)",
+        cache_dir_help="result cache directory shared by all sections (default: <outdir>/.cache)",
+    )
+    args = ap.parse_args(argv)
+
+    manifest = read_manifest(args.manifest)
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(args.outdir, ".cache")
+
+    t0 = time.perf_counter()
+    summary = run_batch(manifest, args, outdir=args.outdir, cores=args.cores, jobs=args.jobs)
+    n_ok = int((summary["status"] == "ok").sum())
+    print(f"Batch done: {n_ok}/{len(summary)} sections ok in {time.perf_counter() - t0:.1f} s")
+    if n_ok < len(summary):
+        print("Failed:", ", ".join(summary.loc[summary["status"] != "ok", "section_id"]))
+    print("Batch summary:", os.path.join(args.outdir, "batch_summary.csv"))
+
+    if args.qa_plots and n_ok:
+        from .plot import render_sections
+
+        t0 = time.perf_counter()
+        ok = summary.loc[summary["status"] == "ok", "outdir"].tolist()
+        out = render_sections(ok, os.path.join(args.outdir, "qa"), jobs=args.cores)
+        n_fig = sum(not r["error"] for r in out)
+        print(f"QA figures: {n_fig}/{len(ok)} sections in {time.perf_counter() - t0:.1f} s ->",
+              os.path.join(args.outdir, "qa"))
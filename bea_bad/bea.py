@@ -1,12 +1,18 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional
+import time
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
+import pandas as pd
 import pymc as pm
+import pytensor.tensor as pt
 import arviz as az
+import xarray as xr
 
-from .utils import robust_mad, filter_outliers_within_span, bootstrap_min_prior_kde
+from .report import cpu_time
+from .sampling import AdaptiveSettings, SampleStats, TuningState, run_sampler
+from .utils import robust_mad, select_grains, bootstrap_min_prior_pdf
 
 
 @dataclass
@@ -17,6 +23,59 @@ class BEAResult:
     hdi95_low: float
     hdi95_high: float
     n_used: int
+    stats: Optional[SampleStats] = field(default=None, repr=False, compare=False)
+    # 本次拟合的分阶段耗时（秒）：prior_s, build_s, compile_s, sample_s, wall_s, cpu_s
+    timings: Dict[str, float] = field(default_factory=dict, repr=False, compare=False)
+    # E / tau / delta 的 draws（xarray.Dataset，delta 只含实际使用的颗粒）；grid 引擎没有 draws
+    posterior: Optional[object] = field(default=None, repr=False, compare=False)
+
+    def row(self) -> Dict[str, object]:
+        """bea_eruption_age_summary.csv 中的一行（不含采样统计、耗时与 draws）。"""
+        return {
+            f.name: getattr(self, f.name) for f in fields(self)
+            if f.name not in ("stats", "timings", "posterior")
+        }
+
+
+@dataclass
+class BEAInputs:
+    """过滤后的单个 ash 数据 + E 的先验设置（grid/pdf 为 None 时使用 Normal(mu0, sd0) 先验）。"""
+    ages: np.ndarray
+    sigmas: np.ndarray
+    tau_scale: float
+    grid: Optional[np.ndarray]
+    pdf: Optional[np.ndarray]
+    mu0: float
+    sd0: float
+
+
+KDE_GRID_SIZE = 2000
+
+
+def prepare_bea_inputs(
+    ages: np.ndarray,
+    sigmas: np.ndarray,
+    *,
+    use_bootstrap_prior: bool = True,
+    max_span_ma: float = 1.0,
+    seed: int = 42,
+) -> BEAInputs:
+    # 可选：按 1 My 规则做鲁棒过滤（论文是 BAD 前做；这里提前做有助于稳定）
+    ages2, sigmas2 = select_grains(ages, sigmas, max_span_ma=max_span_ma)
+
+    tau_scale = max(robust_mad(ages2), 0.02)
+    mu0 = float(ages2.min() - 0.05)
+    sd0 = max(float(robust_mad(ages2) * 3), 0.2)
+
+    grid = pdf = None
+    if use_bootstrap_prior and ages2.size >= 2:
+        grid = np.linspace(ages2.min() - 1.0, ages2.min() + 0.5, KDE_GRID_SIZE)
+        pdf = np.clip(bootstrap_min_prior_pdf(ages2, sigmas2, grid, n_boot=6000, seed=seed), 1e-300, None)
+
+    return BEAInputs(
+        ages=ages2, sigmas=sigmas2, tau_scale=float(tau_scale),
+        grid=grid, pdf=pdf, mu0=mu0, sd0=sd0
+    )
 
 
 def fit_bea_for_ash(
@@ -29,8 +88,16 @@ def fit_bea_for_ash(
     draws: int = 2000,
     tune: int = 2000,
     chains: int = 2,
+    cores: Optional[int] = None,
     target_accept: float = 0.9,
     seed: int = 42,
+    progressbar: bool = True,
+    reuse_model: bool = False,
+    engine: str = "nuts",
+    sampler: str = "pymc",
+    adaptive: Optional[AdaptiveSettings] = None,
+    warm_start: Optional[TuningState] = None,
+    warm_tune: int = 200,
 ) -> BEAResult:
     """
     BEA-like model:
@@ -38,50 +105,91 @@ def fit_bea_for_ash(
       delta_i ~ Exponential(1/tau) (晶体化年龄比喷发更老)
       obs_age_i ~ Normal(E + delta_i, sigma_i)
     E 的 prior：bootstrapped KDE（推荐）或宽正态先验（fallback）
+
+    cores: 该 ash 内并行运行的链数（None 时由 PyMC 自行决定）
+    reuse_model: True 时使用按形状分桶、只编译一次的模型（bea_model.ReusableBEAModel），
+                 逐 ash 替换数据而不重新构建/编译 pm.Model
+    engine: "nuts"（PyMC 采样）或 "grid"（把 delta 解析积分后在 (E, tau) 二维网格上求积，
+            见 bea_grid.fit_bea_grid；毫秒级、确定性，draws/tune/chains 等采样参数不起作用）
+    sampler: NUTS 后端（pymc / nutpie / numpyro / blackjax，见 sampling.run_sampler）；
+             重用已编译模型只适用于 pymc 后端
+    adaptive: 不为 None 时按收敛诊断分轮采样，draws/tune 不起作用（见 sampling.AdaptiveSettings）；
+              实际使用的 draws/tune 记在 stats 中
+    warm_start: 上次运行中该 ash 的调参状态（stats.tuning），只调参 warm_tune 步（见 sampling.run_sampler）
     """
-    ages = np.asarray(ages, dtype=float)
-    sigmas = np.asarray(sigmas, dtype=float)
+    if engine not in ("nuts", "grid"):
+        raise ValueError(f"engine 必须是 'nuts' 或 'grid'，得到 {engine!r}")
 
-    # 可选：按 1 My 规则做鲁棒过滤（论文是 BAD 前做；这里提前做有助于稳定）
-    ages2, sigmas2 = filter_outliers_within_span(ages, sigmas, max_span_ma=max_span_ma)
-    if ages2.size < 2:
-        ages2, sigmas2 = ages, sigmas
+    w0, c0 = time.perf_counter(), cpu_time()
+    inputs = prepare_bea_inputs(
+        ages, sigmas,
+        use_bootstrap_prior=use_bootstrap_prior, max_span_ma=max_span_ma, seed=seed
+    )
+    prior_s = time.perf_counter() - w0
+    build_s = 0.0
 
-    tau_scale = max(robust_mad(ages2), 0.02)
+    if engine == "grid":
+        from .bea_grid import fit_bea_grid
 
-    if use_bootstrap_prior and ages2.size >= 2:
-        kde = bootstrap_min_prior_kde(ages2, sigmas2, n_boot=6000, seed=seed)
-        grid = np.linspace(ages2.min() - 1.0, ages2.min() + 0.5, 2000)
-        pdf = np.clip(kde(grid), 1e-300, None)
-
-        with pm.Model() as m:
-            E = pm.Interpolated("E", x_points=grid, pdf_points=pdf)
-            tau = pm.HalfNormal("tau", sigma=tau_scale)
-            delta = pm.Exponential("delta", lam=1.0 / tau, shape=ages2.size)
-            pm.Normal("obs", mu=E + delta, sigma=sigmas2, observed=ages2)
-
-            idata = pm.sample(
-                draws=draws, tune=tune, chains=chains,
-                target_accept=target_accept, random_seed=seed,
-                progressbar=True
-            )
+        t0 = time.perf_counter()
+        res = fit_bea_grid(ash_id, inputs)
+        res.timings = dict(sample_s=time.perf_counter() - t0)
+    elif reuse_model and sampler == "pymc":
+        from .bea_model import get_reusable_model
+
+        rm = get_reusable_model(inputs, target_accept=target_accept)
+        idata, stats = rm.sample(
+            inputs,
+            draws=draws, tune=tune, chains=chains, cores=cores,
+            seed=seed, progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
+        )
+        res = summarize_bea(ash_id, idata, n_used=inputs.ages.size, stats=stats)
     else:
-        mu0 = float(ages2.min() - 0.05)
-        sd0 = max(float(robust_mad(ages2) * 3), 0.2)
-
-        with pm.Model() as m:
-            E = pm.Normal("E", mu=mu0, sigma=sd0)
-            tau = pm.HalfNormal("tau", sigma=tau_scale)
-            delta = pm.Exponential("delta", lam=1.0 / tau, shape=ages2.size)
-            pm.Normal("obs", mu=E + delta, sigma=sigmas2, observed=ages2)
-
-            idata = pm.sample(
-                draws=draws, tune=tune, chains=chains,
-                target_accept=target_accept, random_seed=seed,
-                progressbar=True
-            )
-
-    post_E = idata.posterior["E"].values.reshape(-1)
+        ages2, sigmas2, tau_scale = inputs.ages, inputs.sigmas, inputs.tau_scale
+
+        t0 = time.perf_counter()
+        if inputs.grid is not None:
+            with pm.Model() as m:
+                E = pm.Interpolated("E", x_points=inputs.grid, pdf_points=inputs.pdf)
+                tau = pm.HalfNormal("tau", sigma=tau_scale)
+                delta = pm.Exponential("delta", lam=1.0 / tau, shape=ages2.size)
+                pm.Normal("obs", mu=E + delta, sigma=sigmas2, observed=ages2)
+        else:
+            with pm.Model() as m:
+                E = pm.Normal("E", mu=inputs.mu0, sigma=inputs.sd0)
+                tau = pm.HalfNormal("tau", sigma=tau_scale)
+                delta = pm.Exponential("delta", lam=1.0 / tau, shape=ages2.size)
+                pm.Normal("obs", mu=E + delta, sigma=sigmas2, observed=ages2)
+        build_s = time.perf_counter() - t0
+
+        idata, stats = run_sampler(
+            m, sampler=sampler,
+            draws=draws, tune=tune, chains=chains, cores=cores,
+            target_accept=target_accept, seed=seed,
+            progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
+        )
+        res = summarize_bea(ash_id, idata, n_used=ages2.size, stats=stats)
+
+    if res.stats is not None:
+        res.timings = dict(compile_s=res.stats.compile_time_s, sample_s=res.stats.wall_time_s)
+    res.timings.update(
+        prior_s=prior_s, build_s=build_s,
+        wall_s=time.perf_counter() - w0, cpu_s=cpu_time() - c0
+    )
+    return res
+
+
+def summarize_bea(ash_id: str, idata, n_used: int, stats: Optional[SampleStats] = None) -> BEAResult:
+    res = _summarize_E(ash_id, idata.posterior["E"].values.reshape(-1), n_used, stats)
+    # 重用模型的 delta 按桶大小填充，只保留前 n_used 个
+    post = idata.posterior[["E", "tau", "delta"]]
+    res.posterior = post.isel(delta_dim_0=slice(0, int(n_used)))
+    return res
+
+
+def _summarize_E(ash_id: str, post_E: np.ndarray, n_used: int, stats: Optional[SampleStats] = None) -> BEAResult:
     hdi = az.hdi(post_E, hdi_prob=0.95)
 
     return BEAResult(
@@ -90,5 +198,144 @@ def fit_bea_for_ash(
         e_sd=float(np.std(post_E)),
         hdi95_low=float(hdi[0]),
         hdi95_high=float(hdi[1]),
-        n_used=int(ages2.size)
+        n_used=int(n_used),
+        stats=stats
     )
+
+
+def fit_bea_joint(
+    zircon: pd.DataFrame,
+    *,
+    use_bootstrap_prior: bool = True,
+    max_span_ma: float = 1.0,
+    draws: int = 2000,
+    tune: int = 2000,
+    chains: int = 2,
+    cores: Optional[int] = None,
+    target_accept: float = 0.9,
+    seed: int = 42,
+    progressbar: bool = True,
+    sampler: str = "pymc",
+    adaptive: Optional[AdaptiveSettings] = None,
+) -> List[BEAResult]:
+    """
+    所有 ash 放进同一个 PyMC 模型一次性拟合（一次编译、一次调参、一次 NUTS）：
+      E[a], tau[a]            每个 ash 一个
+      delta_j ~ Exponential(1/tau[ash_idx[j]])
+      obs_j ~ Normal(E[ash_idx[j]] + delta_j, sigma_j)
+    ash_idx 由 zircon 表按 ash_id 分组（过滤后）拼接得到。E 的先验与 fit_bea_for_ash 相同：
+    bootstrapped KDE 写成 Uniform(grid 范围) + log(插值 pdf)；Normal fallback 截断在 mu0 ± 8 sd0。
+    各 ash 之间的后验相互独立，输出与逐 ash 拟合相同的 BEAResult 行（按 ash_id 排序）。
+    """
+    from .parallel import ash_seed
+
+    w0, c0 = time.perf_counter(), cpu_time()
+    ash_ids, inputs = [], []
+    for ash_id, g in zircon.groupby("ash_id", observed=True):
+        ash_ids.append(ash_id)
+        inputs.append(prepare_bea_inputs(
+            g["age_ma"].to_numpy(float), g["sigma_ma"].to_numpy(float),
+            use_bootstrap_prior=use_bootstrap_prior, max_span_ma=max_span_ma,
+            seed=ash_seed(seed, ash_id)
+        ))
+    A = len(inputs)
+    if A == 0:
+        return []
+    prior_s = time.perf_counter() - w0
+
+    ages = np.concatenate([x.ages for x in inputs])
+    sigmas = np.concatenate([x.sigmas for x in inputs])
+    ash_idx = np.concatenate([np.full(x.ages.size, a) for a, x in enumerate(inputs)])
+
+    is_kde = np.array([x.grid is not None for x in inputs])
+    grids = np.empty((A, KDE_GRID_SIZE))
+    pdfs = np.ones((A, KDE_GRID_SIZE))
+    for a, x in enumerate(inputs):
+        if x.grid is not None:
+            grids[a], pdfs[a] = x.grid, x.pdf
+        else:
+            grids[a] = np.linspace(x.mu0 - 8 * x.sd0, x.mu0 + 8 * x.sd0, KDE_GRID_SIZE)
+    mu0 = np.array([x.mu0 for x in inputs])
+    sd0 = np.array([x.sd0 for x in inputs])
+    tau_scale = np.array([x.tau_scale for x in inputs])
+
+    dx = grids[:, 1] - grids[:, 0]
+    rows = np.arange(A)
+    pdfs = pt.as_tensor_variable(pdfs)
+
+    t0 = time.perf_counter()
+    with pm.Model() as m:
+        E = pm.Uniform("E", lower=grids[:, 0], upper=grids[:, -1], shape=A)
+        # 等距网格上的向量化线性插值（每个 ash 一行）
+        t = (E - grids[:, 0]) / dx
+        i = pt.clip(pt.floor(t), 0, KDE_GRID_SIZE - 2).astype("int64")
+        w = t - i
+        kde_logp = pt.log(pdfs[rows, i] * (1.0 - w) + pdfs[rows, i + 1] * w)
+        normal_logp = pm.logp(pm.Normal.dist(mu=mu0, sigma=sd0), E)
+        pm.Potential("E_prior", pt.sum(pt.switch(is_kde, kde_logp, normal_logp)))
+
+        tau = pm.HalfNormal("tau", sigma=tau_scale, shape=A)
+        delta = pm.Exponential("delta", lam=1.0 / tau[ash_idx], shape=ages.size)
+        pm.Normal("obs", mu=E[ash_idx] + delta, sigma=sigmas, observed=ages)
+
+    build_s = time.perf_counter() - t0
+
+    # 采样统计与耗时针对整个联合模型，附在每个 ash 的结果上
+    idata, stats = run_sampler(
+        m, sampler=sampler,
+        draws=draws, tune=tune, chains=chains, cores=cores,
+        target_accept=target_accept, seed=seed,
+        progressbar=progressbar, adaptive=adaptive
+    )
+
+    post = idata.posterior
+    post_E = post["E"].values.reshape(-1, A)
+    results = [
+        _summarize_E(ash_id, post_E[:, a], x.ages.size, stats)
+        for a, (ash_id, x) in enumerate(zip(ash_ids, inputs))
+    ]
+    # 拆成与逐 ash 拟合相同结构的 draws
+    for a, r in enumerate(results):
+        r.posterior = xr.Dataset({
+            "E": post["E"].isel(E_dim_0=a, drop=True),
+            "tau": post["tau"].isel(tau_dim_0=a, drop=True),
+            "delta": post["delta"].isel(delta_dim_0=np.flatnonzero(ash_idx == a)),
+        }).assign_coords(delta_dim_0=np.arange(inputs[a].ages.size))
+    timings = dict(
+        prior_s=prior_s, build_s=build_s, compile_s=stats.compile_time_s, sample_s=stats.wall_time_s,
+        wall_s=time.perf_counter() - w0, cpu_s=cpu_time() - c0
+    )
+    for r in results:
+        r.timings = dict(timings)
+    return results
+
+
+def compare_joint_vs_sequential(
+    zircon: pd.DataFrame, **fit_kwargs
+) -> Tuple[List[BEAResult], Dict[str, float]]:
+    """
+    对同一组 ash 分别计时联合模型与逐 ash 顺序拟合（同样的采样设置），
+    返回联合模型的结果以及耗时与加速比。
+    fit_kwargs 为两条路径共用的参数（use_bootstrap_prior, max_span_ma, draws, tune, ...）。
+    """
+    from .parallel import ash_seed
+
+    seed = fit_kwargs.pop("seed", 42)
+
+    t0 = time.perf_counter()
+    results = fit_bea_joint(zircon, seed=seed, **fit_kwargs)
+    t_joint = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for ash_id, g in zircon.groupby("ash_id", observed=True):
+        fit_bea_for_ash(
+            ash_id, g["age_ma"].to_numpy(float), g["sigma_ma"].to_numpy(float),
+            seed=ash_seed(seed, ash_id), **fit_kwargs
+        )
+    t_seq = time.perf_counter() - t0
+
+    return results, {
+        "joint_s": t_joint,
+        "sequential_s": t_seq,
+        "speedup": t_seq / t_joint if t_joint > 0 else float("nan"),
+    }
@@ -0,0 +1,154 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+
+import numpy as np
+from scipy.special import erfcx, log_ndtr
+
+from .bea import BEAInputs, BEAResult
+
+_LOG_FLOOR = -23.0  # exp(-23) ≈ 1e-10：低于峰值这么多的格点视为无后验质量
+
+
+def emg_logpdf(x: np.ndarray, mu: np.ndarray, lam: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    """
+    指数修正高斯（EMG）的对数密度：x = mu + delta + eps, delta ~ Exponential(lam), eps ~ N(0, sigma)。
+    即 BEA 模型中把每颗锆石的 delta_i 积分掉之后的似然。参数按 numpy 规则广播。
+    y = lam*sigma - (x-mu)/sigma > 0 时用 erfcx 形式，避免 tau → 0（lam 很大）时的相消。
+    """
+    z = (x - mu) / sigma
+    y = lam * sigma - z
+    log_lam = np.log(lam)
+    pos = y > 0
+    ys = np.where(pos, y, 0.0)
+    tail = log_lam - 0.5 * z * z + np.log(0.5 * erfcx(ys / np.sqrt(2.0)))
+    body = log_lam - lam * sigma * z + 0.5 * (lam * sigma) ** 2 + log_ndtr(-np.where(pos, 0.0, y))
+    return np.where(pos, tail, body)
+
+
+def _log_prior_E(e: np.ndarray, inputs: BEAInputs) -> np.ndarray:
+    if inputs.grid is not None:
+        pdf = np.interp(e, inputs.grid, inputs.pdf, left=1e-300, right=1e-300)
+        return np.log(np.clip(pdf, 1e-300, None))
+    return -0.5 * ((e - inputs.mu0) / inputs.sd0) ** 2
+
+
+def _log_posterior(e: np.ndarray, tau: np.ndarray, inputs: BEAInputs, max_block: int = 2**22) -> np.ndarray:
+    """(len(e), len(tau)) 网格上的未归一化对数后验；按颗粒分块累加，工作内存有界。"""
+    E = e[:, None, None]
+    lam = 1.0 / tau[None, :, None]
+    lp = _log_prior_E(e, inputs)[:, None] - 0.5 * (tau / inputs.tau_scale)[None, :] ** 2
+
+    per = max(1, max_block // (e.size * tau.size))
+    for s in range(0, inputs.ages.size, per):
+        x = inputs.ages[None, None, s:s + per]
+        sg = inputs.sigmas[None, None, s:s + per]
+        lp = lp + emg_logpdf(x, E, lam, sg).sum(axis=2)
+    return lp
+
+
+def _support(axis: np.ndarray, mass: np.ndarray) -> Tuple[float, float]:
+    idx = np.flatnonzero(mass)
+    lo = axis[max(idx[0] - 1, 0)]
+    hi = axis[min(idx[-1] + 1, axis.size - 1)]
+    return float(lo), float(hi)
+
+
+def grid_posterior(
+    inputs: BEAInputs,
+    *,
+    n_e: int = 512,
+    n_tau: int = 256,
+    coarse: int = 128,
+    max_expand: int = 6,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    自适应二维网格后验 p(E, tau | data)：
+      1) 在先验范围上做粗网格，若质量贴到 tau 上界则把上界加倍（最多 max_expand 次）
+      2) 取对数后验高于峰值 exp(-23) 的外接框，在框内用 n_e × n_tau 细网格重新求值
+    返回 (e_grid, tau_grid, 归一化后验权重)，权重和为 1。
+    """
+    if inputs.grid is not None:
+        e_lo, e_hi = float(inputs.grid[0]), float(inputs.grid[-1])
+    else:
+        e_lo, e_hi = inputs.mu0 - 8 * inputs.sd0, inputs.mu0 + 8 * inputs.sd0
+    tau_hi = 6.0 * inputs.tau_scale
+
+    for _ in range(max_expand + 1):
+        e = np.linspace(e_lo, e_hi, coarse)
+        tau = np.linspace(tau_hi / coarse, tau_hi, coarse)
+        lp = _log_posterior(e, tau, inputs)
+        keep = lp > lp.max() + _LOG_FLOOR
+        if not keep[:, -1].any():
+            break
+        tau_hi *= 2.0
+
+    e_lo, e_hi = _support(e, keep.any(axis=1))
+    t_lo, t_hi = _support(tau, keep.any(axis=0))
+    t_lo = max(t_lo, tau_hi * 1e-6)
+
+    e = np.linspace(e_lo, e_hi, n_e)
+    tau = np.linspace(t_lo, t_hi, n_tau)
+    lp = _log_posterior(e, tau, inputs)
+    w = np.exp(lp - lp.max())
+    return e, tau, w / w.sum()
+
+
+def hdi_from_grid(x: np.ndarray, p: np.ndarray, hdi_prob: float = 0.95) -> Tuple[float, float]:
+    """
+    离散分布（等距 x、概率 p）的最窄区间：对每个左端点找满足质量的最小右端点；
+    等距网格上宽度相同的候选很多，取其中质量最大者（否则会系统性偏向左侧）。
+    """
+    cdf = np.concatenate([[0.0], np.cumsum(p)])
+    right = np.searchsorted(cdf, cdf[:-1] + hdi_prob, side="left")
+    ok = right <= x.size
+    left = np.flatnonzero(ok)
+    right = right[ok] - 1
+    n_cells = right - left
+    cand = np.flatnonzero(n_cells == n_cells.min())
+    i = cand[np.argmax(cdf[right[cand] + 1] - cdf[left[cand]])]
+    return float(x[left[i]]), float(x[right[i]])
+
+
+def fit_bea_grid(ash_id: str, inputs: BEAInputs, **grid_kwargs) -> BEAResult:
+    """确定性的网格求积 BEA：delta_i 解析积分（EMG 似然），只剩 (E, tau) 二维。"""
+    e, tau, w = grid_posterior(inputs, **grid_kwargs)
+    pe = w.sum(axis=1)
+    mean = float(np.sum(pe * e))
+    sd = float(np.sqrt(np.sum(pe * (e - mean) ** 2)))
+    lo, hi = hdi_from_grid(e, pe, 0.95)
+    return BEAResult(
+        ash_id=ash_id,
+        e_mean=mean,
+        e_sd=sd,
+        hdi95_low=lo,
+        hdi95_high=hi,
+        n_used=int(inputs.ages.size)
+    )
+
+
+def cross_check_bea(
+    ash_id: str,
+    ages: np.ndarray,
+    sigmas: np.ndarray,
+    **fit_kwargs,
+) -> Dict[str, object]:
+    """
+    同一个 ash 分别用 engine="grid" 与 engine="nuts" 拟合，返回两者的结果与差异：
+    d_mean_sd 为均值差除以 NUTS 后验标准差，d_sd_rel / d_hdi_* 为相对/绝对差。
+    """
+    from .bea import fit_bea_for_ash
+
+    fit_kwargs = {k: v for k, v in fit_kwargs.items() if k != "engine"}
+    g = fit_bea_for_ash(ash_id, ages, sigmas, engine="grid", **fit_kwargs)
+    n = fit_bea_for_ash(ash_id, ages, sigmas, engine="nuts", **fit_kwargs)
+    return {
+        "ash_id": ash_id,
+        "grid_e_mean": g.e_mean,
+        "nuts_e_mean": n.e_mean,
+        "grid_e_sd": g.e_sd,
+        "nuts_e_sd": n.e_sd,
+        "d_mean_sd": (g.e_mean - n.e_mean) / n.e_sd if n.e_sd > 0 else float("nan"),
+        "d_sd_rel": (g.e_sd - n.e_sd) / n.e_sd if n.e_sd > 0 else float("nan"),
+        "d_hdi95_low": g.hdi95_low - n.hdi95_low,
+        "d_hdi95_high": g.hdi95_high - n.hdi95_high,
+    }
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pymc as pm
+import pytensor.tensor as pt
+
+from .bea import BEAInputs, KDE_GRID_SIZE
+from .sampling import AdaptiveSettings, TuningState, reset_initial_mean, run_sampler
+
+MIN_BUCKET = 8
+
+
+def shape_bucket(n: int) -> int:
+    """把颗粒数向上取到 2 的幂（至少 MIN_BUCKET），同一桶内的 ash 共用一个已编译模型。"""
+    n = max(int(n), 1)
+    return max(MIN_BUCKET, 1 << (n - 1).bit_length())
+
+
+def _interp_uniform_grid(x, grid, pdf):
+    """在等距网格上做线性插值（与 pm.Interpolated 的 k=1 样条一致），grid/pdf 可为共享变量。"""
+    n = grid.shape[0]
+    dx = grid[1] - grid[0]
+    t = (x - grid[0]) / dx
+    i = pt.clip(pt.floor(t), 0, n - 2).astype("int64")
+    w = t - i
+    return pdf[i] * (1.0 - w) + pdf[i + 1] * w
+
+
+class ReusableBEAModel:
+    """
+    只构建/编译一次的 BEA 模型：ages、sigmas、KDE grid/pdf、tau_scale 都是 pm.Data，
+    颗粒数按 shape_bucket 填充并用 mask 屏蔽，逐 ash 只需 pm.set_data。
+
+    与 fit_bea_for_ash 的逐 ash 模型在数学上等价：
+      - E 的 KDE 先验写成 Uniform(grid 范围) + log(线性插值 pdf) 的 Potential
+      - delta 的 Exponential(1/tau) 先验与似然都乘以 mask；填充位置的 delta 只是
+        独立的 Exponential(1) 维度，不影响 E / tau 的后验
+    """
+
+    def __init__(self, prior: str, bucket: int, *, target_accept: float = 0.9):
+        if prior not in ("kde", "normal"):
+            raise ValueError(f"prior 必须是 'kde' 或 'normal'，得到 {prior!r}")
+        self.prior = prior
+        self.bucket = int(bucket)
+
+        t0 = time.perf_counter()
+        with pm.Model() as m:
+            ages = pm.Data("ages", np.zeros(self.bucket))
+            sigmas = pm.Data("sigmas", np.ones(self.bucket))
+            mask = pm.Data("mask", np.zeros(self.bucket))
+            tau_scale = pm.Data("tau_scale", 1.0)
+
+            if prior == "kde":
+                grid = pm.Data("grid", np.linspace(0.0, 1.0, KDE_GRID_SIZE))
+                pdf = pm.Data("pdf", np.ones(KDE_GRID_SIZE))
+                E = pm.Uniform("E", lower=grid[0], upper=grid[-1])
+                pm.Potential("E_prior", pt.log(_interp_uniform_grid(E, grid, pdf)))
+            else:
+                mu0 = pm.Data("mu0", 0.0)
+                sd0 = pm.Data("sd0", 1.0)
+                E = pm.Normal("E", mu=mu0, sigma=sd0)
+
+            tau = pm.HalfNormal("tau", sigma=tau_scale)
+            delta = pm.HalfFlat("delta", shape=self.bucket)
+            delta_logp = pt.switch(
+                mask > 0,
+                pm.logp(pm.Exponential.dist(lam=1.0 / tau), delta),
+                pm.logp(pm.Exponential.dist(lam=1.0), delta),
+            )
+            pm.Potential("delta_prior", pt.sum(delta_logp))
+            obs_logp = pm.logp(pm.Normal.dist(mu=E + delta, sigma=sigmas), ages)
+            pm.Potential("obs", pt.sum(mask * obs_logp))
+
+            # 编译 logp/dlogp（整个运行只做一次）
+            self.step = pm.NUTS(target_accept=target_accept)
+
+        self.model = m
+        # 构建 + 编译耗时；只计入第一次 sample 的 SampleStats.compile_time_s
+        self.compile_time_s = time.perf_counter() - t0
+        self._compile_reported = False
+
+    def set_inputs(self, inputs: BEAInputs) -> None:
+        n = inputs.ages.size
+        if n > self.bucket:
+            raise ValueError(f"{n} 个颗粒超出模型桶大小 {self.bucket}")
+
+        ages = np.full(self.bucket, float(inputs.ages.min()))
+        sigmas = np.ones(self.bucket)
+        mask = np.zeros(self.bucket)
+        ages[:n] = inputs.ages
+        sigmas[:n] = inputs.sigmas
+        mask[:n] = 1.0
+
+        data = {"ages": ages, "sigmas": sigmas, "mask": mask, "tau_scale": inputs.tau_scale}
+        if self.prior == "kde":
+            data.update(grid=inputs.grid, pdf=inputs.pdf)
+        else:
+            data.update(mu0=inputs.mu0, sd0=inputs.sd0)
+        pm.set_data(data, model=self.model)
+
+    def _initvals(self, inputs: BEAInputs, chains: int, seed: int) -> List[Dict[str, np.ndarray]]:
+        # 重用 step 时 pm.sample 不做 jitter 初始化，这里按链给出随机初值
+        rng = np.random.default_rng(seed)
+        a_min = float(inputs.ages.min())
+        if self.prior == "kde":
+            lo, hi = float(inputs.grid[0]), float(inputs.grid[-1])
+        else:
+            lo, hi = inputs.mu0 - inputs.sd0, inputs.mu0 + inputs.sd0
+        out = []
+        for _ in range(chains):
+            e0 = a_min - inputs.tau_scale * rng.uniform(0.0, 1.0)
+            out.append({
+                "E": np.float64(np.clip(e0, lo + 1e-6 * (hi - lo), hi - 1e-6 * (hi - lo))),
+                "tau": np.float64(inputs.tau_scale * rng.uniform(0.5, 1.5)),
+                "delta": rng.uniform(0.5, 1.5, size=self.bucket) * np.where(
+                    np.arange(self.bucket) < inputs.ages.size, inputs.tau_scale, 1.0
+                ),
+            })
+        return out
+
+    def sample(
+        self,
+        inputs: BEAInputs,
+        *,
+        draws: int = 2000,
+        tune: int = 2000,
+        chains: int = 2,
+        cores: Optional[int] = None,
+        seed: int = 42,
+        progressbar: bool = True,
+        adaptive: Optional[AdaptiveSettings] = None,
+        warm_start: Optional[TuningState] = None,
+        warm_tune: int = 200,
+    ):
+        """返回 (idata, SampleStats)。"""
+        self.set_inputs(inputs)
+        initvals = self._initvals(inputs, chains, seed)
+        reset_initial_mean(self.model, self.step, initvals)
+        idata, stats = run_sampler(
+            self.model, sampler="pymc",
+            draws=draws, tune=tune, chains=chains, cores=cores,
+            step=self.step, seed=seed,
+            initvals=initvals,
+            progressbar=progressbar, adaptive=adaptive,
+            warm_start=warm_start, warm_tune=warm_tune
+        )
+        if not self._compile_reported:
+            stats.compile_time_s = self.compile_time_s
+            self._compile_reported = True
+        return idata, stats
+
+
+# 每个进程一份：并行 BEA 中每个 worker 各自编译一次
+_MODELS: Dict[Tuple[str, int, float], ReusableBEAModel] = {}
+
+
+def get_reusable_model(inputs: BEAInputs, *, target_accept: float = 0.9) -> ReusableBEAModel:
+    prior = "kde" if inputs.grid is not None else "normal"
+    key = (prior, shape_bucket(inputs.ages.size), float(target_accept))
+    rm = _MODELS.get(key)
+    if rm is None:
+        rm = ReusableBEAModel(prior, key[1], target_accept=target_accept)
+        _MODELS[key] = rm
+    return rm
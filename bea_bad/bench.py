@@ -0,0 +1,456 @@
+from __future__ import annotations
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .dataio import InputData, read_query_depths
+from .report import StageTimer
+
+
+# 导入 bea_bad.cli 时不应被加载的模块（只在需要它们的阶段里导入）
+HEAVY_MODULES = ("pymc", "pytensor", "arviz", "scipy.stats", "matplotlib.pyplot")
+
+
+@dataclass
+class BenchCase:
+    n_ash: int = 8             # 火山灰层数（BEA 拟合的 ash 数）
+    grains_per_ash: int = 20
+    n_query: int = 300         # query 深度网格大小
+    n_ties: Optional[int] = None  # BAD 的 tie point 数；None 时等于 n_ash（tie 年龄来自 BEA 结果）
+
+
+def synthetic_section(
+    n_ash: int = 8,
+    grains_per_ash: int = 20,
+    *,
+    seed: int = 0,
+    top_age_ma: float = 250.0,
+    rate_ma_per_m: float = 0.05,
+    spacing_m: float = 10.0,
+    sigma_ma: float = 0.05,
+    tau_ma: float = 0.1,
+) -> InputData:
+    """
+    合成剖面：深度向下为正、年龄随深度增加（与示例 CSV 相同的约定）。
+      depth_a = spacing_m * (a + 1) + 抖动，真实喷发年龄 E_a = top_age_ma + rate_ma_per_m * depth_a
+      每颗锆石 age = E_a + Exponential(tau_ma) + Normal(0, sigma_i)，sigma_i 在 sigma_ma 附近对数正态扰动
+    返回的 zircon / tiepoints 表与 read_inputs 的列一致（ash_id, zircon_id, age_ma, sigma_ma / ash_id, depth_m）。
+    """
+    if n_ash < 2:
+        raise ValueError("合成剖面至少需要 2 个 ash（BAD 至少需要 2 个 tie points）")
+    rng = np.random.default_rng(seed)
+
+    ash_ids = [f"SYN-{a:03d}" for a in range(n_ash)]
+    depths = spacing_m * (np.arange(n_ash) + 1) + rng.uniform(-0.25, 0.25, n_ash) * spacing_m
+    e_true = top_age_ma + rate_ma_per_m * depths
+
+    n = n_ash * grains_per_ash
+    sig = sigma_ma * rng.lognormal(0.0, 0.3, n)
+    ages = np.repeat(e_true, grains_per_ash) + rng.exponential(tau_ma, n) + rng.normal(0.0, sig)
+
+    zircon = pd.DataFrame({
+        "ash_id": np.repeat(ash_ids, grains_per_ash),
+        "zircon_id": [f"{a}_z{i}" for a in ash_ids for i in range(grains_per_ash)],
+        "age_ma": ages,
+        "sigma_ma": sig,
+    })
+    tiepoints = pd.DataFrame({"ash_id": ash_ids, "depth_m": depths})
+    return InputData(zircon=zircon, tiepoints=tiepoints)
+
+
+def synthetic_ties(
+    n_ties: int,
+    *,
+    seed: int = 0,
+    top_age_ma: float = 250.0,
+    rate_ma_per_m: float = 0.05,
+    spacing_m: float = 10.0,
+    sd_ma: float = 0.05,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    只给 BAD 用的合成 tie points（不经过 BEA），深度与真实年龄的生成方式同 synthetic_section：
+    观测年龄 = 真实年龄 + Normal(0, sd_ma)。spacing_m * rate_ma_per_m 与 sd_ma 相当时相邻 tie 的年龄会乱序。
+    返回按深度排序的 (depth_m, E_obs, E_sd, 真实年龄)。
+    """
+    rng = np.random.default_rng(seed)
+    depths = np.sort(spacing_m * (np.arange(n_ties) + 1) + rng.uniform(-0.25, 0.25, n_ties) * spacing_m)
+    e_true = top_age_ma + rate_ma_per_m * depths
+    return depths, e_true + rng.normal(0.0, sd_ma, n_ties), np.full(n_ties, sd_ma), e_true
+
+
+def write_section(data: InputData, outdir: str) -> Tuple[str, str]:
+    """把合成剖面写成 CLI 可直接读取的 zircon.csv / tiepoints.csv。"""
+    from .utils import ensure_dir
+
+    ensure_dir(outdir)
+    zircon_path = os.path.join(outdir, "zircon.csv")
+    tie_path = os.path.join(outdir, "tiepoints.csv")
+    data.zircon.to_csv(zircon_path, index=False)
+    data.tiepoints.to_csv(tie_path, index=False)
+    return zircon_path, tie_path
+
+
+def _environment() -> Dict[str, object]:
+    import pymc as pm
+    import pytensor
+
+    from . import __version__
+    from .parallel import available_cores
+
+    return {
+        "bea_bad": __version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pymc": pm.__version__,
+        "pytensor": pytensor.__version__,
+        "platform": platform.platform(),
+        "cores": available_cores(),
+    }
+
+
+def run_case(
+    case: BenchCase,
+    *,
+    draws: int = 500,
+    tune: int = 500,
+    bad_draws: int = 1000,
+    bad_tune: int = 1000,
+    chains: int = 2,
+    cores: int = 1,
+    target_accept: float = 0.9,
+    sampler: str = "pymc",
+    seed: int = 42,
+    workdir: Optional[str] = None,
+    bad_model: str = "ordered",
+) -> Dict[str, object]:
+    """
+    在合成剖面上跑一遍完整流程并分阶段计时（bad_model 见 bad.build_bad_model）：
+      bea_prior          bootstrapped KDE 先验（prepare_bea_inputs）
+      bea_build_compile  构建并编译 BEA 模型（按颗粒数分桶，每桶一次）
+      bea_sample         BEA 采样（所有 ash 合计）
+      bad_build          构建 BAD 模型
+      bad_compile        编译 BAD 的 NUTS（logp + 梯度）
+      bad_sample         BAD 采样
+      bad_postprocess    tie / query 年龄汇总（summarize_bad）
+      netcdf_write       写 bad_posterior.nc
+      plot               plot_age_depth
+    case.n_ties 不为 None 且不等于 n_ash 时，BAD 改用 synthetic_ties(n_ties) 的 tie points（同一生成方式），
+    BEA 与 BAD 的规模可以分开变化。
+    cores 默认为 1：链在本进程内顺序运行，各阶段的 cpu_s 与 wall_s 直接可比。
+    非 pymc 后端由后端自己编译，此时 *_compile 阶段只含 PyMC 侧的开销。
+    """
+    import pymc as pm
+
+    from .bad import build_bad_model, sort_tiepoints, summarize_bad
+    from .bea import prepare_bea_inputs, summarize_bea
+    from .bea_model import ReusableBEAModel, shape_bucket
+    from .parallel import ash_seed
+    from .plot import plot_age_depth
+    from .sampling import resolve_sampler, run_sampler
+
+    sampler = resolve_sampler(sampler)
+    workdir = workdir or tempfile.mkdtemp(prefix="bea_bad_bench_")
+    data = synthetic_section(case.n_ash, case.grains_per_ash, seed=seed)
+    qdepths = read_query_depths(None, data.tiepoints, n_grid=case.n_query)
+
+    timer = StageTimer()
+    t_start = time.perf_counter()
+
+    # ---- BEA（与 CLI 默认路径一致：已编译模型逐 ash 重用）
+    models: Dict[Tuple[str, int], ReusableBEAModel] = {}
+    bea_stats = []
+    rows = []
+    for ash_id, g in data.zircon.groupby("ash_id"):
+        with timer.stage("bea_prior"):
+            inputs = prepare_bea_inputs(
+                g["age_ma"].to_numpy(float), g["sigma_ma"].to_numpy(float),
+                seed=ash_seed(seed, ash_id)
+            )
+        key = ("kde" if inputs.grid is not None else "normal", shape_bucket(inputs.ages.size))
+        if key not in models:
+            with timer.stage("bea_build_compile"):
+                models[key] = ReusableBEAModel(key[0], key[1], target_accept=target_accept)
+        with timer.stage("bea_sample"):
+            idata, stats = models[key].sample(
+                inputs, draws=draws, tune=tune, chains=chains, cores=cores,
+                seed=ash_seed(seed, ash_id), progressbar=False
+            )
+        res = summarize_bea(ash_id, idata, n_used=inputs.ages.size, stats=stats)
+        rows.append(res.row())
+        bea_stats.append(stats)
+
+    bea_df = pd.DataFrame(rows).merge(data.tiepoints, on="ash_id")
+
+    # ---- BAD
+    n_ties = case.n_ash if case.n_ties is None else case.n_ties
+    if n_ties != case.n_ash:
+        d_obs, E_obs, E_sd, _ = synthetic_ties(n_ties, seed=seed)
+        qdepths = read_query_depths(None, pd.DataFrame({"depth_m": d_obs}), n_grid=case.n_query)
+    with timer.stage("bad_build"):
+        if n_ties == case.n_ash:
+            d_obs, E_obs, E_sd = sort_tiepoints(
+                bea_df["depth_m"].to_numpy(float), bea_df["e_mean"].to_numpy(float), bea_df["e_sd"].to_numpy(float)
+            )
+        m = build_bad_model(d_obs, E_obs, E_sd, model=bad_model)
+    step = None
+    if sampler == "pymc":
+        with timer.stage("bad_compile"):
+            step = pm.NUTS(model=m, target_accept=target_accept)
+    with timer.stage("bad_sample"):
+        idata, bad_stats = run_sampler(
+            m, sampler=sampler, draws=bad_draws, tune=bad_tune, chains=chains, cores=cores,
+            target_accept=target_accept, seed=seed, progressbar=False, step=step
+        )
+    with timer.stage("bad_postprocess"):
+        tie_summary, query_summary = summarize_bad(idata, d_obs, E_obs, E_sd, qdepths)
+    with timer.stage("netcdf_write"):
+        idata.to_netcdf(os.path.join(workdir, "bad_posterior.nc"))
+    with timer.stage("plot"):
+        plot_age_depth(tie_summary, query_summary, outdir=workdir)
+
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "case": asdict(case),
+        "settings": dict(
+            draws=draws, tune=tune, bad_draws=bad_draws, bad_tune=bad_tune, chains=chains,
+            cores=cores, target_accept=target_accept, sampler=sampler, seed=seed, bad_model=bad_model
+        ),
+        "total_wall_s": time.perf_counter() - t_start,
+        "stages": timer.stages,
+        "bea": {
+            "divergences": int(sum(s.divergences for s in bea_stats)),
+            "ess_bulk_min": float(min(s.ess_bulk_min for s in bea_stats)),
+            "rhat_max": float(max(s.rhat_max for s in bea_stats)),
+        },
+        "bad": bad_stats.row(),
+    }
+
+
+def run_bad_scaling(
+    n_ties: List[int],
+    models: List[str],
+    out_path: str,
+    *,
+    draws: int = 1000,
+    tune: int = 1000,
+    chains: int = 2,
+    cores: int = 1,
+    target_accept: float = 0.9,
+    sampler: str = "pymc",
+    seed: int = 42,
+    spacing_m: float = 10.0,
+    sd_ma: float = 0.05,
+) -> List[Dict[str, object]]:
+    """
+    只对 BAD 计时：每个 tie point 个数 K × 每种 BAD 参数化，在同一组合成 tie points（synthetic_ties）上
+    构建、编译并采样，记录（每条一行 JSON 追加到 out_path）：
+      build_s / compile_s / sample_s   构建、编译（pymc 后端）与采样的墙钟时间
+      steps_per_draw                   每个 draw 的平均 leapfrog 步数（与 K 的关系决定可扩展性）
+      max_treedepth_frac               达到最大树深的 draw 比例
+      ess_bulk_per_s, divergences, rhat_max ...   采样诊断（SampleStats）
+      coverage95                       真实 tie 年龄落在 tiepoint_summary 95% ETI 内的比例
+    """
+    import pymc as pm
+
+    from .bad import build_bad_model, summarize_bad
+    from .sampling import resolve_sampler, run_sampler
+
+    sampler = resolve_sampler(sampler)
+    records = []
+    for K, model in itertools.product(n_ties, models):
+        d_obs, E_obs, E_sd, e_true = synthetic_ties(K, seed=seed, spacing_m=spacing_m, sd_ma=sd_ma)
+        timer = StageTimer()
+        with timer.stage("build"):
+            m = build_bad_model(d_obs, E_obs, E_sd, model=model)
+        step = None
+        if sampler == "pymc":
+            with timer.stage("compile"):
+                step = pm.NUTS(model=m, target_accept=target_accept)
+        with timer.stage("sample"):
+            idata, stats = run_sampler(
+                m, sampler=sampler, draws=draws, tune=tune, chains=chains, cores=cores,
+                target_accept=target_accept, seed=seed, progressbar=False, step=step
+            )
+        tie_summary, _ = summarize_bad(idata, d_obs, E_obs, E_sd, d_obs[:1])
+        ss = idata.sample_stats
+        rec = {
+            "benchmark": "bad_scaling",
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "environment": _environment(),
+            "n_ties": K,
+            "bad_model": model,
+            "settings": dict(draws=draws, tune=tune, chains=chains, cores=cores, target_accept=target_accept,
+                             sampler=sampler, seed=seed, spacing_m=spacing_m, sd_ma=sd_ma),
+            "build_s": timer.stages["build"]["wall_s"],
+            "compile_s": timer.stages.get("compile", {}).get("wall_s"),
+            "sample_s": timer.stages["sample"]["wall_s"],
+            "steps_per_draw": float(ss["n_steps"].mean()) if "n_steps" in ss else None,
+            "max_treedepth_frac": float(ss["reached_max_treedepth"].mean()) if "reached_max_treedepth" in ss else None,
+            "coverage95": float(np.mean((tie_summary["age_model_eti95_low_ma"] <= e_true)
+                                        & (e_true <= tie_summary["age_model_eti95_high_ma"]))),
+            "bad": stats.row(),
+        }
+        with open(out_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+        records.append(rec)
+        steps = f"{rec['steps_per_draw']:.0f} steps/draw, " if rec["steps_per_draw"] is not None else ""
+        print(
+            f"K={K} {model}: sample {rec['sample_s']:.1f} s, {steps}"
+            f"ESS/s {stats.ess_bulk_per_s:.1f}, divergences {stats.divergences}, coverage {rec['coverage95']:.2f}"
+        )
+    return records
+
+
+def run_startup(repeat: int = 5) -> Dict[str, object]:
+    """
+    启动时间基准（与 PyInstaller 打包的 GUI、--help 和参数错误的响应速度直接相关）：
+      help_wall_s      `python -m bea_bad --help` 的墙钟时间（repeat 次的最小值 / 中位数）
+      cli_import_s     python -X importtime 测得的 bea_bad.cli 累计导入时间（最小值）
+      heavy_modules    导入 bea_bad.cli 后已加载的 HEAVY_MODULES（应为空）
+    """
+    walls, imports = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "bea_bad", "--help"], check=True, capture_output=True)
+        walls.append(time.perf_counter() - t0)
+
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import bea_bad.cli"],
+            check=True, capture_output=True, text=True
+        ).stderr
+        line = next(ln for ln in out.splitlines() if ln.rstrip().endswith("| bea_bad.cli"))
+        imports.append(int(line.split("|")[1]) / 1e6)
+
+    probe = (
+        "import sys, bea_bad.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    loaded = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True).stdout.strip()
+
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "kind": "startup",
+        "repeat": repeat,
+        "help_wall_s": {"min": min(walls), "median": statistics.median(walls)},
+        "cli_import_s": min(imports),
+        "heavy_modules": [m for m in loaded.split(",") if m],
+    }
+
+
+def run_benchmark(
+    cases: List[BenchCase], out_path: str, *, repeat: int = 1, **run_kwargs
+) -> List[Dict[str, object]]:
+    """逐个 case 运行 run_case，每条记录作为一行 JSON 追加到 out_path（JSON Lines）。"""
+    records = []
+    for case in cases:
+        for r in range(repeat):
+            rec = run_case(case, **run_kwargs)
+            rec["repeat"] = r
+            with open(out_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+            records.append(rec)
+            stages = ", ".join(f"{k} {v['wall_s']:.2f}s" for k, v in rec["stages"].items())
+            print(
+                f"n_ash={case.n_ash} n_ties={case.n_ties or case.n_ash} "
+                f"grains={case.grains_per_ash} n_query={case.n_query} "
+                f"[{r}]: {rec['total_wall_s']:.1f} s ({stages})"
+            )
+    return records
+
+
+def main():
+    from .bad import BAD_MODELS
+    from .sampling import SAMPLERS
+
+    ap = argparse.ArgumentParser("bea_bad.bench")
+    ap.add_argument("--n_ash", type=int, nargs="+", default=[8],
+                    help="numbers of ashes to benchmark (also the BAD tie points unless --n_ties is given)")
+    ap.add_argument("--n_ties", type=int, nargs="+", default=None,
+                    help="numbers of BAD tie points, varied independently of --n_ash (synthetic ties; "
+                         "with --bad_scaling: the tie-point counts)")
+    ap.add_argument("--grains_per_ash", type=int, nargs="+", default=[20])
+    ap.add_argument("--n_query", type=int, nargs="+", default=[300])
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--bea_draws", type=int, default=500)
+    ap.add_argument("--bea_tune", type=int, default=500)
+    ap.add_argument("--bad_draws", type=int, default=1000)
+    ap.add_argument("--bad_tune", type=int, default=1000)
+    ap.add_argument("--cores", type=int, default=1, help="cores per sampler call (1: chains run in-process)")
+    ap.add_argument("--sampler", choices=SAMPLERS, default="pymc",
+                    help="NUTS backend (falls back to pymc if not installed)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="bench_results.jsonl", help="JSON Lines file; records are appended")
+    ap.add_argument("--workdir", default=None, help="where posterior/figure files are written (default: temp dir)")
+    ap.add_argument("--startup", action="store_true",
+                    help="only time start-up ('python -m bea_bad --help' and the bea_bad.cli import)")
+    ap.add_argument("--bad_model", nargs="+", default=["ordered"], choices=BAD_MODELS,
+                    help="BAD parameterizations to benchmark (each is run for every case)")
+    ap.add_argument("--bad_scaling", action="store_true",
+                    help="only time BAD on synthetic tie points: --n_ties (or --n_ash) gives the tie-point counts")
+    ap.add_argument("--spacing_m", type=float, default=10.0,
+                    help="--bad_scaling: mean tie-point spacing (m); at 0.05 Ma/m, 1 m makes neighbouring ages overlap")
+    args = ap.parse_args()
+
+    if args.startup:
+        rec = run_startup(repeat=max(args.repeat, 3))
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+        print(
+            f"--help: {rec['help_wall_s']['min']:.2f} s (median {rec['help_wall_s']['median']:.2f} s), "
+            f"import bea_bad.cli: {rec['cli_import_s']:.2f} s, "
+            f"heavy modules loaded: {', '.join(rec['heavy_modules']) or 'none'}"
+        )
+        print("Results:", args.out)
+        return
+
+    if args.bad_scaling:
+        run_bad_scaling(
+            args.n_ties or args.n_ash, args.bad_model, args.out,
+            draws=args.bad_draws,
+            tune=args.bad_tune,
+            cores=args.cores,
+            sampler=args.sampler,
+            seed=args.seed,
+            spacing_m=args.spacing_m
+        )
+        print("Results:", args.out)
+        return
+
+    cases = [
+        BenchCase(a, g, q, k)
+        for a, g, q, k in itertools.product(args.n_ash, args.grains_per_ash, args.n_query, args.n_ties or [None])
+    ]
+    for bad_model in args.bad_model:
+        run_benchmark(
+            cases, args.out,
+            repeat=args.repeat,
+            draws=args.bea_draws,
+            tune=args.bea_tune,
+            bad_draws=args.bad_draws,
+            bad_tune=args.bad_tune,
+            cores=args.cores,
+            sampler=args.sampler,
+            seed=args.seed,
+            workdir=args.workdir,
+            bad_model=bad_model
+        )
+    print("Results:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import __version__
+from .utils import ensure_dir, select_grains
+
+
+def _canonical(obj: Any) -> Any:
+    """转换为可稳定序列化的结构；ndarray 用 dtype/shape/内容哈希表示。"""
+    if isinstance(obj, np.ndarray):
+        a = np.ascontiguousarray(obj)
+        return {
+            "__ndarray__": hashlib.sha256(a.tobytes()).hexdigest(),
+            "dtype": str(a.dtype),
+            "shape": list(a.shape),
+        }
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in sorted(obj.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    if isinstance(obj, (np.floating, float)):
+        return repr(float(obj))
+    if isinstance(obj, (np.integer, np.bool_)):
+        return obj.item()
+    return obj
+
+
+def hash_key(kind: str, **parts: Any) -> str:
+    """内容寻址的键：kind + 包版本 + 所有输入/设置的规范化 JSON 的 sha256。"""
+    payload = {"kind": kind, "version": __version__, "parts": _canonical(parts)}
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+class ResultCache:
+    """
+    outdir 下的磁盘缓存，每个条目是一个以键命名的目录：
+      <root>/<kind>/<key[:2]>/<key>/{result.json, *.csv, *.nc, ...}
+    读取会刷新条目的 mtime；写入后按总大小做 LRU 淘汰（超过 max_bytes 时删最久未用的条目）。
+    enabled=False 时 get 永远未命中、put 不写盘（对应 CLI 的 --no-cache）。
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 2**20, enabled: bool = True):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.enabled = enabled
+
+    def _entry_dir(self, kind: str, key: str) -> str:
+        return os.path.join(self.root, kind, key[:2], key)
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        """命中时返回条目目录（已完整写入的条目才算命中），否则 None。"""
+        if not self.enabled:
+            return None
+        d = self._entry_dir(kind, key)
+        if not os.path.isfile(os.path.join(d, "result.json")):
+            return None
+        os.utime(d)
+        return d
+
+    def get_json(self, kind: str, key: str) -> Optional[Any]:
+        d = self.get(kind, key)
+        if d is None:
+            return None
+        with open(os.path.join(d, "result.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, kind: str, key: str, result: Any, files: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        写入一个条目：result 存为 result.json，files 为 {条目内文件名: 源路径}，会被复制进条目。
+        先写到临时目录再改名，中途中断不会留下半个条目。
+        """
+        if not self.enabled:
+            return None
+        d = self._entry_dir(kind, key)
+        tmp = f"{d}.{os.getpid()}.tmp"   # 多个进程可能同时写同一个键
+        shutil.rmtree(tmp, ignore_errors=True)
+        ensure_dir(tmp)
+        for name, src in (files or {}).items():
+            shutil.copyfile(src, os.path.join(tmp, name))
+        with open(os.path.join(tmp, "result.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        shutil.rmtree(d, ignore_errors=True)
+        os.replace(tmp, d)
+        self.evict()
+        return d
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for kind in os.listdir(self.root):
+            kdir = os.path.join(self.root, kind)
+            if not os.path.isdir(kdir):
+                continue
+            for prefix in os.listdir(kdir):
+                pdir = os.path.join(kdir, prefix)
+                if not os.path.isdir(pdir):
+                    continue
+                for key in os.listdir(pdir):
+                    d = os.path.join(pdir, key)
+                    size = sum(
+                        os.path.getsize(os.path.join(dp, fn))
+                        for dp, _, fns in os.walk(d) for fn in fns
+                    )
+                    out.append((os.path.getmtime(d), size, d))
+        return out
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """按 LRU 删除条目直到总大小不超过 max_bytes，返回删除的条目数。"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, d in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(d, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+def bea_cache_key(ash_id: str, ages: np.ndarray, sigmas: np.ndarray, *, seed: int, settings: Dict[str, Any]) -> str:
+    """单个 ash 的 BEA 键：过滤后实际使用的 ages/sigmas + 先验/采样设置 + 种子 + 版本。"""
+    ages2, sigmas2 = select_grains(ages, sigmas, max_span_ma=settings["max_span_ma"])
+    return hash_key("bea", ash_id=ash_id, ages=ages2, sigmas=sigmas2, seed=seed, settings=settings)
+
+
+def bad_cache_key(
+    tie_depths_m: np.ndarray,
+    tie_age_mean_ma: np.ndarray,
+    tie_age_sd_ma: np.ndarray,
+    query_depths_m: np.ndarray,
+    *,
+    seed: int,
+    settings: Dict[str, Any],
+) -> str:
+    """BAD 键：fit_bad 按深度排序 tie points、输出按深度排序的 query 表，因此只是顺序不同的输入共用一个键。"""
+    from .bad import sort_tiepoints
+
+    d_obs, E_obs, E_sd = sort_tiepoints(tie_depths_m, tie_age_mean_ma, tie_age_sd_ma)
+    return hash_key(
+        "bad",
+        tie_depths_m=d_obs,
+        tie_age_mean_ma=E_obs,
+        tie_age_sd_ma=E_sd,
+        query_depths_m=np.sort(np.asarray(query_depths_m, dtype=float)),
+        seed=seed,
+        settings=settings,
+    )
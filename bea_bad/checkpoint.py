@@ -0,0 +1,121 @@
+from __future__ import annotations
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, Optional
+
+from .cache import ResultCache
+from .utils import ensure_dir
+
+MANIFEST = "manifest.json"
+# 指针条目的 result.json：内容在结果缓存的同一条目里
+_POINTER = {"in_result_cache": True}
+
+
+def file_sha256(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CheckpointStore(ResultCache):
+    """
+    检查点的条目存储：结果缓存中已有同一条目时只写一个指针（result.json 为 _POINTER），
+    不再复制一份 draws；读取时跟随指针，指向的缓存条目已被淘汰时视为未命中（该 ash 重新拟合）。
+    """
+
+    def __init__(self, root: str, cache: Optional[ResultCache] = None):
+        super().__init__(root, max_bytes=sys.maxsize)
+        self.cache = cache
+
+    def _in_cache(self, kind: str, key: str) -> Optional[str]:
+        return self.cache.get(kind, key) if self.cache is not None else None
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        d = super().get(kind, key)
+        if d is None:
+            return None
+        with open(os.path.join(d, "result.json"), "r", encoding="utf-8") as f:
+            pointer = json.load(f) == _POINTER
+        return self._in_cache(kind, key) if pointer else d
+
+    def put(self, kind: str, key: str, result: Any, files: Optional[Dict[str, str]] = None) -> Optional[str]:
+        if self._in_cache(kind, key) is not None:
+            return super().put(kind, key, _POINTER)
+        return super().put(kind, key, result, files)
+
+
+class Checkpoint:
+    """
+    <outdir>/.checkpoint：运行中的中间结果，进程崩溃或被中断后可用 --resume 继续。
+      manifest.json   输入文件的 sha256、影响结果的设置、已完成的阶段与时间
+      bea/, bea_joint/, bad/
+                      与 ResultCache 相同的条目（每个 ash 拟合完成即写入），键同样包含输入与设置；
+                      cache 中已有的条目只记指针（见 CheckpointStore）
+    resume=True 且 manifest 中的输入与设置与本次一致时保留已有条目，否则清空重来。
+    与 --no-cache 无关：结果缓存关闭时检查点保存完整条目。运行完成后 finish() 删除整个目录。
+    """
+
+    def __init__(self, outdir: str, inputs: Dict[str, Optional[str]], settings: Dict[str, Any], *,
+                 resume: bool = False, cache: Optional[ResultCache] = None):
+        self.root = os.path.join(outdir, ".checkpoint")
+        self.store = CheckpointStore(self.root, cache)
+        self.manifest = {
+            "inputs": {k: {"path": v, "sha256": file_sha256(v)} for k, v in inputs.items()},
+            "settings": settings,
+            "stages": {},
+        }
+        self.resumed = False
+
+        old = self._read()
+        if resume and old is not None and self._same_run(old):
+            self.manifest["stages"] = old.get("stages", {})
+            self.resumed = True
+        else:
+            if resume and old is not None:
+                print("Resume: inputs or settings changed since the checkpoint; starting from scratch")
+            elif resume:
+                print("Resume: no checkpoint found; starting from scratch")
+            shutil.rmtree(self.root, ignore_errors=True)
+        ensure_dir(self.root)
+        self._write()
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self) -> None:
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _same_run(self, old: Dict[str, Any]) -> bool:
+        same_inputs = all(
+            old.get("inputs", {}).get(k, {}).get("sha256") == v["sha256"]
+            for k, v in self.manifest["inputs"].items()
+        )
+        return same_inputs and old.get("settings") == json.loads(json.dumps(self.manifest["settings"]))
+
+    def is_done(self, stage: str) -> bool:
+        return self.manifest["stages"].get(stage, {}).get("done", False)
+
+    def mark_done(self, stage: str, **info: Any) -> None:
+        self.manifest["stages"][stage] = dict(
+            done=True, finished=datetime.datetime.now().isoformat(timespec="seconds"), **info
+        )
+        self._write()
+
+    def finish(self) -> None:
+        """所有输出都已写好：检查点不再需要（结果缓存仍保留各条目）。"""
+        shutil.rmtree(self.root, ignore_errors=True)
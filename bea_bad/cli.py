@@ -1,84 +1,647 @@
 from __future__ import annotations
 import argparse
+import math
 import os
+import shutil
+import sys
+import tempfile
+import typing
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
 import pandas as pd
 
 from .dataio import read_inputs, read_query_depths
-from .bea import fit_bea_for_ash
-from .bad import fit_bad
+from .parallel import fit_bea_parallel, available_cores, ash_seed
+from .bad import BAD_MODELS, BADOutputs, fit_bad
+from . import compilecache, progress
+from .cache import ResultCache, bea_cache_key, bad_cache_key, hash_key
+from .checkpoint import Checkpoint
 from .plot import plot_age_depth
+from .report import RunReport, cprofile_hook, load_hook
+from .sampling import (
+    SAMPLERS, AdaptiveSettings, TuningState, load_tuning_states, resolve_sampler, save_tuning_states,
+)
+from .store import StoreSettings, load_bea_draws, write_bea_draws
 from .utils import ensure_dir
 
+if TYPE_CHECKING:
+    from .bea import BEAResult
 
-def main():
-    ap = argparse.ArgumentParser("bea_bad")
-    ap.add_argument("--zircon", required=True, help="zircon.csv (ash_id, age_ma, sigma_ma, [is_discordant])")
-    ap.add_argument("--tiepoints", required=True, help="tiepoints.csv (ash_id, depth_m)")
-    ap.add_argument("--query", default=None, help="query_depths.csv (depth_m). optional")
-    ap.add_argument("--outdir", default="out")
+# PyMC / PyTensor / ArviZ（bea, bea_model, bea_grid）只在需要采样的阶段里导入：
+# --help、参数错误和输入校验不必等待它们加载
 
-    ap.add_argument("--max_span_ma", type=float, default=1.0)
-    ap.add_argument("--depth_sigma_m", type=float, default=0.03)
-    ap.add_argument("--no_bootstrap_prior", action="store_true")
 
-    ap.add_argument("--bea_draws", type=int, default=2000)
-    ap.add_argument("--bea_tune", type=int, default=2000)
-    ap.add_argument("--bad_draws", type=int, default=3000)
-    ap.add_argument("--bad_tune", type=int, default=3000)
-    ap.add_argument("--seed", type=int, default=42)
-    ap.add_argument("--target_accept", type=float, default=0.9)
+@dataclass
+class PipelineConfig:
+    """
+    一次流水线运行的全部设置（字段与命令行选项一一对应，默认值也是命令行的默认值）。
+    供 GUI / 脚本直接调用：run_pipeline(PipelineConfig(zircon=..., tiepoints=..., outdir=...))。
+    """
+    zircon: str
+    tiepoints: str
+    query: Optional[str] = None
+    outdir: str = "out"
+    sheet: Optional[str] = None
 
-    args = ap.parse_args()
-    ensure_dir(args.outdir)
+    max_span_ma: float = 1.0
+    depth_sigma_m: float = 0.03
+    sedrate_logn_mu: float = math.log(0.05)
+    sedrate_logn_sigma: float = 1.0
+    sedrate_corr_m: float = 0.0
+    bad_model: str = "ordered"
+    no_bootstrap_prior: bool = False
+    bea_mode: str = "per_ash"
+    report_speedup: bool = False
+    bea_engine: str = "nuts"
+    bea_cross_check: bool = False
+    no_model_reuse: bool = False
+    preview: bool = False
+
+    bea_draws: int = 2000
+    bea_tune: int = 2000
+    bad_draws: int = 3000
+    bad_tune: int = 3000
+    seed: int = 42
+    target_accept: float = 0.9
+    sampler: str = "pymc"
+    adaptive: bool = False
+    ess_target: float = 400.0
+    rhat_max: float = 1.01
+    max_draws: int = 10000
+    warm_start: Optional[str] = None
+    save_warm_start: bool = False
+    warm_tune: int = 200
+    cores: Optional[int] = None
+    jobs: Optional[int] = None
+
+    no_cache: bool = False
+    cache_dir: Optional[str] = None
+    cache_max_mb: float = 1024.0
+    resume: bool = False
+    store_float32: bool = False
+    store_thin: int = 1
+    profile: bool = False
+    profile_hook: Optional[str] = None
+    compiledir: Optional[str] = None
+
+    @classmethod
+    def from_namespace(cls, ns: argparse.Namespace) -> "PipelineConfig":
+        """argparse 结果 → PipelineConfig（忽略 batch 的 --manifest 等额外选项）。"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in vars(ns).items() if k in names})
+
+
+_D = PipelineConfig(zircon="", tiepoints="")
+
+# 取值受限的选项：命令行的 choices，也用于校验 batch 清单 / sweep 网格中的值
+OPTION_CHOICES: Dict[str, tuple] = {
+    "bad_model": tuple(BAD_MODELS),
+    "bea_mode": ("per_ash", "joint"),
+    "bea_engine": ("nuts", "grid"),
+    "sampler": tuple(SAMPLERS),
+}
+
+
+def parse_option(name: str, value: Any) -> Any:
+    """
+    把清单 / 网格中的一个值（通常是字符串）按 PipelineConfig 字段的类型转换：
+    bool 接受 1/true/yes（不区分大小写），其余按字段类型（Optional[X] 取 X）转换并检查 OPTION_CHOICES。
+    """
+    hints = typing.get_type_hints(PipelineConfig)
+    if name not in hints:
+        raise ValueError(f"{name!r} 不是流水线选项")
+    tp = hints[name]
+    if typing.get_origin(tp) is typing.Union:
+        tp = next(t for t in typing.get_args(tp) if t is not type(None))
+    if tp is bool:
+        v = value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes")
+    else:
+        v = tp(value)
+    if name in OPTION_CHOICES and v not in OPTION_CHOICES[name]:
+        raise ValueError(f"{name}={v!r} 不在可选值 {list(OPTION_CHOICES[name])} 中")
+    return v
+
+
+# 不影响结果的选项：不进入检查点 manifest 的设置比较
+_RUNTIME_OPTIONS = (
+    "zircon", "tiepoints", "query", "outdir", "resume", "cores", "jobs", "report_speedup",
+    "no_cache", "cache_dir", "cache_max_mb", "profile", "profile_hook", "save_warm_start",
+    "compiledir",
+)
+
+
+def _adaptive_settings(args) -> Optional[AdaptiveSettings]:
+    if not args.adaptive:
+        return None
+    return AdaptiveSettings(ess_target=args.ess_target, rhat_max=args.rhat_max, max_draws=args.max_draws)
+
+
+def _warm_settings(settings: dict, ws: Optional[TuningState], warm_tune: int) -> dict:
+    """热启动改变了调参（因而改变结果）：缓存键里加入所用的调参状态。"""
+    if ws is None:
+        return settings
+    return dict(settings, warm_start=ws.to_dict(), warm_tune=warm_tune)
+
+
+def _put_bea(cache: ResultCache, kind: str, key: str, results: List[BEAResult]) -> None:
+    """缓存 BEA 结果行；有 draws 时一并存入条目（完整精度，与 --store_* 无关）。"""
+    if not cache.enabled:
+        return
+    rows = [r.row() for r in results]
+    posteriors = {r.ash_id: r.posterior for r in results if r.posterior is not None}
+    if not posteriors:
+        cache.put(kind, key, rows if kind == "bea_joint" else rows[0])
+        return
+    ensure_dir(cache.root)
+    tmp_dir = tempfile.mkdtemp(prefix="tmp", dir=cache.root)   # 每次唯一：batch 中多个进程共用同一缓存
+    tmp = write_bea_draws(posteriors, os.path.join(tmp_dir, "bea_posterior.nc"))
+    cache.put(kind, key, rows if kind == "bea_joint" else rows[0], files={"bea_posterior.nc": tmp})
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _get_bea(cache: ResultCache, kind: str, key: str, need_draws: bool) -> Optional[List[BEAResult]]:
+    from .bea import BEAResult
+
+    entry = cache.get(kind, key)
+    if entry is None:
+        return None
+    draws_path = os.path.join(entry, "bea_posterior.nc")
+    if need_draws and not os.path.exists(draws_path):
+        return None
+    rows = cache.get_json(kind, key)
+    results = [BEAResult(**r) for r in (rows if kind == "bea_joint" else [rows])]
+    if os.path.exists(draws_path):
+        for r in results:
+            r.posterior = load_bea_draws(draws_path, r.ash_id)
+    return results
 
-    data = read_inputs(args.zircon, args.tiepoints)
-    qdepths = read_query_depths(args.query, data.tiepoints)
 
-    # ---- BEA per ash
-    rows = []
-    for ash_id, g in data.zircon.groupby("ash_id"):
-        res = fit_bea_for_ash(
-            ash_id=ash_id,
-            ages=g["age_ma"].to_numpy(float),
-            sigmas=g["sigma_ma"].to_numpy(float),
+def _lookup_bea(stores: List[ResultCache], kind: str, key: str, need_draws: bool) -> Optional[List[BEAResult]]:
+    for store in stores:
+        found = _get_bea(store, kind, key, need_draws)
+        if found is not None:
+            return found
+    return None
+
+
+def _store_settings(args) -> StoreSettings:
+    return StoreSettings(float32=args.store_float32, thin=args.store_thin)
+
+
+def _run_bea_stage(args, data, stores: List[ResultCache], warm: Dict[str, TuningState]) -> List[BEAResult]:
+    """
+    stores: 依次查找的结果存储（检查点、结果缓存）；新拟合的 ash 一完成就写入每个存储。
+    warm: --warm_start 读入的调参状态（"bea/<ash_id>"）；只用于 per_ash 模式的 pymc NUTS。
+    """
+    need_draws = args.bea_engine == "nuts"
+    adaptive = _adaptive_settings(args)
+    settings = dict(
+        mode=args.bea_mode,
+        engine=args.bea_engine,
+        sampler=args.sampler,
+        use_bootstrap_prior=(not args.no_bootstrap_prior),
+        max_span_ma=args.max_span_ma,
+        reuse_model=(not args.no_model_reuse),
+        draws=args.bea_draws,
+        tune=args.bea_tune,
+        chains=2,
+        target_accept=args.target_accept,
+        adaptive=asdict(adaptive) if adaptive else None,
+    )
+    groups = list(data.iter_ashes())
+
+    if args.bea_mode == "joint":
+        from .bea import compare_joint_vs_sequential, fit_bea_joint
+
+        # 所有 ash 在同一个模型里：任一 ash 变化都需要整体重拟合
+        key = hash_key(
+            "bea_joint", seed=args.seed, settings=settings,
+            ashes=[bea_cache_key(a, x, s, seed=ash_seed(args.seed, a), settings=settings) for a, x, s in groups]
+        )
+        cached = _lookup_bea(stores, "bea_joint", key, need_draws)
+        if cached is not None:
+            print(f"BEA joint: cache hit ({len(cached)} ashes)")
+            return cached
+
+        joint_kwargs = dict(
             use_bootstrap_prior=(not args.no_bootstrap_prior),
             max_span_ma=args.max_span_ma,
             draws=args.bea_draws,
             tune=args.bea_tune,
+            cores=min(2, args.cores or available_cores()),
             seed=args.seed,
-            target_accept=args.target_accept
+            target_accept=args.target_accept,
+            sampler=args.sampler,
+            adaptive=adaptive
         )
-        rows.append(res.__dict__)
+        if args.report_speedup:
+            results, timing = compare_joint_vs_sequential(data.zircon, **joint_kwargs)
+            print(
+                f"BEA joint: {timing['joint_s']:.1f} s, sequential: {timing['sequential_s']:.1f} s, "
+                f"speedup: {timing['speedup']:.2f}x"
+            )
+        else:
+            with progress.fit("BEA joint"):
+                results = fit_bea_joint(data.zircon, **joint_kwargs)
+        for store in stores:
+            _put_bea(store, "bea_joint", key, results)
+        return results
 
-    bea_df = pd.DataFrame(rows).merge(data.tiepoints, on="ash_id", how="left")
-    bea_df = bea_df.sort_values("depth_m")
-    bea_path = os.path.join(args.outdir, "bea_eruption_age_summary.csv")
-    bea_df.to_csv(bea_path, index=False)
+    # per ash：只对缓存未命中的 ash 采样（process pool；种子按 ash_id 派生，与 --jobs 无关）
+    warm_bea = {}
+    if args.bea_engine == "nuts" and resolve_sampler(args.sampler) == "pymc":
+        warm_bea = {a: warm[f"bea/{a}"] for a, _, _ in groups if f"bea/{a}" in warm}
+    keys = {
+        a: bea_cache_key(a, x, s, seed=ash_seed(args.seed, a),
+                         settings=_warm_settings(settings, warm_bea.get(a), args.warm_tune))
+        for a, x, s in groups
+    }
+    done = {}
+    for ash_id, _, _ in groups:
+        cached = _lookup_bea(stores, "bea", keys[ash_id], need_draws)
+        if cached is not None:
+            done[ash_id] = cached[0]
+    todo = [g for g in groups if g[0] not in done]
+    if done:
+        print(f"BEA: {len(done)} ashes from cache/checkpoint, {len(todo)} to fit")
+    ash_progress = progress.AshProgress(len(groups))
+    for ash_id in done:
+        ash_progress.update(ash_id, cached=True)
 
-    # ---- BAD
-    bad_out = fit_bad(
+    def save(res: BEAResult) -> None:
+        for store in stores:
+            _put_bea(store, "bea", keys[res.ash_id], [res])
+        done[res.ash_id] = res
+        ash_progress.update(res.ash_id)
+
+    if todo:
+        fit_bea_parallel(
+            todo,
+            seed=args.seed,
+            cores=args.cores,
+            jobs=args.jobs,
+            use_bootstrap_prior=(not args.no_bootstrap_prior),
+            max_span_ma=args.max_span_ma,
+            reuse_model=(not args.no_model_reuse),
+            engine=args.bea_engine,
+            sampler=args.sampler,
+            draws=args.bea_draws,
+            tune=args.bea_tune,
+            target_accept=args.target_accept,
+            adaptive=adaptive,
+            warm_starts=warm_bea,
+            warm_tune=args.warm_tune,
+            on_result=save
+        )
+
+    return [done[a] for a, _, _ in groups]
+
+
+def _run_bad_stage(args, bea_df: pd.DataFrame, qdepths, stores: List[ResultCache],
+                   warm: Dict[str, TuningState]) -> BADOutputs:
+    tie_kwargs = dict(
         tie_depths_m=bea_df["depth_m"].to_numpy(float),
         tie_age_mean_ma=bea_df["e_mean"].to_numpy(float),
         tie_age_sd_ma=bea_df["e_sd"].to_numpy(float),
         query_depths_m=qdepths,
+    )
+    adaptive = _adaptive_settings(args)
+    settings = dict(
+        sampler=args.sampler,
         depth_sigma_m=args.depth_sigma_m,
+        sedrate_logn_mu=args.sedrate_logn_mu,
+        sedrate_logn_sigma=args.sedrate_logn_sigma,
+        sedrate_corr_m=args.sedrate_corr_m,
+        bad_model=args.bad_model,
         draws=args.bad_draws,
         tune=args.bad_tune,
-        seed=args.seed,
+        chains=2,
         target_accept=args.target_accept,
-        outdir=args.outdir
+        adaptive=asdict(adaptive) if adaptive else None,
+        store=asdict(_store_settings(args)),
+    )
+    ws = warm.get("bad") if resolve_sampler(args.sampler) == "pymc" else None
+    key = bad_cache_key(**tie_kwargs, seed=args.seed, settings=_warm_settings(settings, ws, args.warm_tune))
+    posterior_path = os.path.join(args.outdir, "bad_posterior.nc")
+
+    entry = next((e for e in (store.get("bad", key) for store in stores) if e is not None), None)
+    if entry is not None:
+        print("BAD: tie-point inputs unchanged, using cached/checkpointed posterior")
+        shutil.copyfile(os.path.join(entry, "bad_posterior.nc"), posterior_path)
+        return BADOutputs(
+            tie_summary=pd.read_csv(os.path.join(entry, "tiepoint_summary.csv")),
+            query_summary=pd.read_csv(os.path.join(entry, "query_age_summary.csv")),
+            posterior_path=posterior_path
+        )
+
+    with progress.fit("BAD"):
+        bad_out = fit_bad(
+            **tie_kwargs,
+            depth_sigma_m=args.depth_sigma_m,
+            sedrate_logn_mu=args.sedrate_logn_mu,
+            sedrate_logn_sigma=args.sedrate_logn_sigma,
+            model=args.bad_model,
+            sedrate_corr_m=args.sedrate_corr_m,
+            draws=args.bad_draws,
+            tune=args.bad_tune,
+            seed=args.seed,
+            target_accept=args.target_accept,
+            cores=min(2, args.cores or available_cores()),
+            outdir=args.outdir,
+            sampler=args.sampler,
+            adaptive=adaptive,
+            store=_store_settings(args),
+            warm_start=ws,
+            warm_tune=args.warm_tune
+        )
+
+    for cache in stores:
+        if not cache.enabled:
+            continue
+        ensure_dir(cache.root)
+        tmp_dir = tempfile.mkdtemp(prefix="tmp", dir=cache.root)
+        tie_tmp = os.path.join(tmp_dir, "tiepoint_summary.csv")
+        query_tmp = os.path.join(tmp_dir, "query_age_summary.csv")
+        bad_out.tie_summary.to_csv(tie_tmp, index=False)
+        bad_out.query_summary.to_csv(query_tmp, index=False)
+        cache.put("bad", key, {"posterior": "bad_posterior.nc"}, files={
+            "bad_posterior.nc": bad_out.posterior_path,
+            "tiepoint_summary.csv": tie_tmp,
+            "query_age_summary.csv": query_tmp,
+        })
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return bad_out
+
+
+def add_pipeline_options(
+    ap: argparse.ArgumentParser,
+    *,
+    jobs_help: str = "number of ashes fitted concurrently (default: cores // chains)",
+    cache_dir_help: str = "result cache directory (default: <outdir>/.cache)",
+) -> argparse.ArgumentParser:
+    """模型 / 采样 / 缓存 / 存储 / profiling 选项（单剖面 CLI、batch 与 sweep 共用；后两者改写 --jobs 等的说明）。"""
+    ap.add_argument("--sheet", default=_D.sheet,
+                    help="Excel sheet name for .xlsx inputs (default: first sheet)")
+    ap.add_argument("--max_span_ma", type=float, default=_D.max_span_ma)
+    ap.add_argument("--depth_sigma_m", type=float, default=_D.depth_sigma_m)
+    ap.add_argument("--sedrate_logn_mu", type=float, default=_D.sedrate_logn_mu,
+                    help="BAD prior on accumulation rates (Ma/m): log-normal mu (default log(0.05))")
+    ap.add_argument("--sedrate_logn_sigma", type=float, default=_D.sedrate_logn_sigma,
+                    help="BAD prior on accumulation rates: log-normal sigma")
+    ap.add_argument("--bad_model", choices=OPTION_CHOICES["bad_model"], default=_D.bad_model,
+                    help="BAD parameterization: 'ordered' (original) or 'scalable' (same posterior, sampling cost "
+                         "roughly linear in the number of tie points; use for tens to hundreds of tie points)")
+    ap.add_argument("--sedrate_corr_m", type=float, default=_D.sedrate_corr_m,
+                    help="--bad_model scalable: correlation length (m) of the log accumulation rate along depth "
+                         "(mean-reverting random walk); 0 = independent rates per segment")
+    ap.add_argument("--no_bootstrap_prior", action="store_true")
+    ap.add_argument("--bea_mode", choices=OPTION_CHOICES["bea_mode"], default=_D.bea_mode,
+                    help="per_ash: one model per ash (process pool); joint: all ashes in one model")
+    ap.add_argument("--report_speedup", action="store_true",
+                    help="with --bea_mode joint (required), also time the sequential per-ash path and report the speedup")
+    ap.add_argument("--bea_engine", choices=OPTION_CHOICES["bea_engine"], default=_D.bea_engine,
+                    help="per-ash BEA inference: NUTS sampling or deterministic (E, tau) grid quadrature")
+    ap.add_argument("--bea_cross_check", action="store_true",
+                    help="fit every ash with both engines and write bea_cross_check.csv")
+    ap.add_argument("--no_model_reuse", action="store_true",
+                    help="build and compile a fresh BEA model for every ash")
+    ap.add_argument("--preview", action="store_true",
+                    help="quick-look approximate run in about a second (NumPy Monte Carlo from the bootstrap-min "
+                         "ages, no MCMC); writes the usual CSVs and figure, marked method=preview")
+
+    ap.add_argument("--bea_draws", type=int, default=_D.bea_draws)
+    ap.add_argument("--bea_tune", type=int, default=_D.bea_tune)
+    ap.add_argument("--bad_draws", type=int, default=_D.bad_draws)
+    ap.add_argument("--bad_tune", type=int, default=_D.bad_tune)
+    ap.add_argument("--seed", type=int, default=_D.seed)
+    ap.add_argument("--target_accept", type=float, default=_D.target_accept)
+    ap.add_argument("--sampler", choices=OPTION_CHOICES["sampler"], default=_D.sampler,
+                    help="NUTS backend for BEA and BAD (falls back to pymc if not installed)")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="sample in increments until the ESS/R-hat targets are met (ignores the *_draws/*_tune settings)")
+    ap.add_argument("--ess_target", type=float, default=_D.ess_target, help="minimum bulk and tail ESS: the --adaptive stopping rule and the run_report.json low_ess flag")
+    ap.add_argument("--rhat_max", type=float, default=_D.rhat_max, help="maximum R-hat: the --adaptive stopping rule and the run_report.json rhat flag")
+    ap.add_argument("--max_draws", type=int, default=_D.max_draws, help="with --adaptive: cap on kept draws per chain")
+    ap.add_argument("--warm_start", default=_D.warm_start,
+                    help="warm_start.json of an earlier run: start from its step sizes, mass matrices and "
+                         "posterior means and tune only --warm_tune steps (pymc backend)")
+    ap.add_argument("--save_warm_start", action="store_true",
+                    help="write the adapted sampler state of this run to <outdir>/warm_start.json")
+    ap.add_argument("--warm_tune", type=int, default=_D.warm_tune,
+                    help="tuning steps per chain for fits started from --warm_start")
+    ap.add_argument("--cores", type=int, default=_D.cores,
+                    help="total CPU core budget (default: all available cores)")
+    ap.add_argument("--jobs", type=int, default=_D.jobs, help=jobs_help)
+
+    ap.add_argument("--no-cache", dest="no_cache", action="store_true",
+                    help="ignore and do not write the result cache")
+    ap.add_argument("--cache_dir", default=_D.cache_dir, help=cache_dir_help)
+    ap.add_argument("--cache_max_mb", type=float, default=_D.cache_max_mb,
+                    help="evict least recently used cache entries above this size")
+
+    ap.add_argument("--resume", action="store_true",
+                    help="continue an interrupted run in the same --outdir: finished ashes and stages are "
+                         "taken from <outdir>/.checkpoint (inputs and settings must be unchanged)")
+
+    ap.add_argument("--store_float32", action="store_true",
+                    help="store posterior draws (bea_posterior.nc, bad_posterior.nc) as float32")
+    ap.add_argument("--store_thin", type=int, default=_D.store_thin, help="keep every N-th posterior draw in the stored files")
+
+    ap.add_argument("--profile", action="store_true",
+                    help="cProfile every pipeline stage into <outdir>/profile_<stage>.prof")
+    ap.add_argument("--profile_hook", default=_D.profile_hook,
+                    help="'module:callable'; callable(stage_name) returns a context manager wrapped around each stage")
+    ap.add_argument("--compiledir", default=_D.compiledir,
+                    help=f"persistent PyTensor compile cache (default: ${compilecache.ENV}, else PyTensor's own "
+                         f"{compilecache.default_compiledir()}); fill it with `bea_bad warmup`")
+    return ap
+
+
+def run_pipeline(args: PipelineConfig) -> dict:
+    """
+    对一个剖面（args.zircon / args.tiepoints）跑完整流程，输出写到 args.outdir。
+    返回 run_report.json 的内容（batch 模式用它汇总各剖面）。
+    若本进程安装了进度通道（progress.install），各阶段、各 ash 与每条链的进度会发到通道里，
+    取消时在下一个检查点抛出 progress.Cancelled。
+    """
+    # 在任何模块导入 pytensor 之前固定编译缓存目录（子进程继承）
+    compilecache.configure(args.compiledir)
+    # 在 BEA 之前检查选项组合
+    if args.sedrate_corr_m > 0 and args.bad_model != "scalable":
+        raise ValueError("--sedrate_corr_m 需要 --bad_model scalable")
+    if args.report_speedup and args.bea_mode != "joint":
+        raise ValueError("--report_speedup 需要 --bea_mode joint")
+    if args.preview:
+        from .preview import run_preview
+
+        return run_preview(args)
+    ensure_dir(args.outdir)
+
+    hook = None
+    if args.profile_hook:
+        hook = load_hook(args.profile_hook)
+    elif args.profile:
+        hook = cprofile_hook(args.outdir)
+    report = RunReport(
+        progress.stage_hook(hook), rhat_max=args.rhat_max, ess_min=args.ess_target,
+        argv=vars(args), cores=available_cores()
     )
 
+    with report.stage("read_inputs"):
+        data = read_inputs(args.zircon, args.tiepoints, sheet=args.sheet)
+        qdepths = read_query_depths(args.query, data.tiepoints)
+
+    cache = ResultCache(
+        args.cache_dir or os.path.join(args.outdir, ".cache"),
+        max_bytes=int(args.cache_max_mb * 2**20),
+        enabled=(not args.no_cache)
+    )
+    ckpt = Checkpoint(
+        args.outdir,
+        inputs=dict(zircon=args.zircon, tiepoints=args.tiepoints, query=args.query),
+        settings={k: v for k, v in vars(args).items() if k not in _RUNTIME_OPTIONS},
+        resume=args.resume,
+        cache=cache
+    )
+    if ckpt.resumed:
+        print("Resume: finished ashes, BAD and cross-check results are read from the checkpoint")
+    # 先写结果缓存：检查点对缓存中已有的条目只记指针
+    stores = [cache, ckpt.store]
+    warm = load_tuning_states(args.warm_start) if args.warm_start else {}
+
+    # ---- BEA（每个 ash 完成即写入检查点；已完成的 ash 从检查点 / 缓存读回）
+    with report.stage("bea"):
+        results = _run_bea_stage(args, data, stores, warm)
+    report.add_bea(results)
+    rows = [res.row() for res in results]
+
+    bea_df = pd.DataFrame(rows).merge(data.tiepoints, on="ash_id", how="left")
+    bea_df = bea_df.sort_values("depth_m")
+    bea_path = os.path.join(args.outdir, "bea_eruption_age_summary.csv")
+    bea_df.to_csv(bea_path, index=False)
+
+    posteriors = {r.ash_id: r.posterior for r in results if r.posterior is not None}
+    bea_draws_path = None
+    if posteriors:
+        bea_draws_path = write_bea_draws(
+            posteriors, os.path.join(args.outdir, "bea_posterior.nc"), _store_settings(args)
+        )
+
+    check_path = os.path.join(args.outdir, "bea_cross_check.csv")
+    if args.bea_cross_check and ckpt.is_done("bea_cross_check") and os.path.exists(check_path):
+        print("BEA grid vs NUTS cross-check: done in checkpoint,", check_path)
+    elif args.bea_cross_check:
+        from .bea_grid import cross_check_bea
+
+        with report.stage("bea_cross_check"):
+            checks = [
+                cross_check_bea(
+                    ash_id, ages, sigmas,
+                    use_bootstrap_prior=(not args.no_bootstrap_prior),
+                    max_span_ma=args.max_span_ma,
+                    draws=args.bea_draws,
+                    tune=args.bea_tune,
+                    cores=min(2, args.cores or available_cores()),
+                    seed=ash_seed(args.seed, ash_id),
+                    target_accept=args.target_accept
+                )
+                for ash_id, ages, sigmas in data.iter_ashes()
+            ]
+        pd.DataFrame(checks).to_csv(check_path, index=False)
+        ckpt.mark_done("bea_cross_check")
+        print("BEA grid vs NUTS cross-check:", check_path)
+
+    # ---- BAD
+    with report.stage("bad"):
+        bad_out = _run_bad_stage(args, bea_df, qdepths, stores, warm)
+    report.set_bad(bad_out)
+
     tie_path = os.path.join(args.outdir, "tiepoint_summary.csv")
     query_path = os.path.join(args.outdir, "query_age_summary.csv")
     bad_out.tie_summary.to_csv(tie_path, index=False)
     bad_out.query_summary.to_csv(query_path, index=False)
 
-    fig_path = plot_age_depth(bad_out.tie_summary, bad_out.query_summary, outdir=args.outdir)
+    with report.stage("plot"):
+        fig_path = plot_age_depth(bad_out.tie_summary, bad_out.query_summary, outdir=args.outdir,
+                                  posterior_path=bad_out.posterior_path)
+    # 最后一个阶段完成：outdir 中已有全部结果，检查点不再需要
+    ckpt.finish()
+
+    # 本次实际采样的拟合（缓存命中的没有统计）：墙钟时间与每秒 ESS，便于比较后端
+    stats_rows = [dict(stage="bea", ash_id=r.ash_id, **r.stats.row()) for r in results if r.stats is not None]
+    if bad_out.stats is not None:
+        stats_rows.append(dict(stage="bad", ash_id="", **bad_out.stats.row()))
+    stats_path = None
+    if stats_rows:
+        stats_df = pd.DataFrame(stats_rows)
+        stats_path = os.path.join(args.outdir, "sampler_stats.csv")
+        stats_df.to_csv(stats_path, index=False)
+        for stage, g in stats_df.groupby("stage", sort=False):
+            print(
+                f"{stage.upper()} [{g['sampler'].iloc[0]}]: {g['wall_time_s'].sum():.1f} s sampling "
+                f"+ {g['compile_time_s'].sum():.1f} s compile, "
+                f"min ESS/s {g['ess_bulk_per_s'].min():.1f}, divergences {int(g['divergences'].sum())}"
+                + (f", draws/chain {g['draws'].min()}–{g['draws'].max()}" if args.adaptive else "")
+            )
+
+    warm_path = None
+    if args.save_warm_start:
+        # 缓存命中的拟合没有新的调参状态：沿用 --warm_start 中的记录
+        states = dict(warm)
+        states.update({f"bea/{r.ash_id}": r.stats.tuning for r in results
+                       if r.stats is not None and r.stats.tuning is not None})
+        if bad_out.stats is not None and bad_out.stats.tuning is not None:
+            states["bad"] = bad_out.stats.tuning
+        if states:
+            warm_path = save_tuning_states(os.path.join(args.outdir, "warm_start.json"), states)
+
+    if report.time_to_first_draw_s is not None:
+        print(f"Time to first draw: {report.time_to_first_draw_s:.1f} s")
+    report_path = report.write(os.path.join(args.outdir, "run_report.json"))
+    flagged = [r["ash_id"] for r in report.bea if r.get("flags")]
+    if flagged:
+        print(f"BEA: check convergence for {len(flagged)} ash(es): {', '.join(flagged)} (see run_report.json)")
 
     print("Done.")
     print("BEA summary:", bea_path)
+    if bea_draws_path:
+        print("BEA posterior:", bea_draws_path)
     print("BAD posterior:", bad_out.posterior_path)
     print("Tie summary:", tie_path)
     print("Query summary:", query_path)
     print("Figure:", fig_path)
+    if stats_path:
+        print("Sampler stats:", stats_path)
+    if warm_path:
+        print("Warm start:", warm_path)
+    print("Run report:", report_path)
+    return report.to_dict()
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["query"]:
+        from .query import main as query_main
+        return query_main(argv[1:])
+    if argv[:1] == ["batch"]:
+        from .batch import main as batch_main
+        return batch_main(argv[1:])
+    if argv[:1] == ["warmup"]:
+        return compilecache.main(argv[1:])
+    if argv[:1] == ["sweep"]:
+        from .sweep import main as sweep_main
+        return sweep_main(argv[1:])
+    if argv[:1] == ["plots"]:
+        from .plot import main as plots_main
+        return plots_main(argv[1:])
+
+    ap = argparse.ArgumentParser("bea_bad")
+    ap.add_argument("--zircon", required=True,
+                    help="zircon table (ash_id, age_ma, sigma_ma, [is_discordant]): .csv, .parquet, .feather or .xlsx")
+    ap.add_argument("--tiepoints", required=True, help="tiepoints table (ash_id, depth_m), same formats")
+    ap.add_argument("--query", default=None, help="query_depths.csv (depth_m). optional")
+    ap.add_argument("--outdir", default=_D.outdir)
+    add_pipeline_options(ap)
+    run_pipeline(PipelineConfig.from_namespace(ap.parse_args(argv)))
@@ -0,0 +1,259 @@
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Sequence
+
+# PyTensor 把 logp / 梯度图编译成 C 扩展并缓存在 base_compiledir 下（默认是按用户的持久目录）。
+# 用户显式指定目录时（--compiledir / $BEA_BAD_COMPILEDIR），在导入 pytensor 之前通过 PYTENSOR_FLAGS 设置
+# （之后无法再改）；spawn 出的子进程（BEA 进程池、batch、GUI worker）继承同一环境变量，共用同一缓存。
+# 未指定时不改动 PyTensor 自己的默认目录。
+#
+# 缓存条目的键包含编译器版本和头文件目录（如 numpy 的 include 路径），因此缓存只对同一份安装有效：
+# 从别处复制来的缓存只在安装路径相同时命中；单文件（--onefile）exe 每次解压到新的临时目录，
+# 缓存永远不会命中，所以 exe 用文件夹方式打包，并在首次启动时于本机预编译（见 warmup）。
+
+ENV = "BEA_BAD_COMPILEDIR"
+SEED_DIR = "pytensor_cache"            # exe 旁边的种子缓存目录（固定安装路径的部署）
+MARKER = "bea_bad_warmup.json"         # warmup 完成后写在缓存目录里的记录
+
+# warmup 预编译的图：BEA 重用模型的颗粒数桶（两种先验）与 BAD 的 tie point 个数；
+# 其他桶大小 / K 复用同样的 C 模块，只需几秒链接
+BUCKETS = (8, 16, 32)
+TIES = (4,)
+
+
+def default_compiledir() -> str:
+    """
+    PyTensor 自己的默认 base_compiledir（不导入 pytensor）：Windows 为 %LOCALAPPDATA%\\PyTensor，其他为 ~/.pytensor。
+    pytensor 已导入时直接读取它的设置。
+    """
+    if "pytensor" in sys.modules:
+        import pytensor
+
+        return str(pytensor.config.base_compiledir)
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        return os.path.join(os.environ["LOCALAPPDATA"], "PyTensor")
+    return os.path.join(os.path.expanduser("~"), ".pytensor")
+
+
+def _pytensor_flag(name: str) -> Optional[str]:
+    for item in os.environ.get("PYTENSOR_FLAGS", "").split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip() == name:
+            return value.strip()
+    return None
+
+
+def seed_cache(src: str, dst: str) -> int:
+    """把 src 中 dst 还没有的编译结果复制过去（不覆盖已有条目、不复制锁目录），返回复制的条目数。"""
+    n = 0
+    for sub in os.listdir(src):
+        if not sub.startswith("compiledir_"):
+            continue
+        for entry in os.listdir(os.path.join(src, sub)):
+            target = os.path.join(dst, sub, entry)
+            if entry.startswith("lock_dir") or os.path.exists(target):
+                continue
+            path = os.path.join(src, sub, entry)
+            if os.path.isdir(path):
+                shutil.copytree(path, target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(path, target)
+            n += 1
+    return n
+
+
+def _seed_source() -> Optional[str]:
+    """打包的 exe 旁边（或 PyInstaller 包内）的 pytensor_cache 目录。"""
+    if not getattr(sys, "frozen", False):
+        return None
+    for root in (os.path.dirname(sys.executable), getattr(sys, "_MEIPASS", None)):
+        if root and os.path.isdir(os.path.join(root, SEED_DIR)):
+            return os.path.join(root, SEED_DIR)
+    return None
+
+
+def configure(compiledir: Optional[str] = None) -> str:
+    """
+    返回 PyTensor 的编译缓存目录，用户指定了目录时先设置它；必须在导入 pytensor（pymc）之前调用，可重复调用。
+    目录优先级：compiledir 参数 > $BEA_BAD_COMPILEDIR > PYTENSOR_FLAGS 中已有的 base_compiledir；
+    三者都没有时不设置任何东西，沿用 PyTensor 的默认目录（default_compiledir()）。
+    打包的 exe 旁边有 pytensor_cache 时，把其中本机还没有的条目复制进来。
+    pytensor 已经导入时不再改变目录（compiledir 与当前目录不同则警告），返回当前目录。
+    """
+    if "pytensor" in sys.modules:
+        import pytensor
+
+        current = pytensor.config.base_compiledir
+        if compiledir and os.path.abspath(compiledir) != os.path.abspath(current):
+            warnings.warn(f"pytensor is already imported; keeping compile directory {current}", RuntimeWarning)
+        return current
+
+    explicit = compiledir or os.environ.get(ENV) or _pytensor_flag("base_compiledir")
+    path = os.path.abspath(os.path.expanduser(explicit or default_compiledir()))
+    seed = _seed_source()
+    if seed is not None:
+        os.makedirs(path, exist_ok=True)
+        seed_cache(seed, path)
+    if not explicit:
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    flags = [f for f in os.environ.get("PYTENSOR_FLAGS", "").split(",")
+             if f.strip() and f.partition("=")[0].strip() != "base_compiledir"]
+    os.environ["PYTENSOR_FLAGS"] = ",".join(flags + [f"base_compiledir={path}"])
+    os.environ[ENV] = path
+    return path
+
+
+def compiler_info() -> Dict[str, Any]:
+    """当前 PyTensor 的编译器与缓存目录；cxx 为空表示没有 C 编译器（退回慢得多的 Python 实现）。"""
+    import pytensor
+
+    return dict(
+        cxx=str(pytensor.config.cxx),
+        base_compiledir=str(pytensor.config.base_compiledir),
+        compiledir=str(pytensor.config.compiledir),
+        pytensor=pytensor.__version__,
+    )
+
+
+def _versions() -> Dict[str, str]:
+    import pymc
+    import pytensor
+
+    from . import __version__
+
+    return dict(bea_bad=__version__, pymc=pymc.__version__, pytensor=pytensor.__version__,
+                python=sys.version.split()[0])
+
+
+def is_warm(compiledir: Optional[str] = None) -> bool:
+    """该缓存目录是否已由当前版本的 bea_bad / pymc / pytensor 预编译过（读 warmup 的记录，不导入 pymc）。"""
+    path = os.path.join(compiledir or configure(), MARKER)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            done = json.load(f)
+    except (OSError, ValueError):
+        return False
+    from importlib.metadata import PackageNotFoundError, version
+
+    from . import __version__
+
+    try:
+        current = dict(bea_bad=__version__, pymc=version("pymc"), pytensor=version("pytensor"),
+                       python=sys.version.split()[0])
+    except PackageNotFoundError:
+        return False
+    return done.get("versions") == current
+
+
+def _synthetic_ash(n: int, rng) -> tuple:
+    import numpy as np
+
+    ages = 250.0 + 0.05 * rng.standard_normal(n) + rng.exponential(0.05, n)
+    return ages, np.full(n, 0.05)
+
+
+def warmup(
+    *,
+    buckets: Sequence[int] = BUCKETS,
+    ties: Sequence[int] = TIES,
+    target_accept: float = 0.9,
+    log=print,
+) -> List[Dict[str, Any]]:
+    """
+    预编译流水线的标准图：每个颗粒数桶的 BEA 重用模型（bootstrap KDE 与 Normal 两种先验）和
+    每个 K 的 BAD 模型（流水线的 ordered / scalable 两种参数化与 sweep 的重用模型），各采几个 draw，
+    让初值、采样与结果转换用到的函数也进入缓存。返回每个图的耗时记录：
+      build_compile_s  构建 + 编译（重用模型）
+      first_draw_s     从开始构建到第一批 draws 完成（time to first draw）
+    完成后在缓存目录写入 bea_bad_warmup.json（版本 + 记录），供 is_warm 判断。
+    """
+    import numpy as np
+
+    t0 = time.perf_counter()
+    from .bad import build_bad_model
+    from .bad_model import get_reusable_bad_model
+    from .bea import prepare_bea_inputs
+    from .bea_model import get_reusable_model
+    from .sampling import run_sampler
+
+    info = compiler_info()
+    rows: List[Dict[str, Any]] = [dict(graph="import pymc", build_compile_s=time.perf_counter() - t0,
+                                       first_draw_s=time.perf_counter() - t0)]
+    if not info["cxx"]:
+        log("PyTensor found no C compiler: models run in the slow Python implementation and nothing is cached")
+    small = dict(draws=5, tune=5, chains=1, cores=1, progressbar=False)
+    rng = np.random.default_rng(0)
+    # 几个 draw 的采样只为触发编译：PyMC 关于样本太少 / 发散的日志没有意义
+    pymc_log = logging.getLogger("pymc")
+    level = pymc_log.level
+    pymc_log.setLevel(logging.ERROR)
+
+    def record(graph: str, build, sample) -> None:
+        w0 = time.perf_counter()
+        obj = build()
+        w1 = time.perf_counter()
+        sample(obj)
+        rows.append(dict(graph=graph, build_compile_s=w1 - w0, first_draw_s=time.perf_counter() - w0))
+        log(f"  {graph}: {rows[-1]['first_draw_s']:.1f} s")
+
+    try:
+        for prior in ("kde", "normal"):
+            for bucket in buckets:
+                inputs = prepare_bea_inputs(*_synthetic_ash(int(bucket), rng), use_bootstrap_prior=(prior == "kde"))
+                record(f"BEA {prior} bucket {bucket}",
+                       lambda: get_reusable_model(inputs, target_accept=target_accept),
+                       lambda rm: rm.sample(inputs, **small))
+        for K in ties:
+            d = np.linspace(0.0, 10.0 * (K - 1), K)
+            E = np.linspace(250.0, 250.0 + 0.5 * (K - 1), K)
+            sd = np.full(K, 0.05)
+            record(f"BAD K={K}", lambda: build_bad_model(d, E, sd),
+                   lambda m: run_sampler(m, target_accept=target_accept, **small))
+            record(f"BAD scalable K={K}", lambda: build_bad_model(d, E, sd, model="scalable"),
+                   lambda m: run_sampler(m, target_accept=target_accept, **small))
+            record(f"BAD reusable K={K}", lambda: get_reusable_bad_model(K, target_accept=target_accept),
+                   lambda rm: rm.sample(d, E, sd, **small))
+    finally:
+        pymc_log.setLevel(level)
+
+    if info["cxx"]:
+        with open(os.path.join(info["base_compiledir"], MARKER), "w", encoding="utf-8") as f:
+            json.dump(dict(versions=_versions(), compiler=info, graphs=rows), f, indent=2)
+    return rows
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    import pandas as pd
+
+    ap = argparse.ArgumentParser("bea_bad warmup")
+    ap.add_argument("--compiledir", default=None,
+                    help=f"PyTensor compile cache to fill (default: ${ENV}, else PyTensor's own {default_compiledir()})")
+    ap.add_argument("--buckets", type=int, nargs="+", default=list(BUCKETS),
+                    help="BEA grain-count buckets to precompile (powers of two, >= 8)")
+    ap.add_argument("--ties", type=int, nargs="+", default=list(TIES), help="BAD tie-point counts to precompile")
+    ap.add_argument("--target_accept", type=float, default=0.9)
+    args = ap.parse_args(argv)
+
+    path = configure(args.compiledir)
+    print("Compile cache:", path)
+    t0 = time.perf_counter()
+    rows = warmup(buckets=args.buckets, ties=args.ties, target_accept=args.target_accept)
+    info = compiler_info()
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    print(f"Warm-up done in {time.perf_counter() - t0:.1f} s (C compiler: {info['cxx'] or 'none'})")
+
+
+def warmup_worker(compiledir: Optional[str] = None) -> None:
+    """GUI 启动时在后台进程里预编译（stdout 可能不存在，不打印）。"""
+    configure(compiledir)
+    warmup(log=lambda msg: None)
@@ -1,35 +1,253 @@
 from __future__ import annotations
+import os
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
 
+# 每次读入的行数（CSV / Parquet / Feather 分块读取；Excel 整表读取）
+CHUNK_ROWS = 500_000
+
+# 支持的输入格式（按扩展名）；Parquet / Feather 需要 pyarrow，Excel 需要 openpyxl（.xls 需要 xlrd）
+_FORMATS = {
+    ".csv": "csv", ".txt": "csv", ".gz": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".feather": "feather", ".arrow": "feather", ".ipc": "feather",
+    ".xlsx": "excel", ".xlsm": "excel", ".xls": "excel",
+}
+
+# 流水线实际用到的列：其余列（zircon_id、备注等）不读入
+ZIRCON_COLUMNS = ("ash_id", "age_ma", "sigma_ma", "is_discordant")
+TIEPOINT_COLUMNS = ("ash_id", "depth_m", "depth_sigma_m")
+
+# 汇编表（如 dai_example.xlsx）的列：section + ash_bed_id → ash_id，age_2sigma_ma → sigma_ma；
+# 每颗锆石一行，所在层的深度在 depth（向下为负，depth_m = -depth）或 depth_m（向下为正）列
+_COMPILATION_COLUMNS = ("section", "ash_bed_id", "age_2sigma_ma")
+_COMPILATION_TIE_COLUMNS = ("section", "ash_bed_id", "depth", "depth_m", "depth_sigma_m")
+
 
 @dataclass
 class InputData:
-    zircon: pd.DataFrame     # rows: zircon grains
+    zircon: pd.DataFrame     # rows: zircon grains（按 ash_id 排序；ash_id 为 category，sigma_ma 为 float32）
     tiepoints: pd.DataFrame  # rows: ash beds with depths
 
+    def iter_ashes(self) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        """逐个 ash 给出 (ash_id, age_ma, sigma_ma)（float64），顺序与 groupby("ash_id") 相同。"""
+        z = self.zircon
+        codes = z["ash_id"].cat.codes.to_numpy()
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate([[0], bounds])
+        stops = np.concatenate([bounds, [len(z)]])
+        ages = z["age_ma"].to_numpy()
+        sigmas = z["sigma_ma"].to_numpy()
+        cats = z["ash_id"].cat.categories
+        for i0, i1 in zip(starts, stops):
+            yield str(cats[codes[i0]]), ages[i0:i1].astype(float), sigmas[i0:i1].astype(float)
+
+
+def table_format(path: str) -> str:
+    ext = os.path.splitext(path.lower())[1]
+    fmt = _FORMATS.get(ext)
+    if fmt is None:
+        raise ValueError(f"不支持的输入格式：{path}（支持 {', '.join(sorted(_FORMATS))}）")
+    return fmt
+
+
+def _pyarrow(path: str):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(f"读取 {path} 需要 pyarrow（pip install pyarrow）") from e
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    return pyarrow
+
+
+def table_columns(path: str, *, sheet: Optional[str] = None) -> List[str]:
+    """只读表头，返回列名。"""
+    fmt = table_format(path)
+    if fmt == "csv":
+        return list(pd.read_csv(path, nrows=0).columns)
+    if fmt == "excel":
+        return list(pd.read_excel(path, sheet_name=sheet or 0, nrows=0).columns)
+    pa = _pyarrow(path)
+    if fmt == "parquet":
+        return list(pa.parquet.ParquetFile(path).schema_arrow.names)
+    return list(pa.ipc.open_file(path).schema.names)
+
+
+def iter_table_chunks(
+    path: str,
+    columns: Sequence[str],
+    *,
+    dtypes: Optional[Dict[str, str]] = None,
+    sheet: Optional[str] = None,
+    chunksize: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    分块读取表格，只读 columns 中存在的列（列投影）；dtypes 指定读入时的类型（如 ash_id: str）。
+    Parquet 按 row group 批量读；Feather 用内存映射后分批转换；Excel 一次读入整张 sheet。
+    """
+    fmt = table_format(path)
+    present = [c for c in table_columns(path, sheet=sheet) if c in set(columns)]
+    dtypes = {k: v for k, v in (dtypes or {}).items() if k in present}
+    if fmt == "csv":
+        yield from pd.read_csv(path, usecols=present, dtype=dtypes, chunksize=chunksize)
+        return
+    if fmt == "excel":
+        yield pd.read_excel(path, sheet_name=sheet or 0, usecols=present, dtype=dtypes)
+        return
+    pa = _pyarrow(path)
+    if fmt == "parquet":
+        batches = pa.parquet.ParquetFile(path).iter_batches(batch_size=chunksize, columns=present)
+    else:
+        batches = pa.feather.read_table(path, columns=present, memory_map=True).to_batches(max_chunksize=chunksize)
+    for batch in batches:
+        yield batch.to_pandas().astype(dtypes)
+
+
+def _numeric_column(df: pd.DataFrame, col: str, file_label: str, *, positive: bool = False,
+                    row0: int = 0) -> pd.Series:
+    """
+    把一列转成有限浮点数；有非数值 / NaN / inf（或 positive 时 ≤ 0）的行时报错并列出行号
+    （表头占第 1 行；row0 为本块第一行在文件中的数据行序号）。
+    """
+    x = pd.to_numeric(df[col], errors="coerce")
+    bad = ~np.isfinite(x.to_numpy(float))
+    if positive:
+        bad |= ~(x.to_numpy(float) > 0)
+    if bad.any():
+        rows = (np.flatnonzero(bad) + row0 + 2).tolist()   # +2：表头占第 1 行
+        more = f" 等 {len(rows)} 行" if len(rows) > 5 else ""
+        cond = "有限正数" if positive else "有限数值"
+        raise ValueError(f"{file_label} 的 {col} 列必须是{cond}；第 {rows[:5]} 行{more}不符合")
+    return x.astype(float)
+
+
+def _ash_ids(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip()
+
+
+def _is_compilation(header: Sequence[str]) -> bool:
+    return "ash_id" not in header and {"section", "ash_bed_id"}.issubset(header)
+
+
+def _compilation_tiepoints(path: str, header: Sequence[str], *, sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    汇编表（每颗锆石一行）→ 每个 "<section>:<ash_bed_id>" 一个 tie point。
+    depth_m 列（向下为正）优先；否则用 depth 列并取反（dai_example.xlsx 的深度向下为负）。
+    同一 ash 的各行深度必须一致。
+    """
+    col = "depth_m" if "depth_m" in header else "depth"
+    if col not in header:
+        raise ValueError("汇编表用作 tiepoints 时必须包含 depth（向下为负）或 depth_m（向下为正）列")
+    parts, row0 = [], 0
+    for chunk in iter_table_chunks(path, _COMPILATION_TIE_COLUMNS, sheet=sheet,
+                                   dtypes={"section": str, "ash_bed_id": str}):
+        depth = _numeric_column(chunk, col, "tiepoints", row0=row0)
+        row0 += len(chunk)
+        part = pd.DataFrame({
+            "ash_id": _ash_ids(chunk["section"]) + ":" + _ash_ids(chunk["ash_bed_id"]),
+            "depth_m": depth if col == "depth_m" else -depth,
+        })
+        if "depth_sigma_m" in chunk.columns:
+            part["depth_sigma_m"] = pd.to_numeric(chunk["depth_sigma_m"], errors="coerce").to_numpy()
+        parts.append(part)
+    rows = pd.concat(parts, ignore_index=True)
+
+    g = rows.groupby("ash_id", sort=False)["depth_m"]
+    mixed = (g.max() - g.min())[lambda x: x > 1e-9].index.tolist()
+    if mixed:
+        raise ValueError(f"汇编表中同一 ash 的 {col} 不一致：{mixed}")
+    return rows.drop_duplicates("ash_id").reset_index(drop=True)
+
+
+def read_tiepoints(path: str, *, sheet: Optional[str] = None) -> pd.DataFrame:
+    """
+    tie point 表（ash_id, depth_m[, depth_sigma_m]），或汇编表（如 dai_example.xlsx，
+    见 _compilation_tiepoints）：同一个文件可同时作为 --zircon 与 --tiepoints。
+    """
+    header = table_columns(path, sheet=sheet)
+    if _is_compilation(header):
+        return _compilation_tiepoints(path, header, sheet=sheet)
+    t = pd.concat(
+        list(iter_table_chunks(path, TIEPOINT_COLUMNS, dtypes={"ash_id": str}, sheet=sheet)),
+        ignore_index=True,
+    )
+    if not {"ash_id", "depth_m"}.issubset(t.columns):
+        raise ValueError(f"tiepoints 文件必须包含列：{['ash_id', 'depth_m']}")
+    t = t.assign(ash_id=_ash_ids(t["ash_id"]), depth_m=_numeric_column(t, "depth_m", "tiepoints"))
+    dup = t["ash_id"][t["ash_id"].duplicated()].unique().tolist()
+    if dup:
+        raise ValueError(f"tiepoints 中 ash_id 重复：{dup}")
+    return t
+
+
+def iter_zircon_chunks(path: str, tie_ids: Sequence[str], *, sheet: Optional[str] = None,
+                       chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    分块读取锆石表并逐块校验 / 过滤，给出紧凑的块（ash_id, age_ma, sigma_ma）：
+      - 剔除 is_discordant 非 0 的颗粒；只保留 tie_ids 中有深度的 ash
+      - ash_id 为 category（类别为排序后的 tie_ids，各块相同，拼接后仍是 category）
+      - age_ma 保持 float64（250 Ma 量级的年龄需要 ~1e-7 的相对精度），sigma_ma 存为 float32
+    汇编表（section, ash_bed_id, age_2sigma_ma，如 dai_example.xlsx）按
+    ash_id = "<section>:<ash_bed_id>"、sigma_ma = age_2sigma_ma / 2 换算。
+    """
+    header = table_columns(path, sheet=sheet)
+    compilation = _is_compilation(header)
+    sigma_col = "sigma_ma" if "sigma_ma" in header or not compilation else "age_2sigma_ma"
+    required = (["section", "ash_bed_id"] if compilation else ["ash_id"]) + ["age_ma", sigma_col]
+    if not set(required).issubset(header):
+        raise ValueError(
+            f"zircon 文件必须包含列：{['ash_id', 'age_ma', 'sigma_ma']}"
+            f"（或汇编表的 {['section', 'ash_bed_id', 'age_ma', 'age_2sigma_ma']}）"
+        )
+    columns = ZIRCON_COLUMNS + (_COMPILATION_COLUMNS if compilation else ())
+    categories = pd.Index(sorted(set(tie_ids)))
 
-def read_inputs(zircon_csv: str, tiepoints_csv: str) -> InputData:
-    z = pd.read_csv(zircon_csv)
-    t = pd.read_csv(tiepoints_csv)
+    row0 = 0
+    for chunk in iter_table_chunks(path, columns, sheet=sheet, chunksize=chunksize,
+                                   dtypes={"ash_id": str, "section": str, "ash_bed_id": str}):
+        if compilation:
+            ash_id = _ash_ids(chunk["section"]) + ":" + _ash_ids(chunk["ash_bed_id"])
+        else:
+            ash_id = _ash_ids(chunk["ash_id"])
+        age = _numeric_column(chunk, "age_ma", "zircon", row0=row0)
+        sigma = _numeric_column(chunk, sigma_col, "zircon", positive=True, row0=row0)
+        if sigma_col == "age_2sigma_ma":
+            sigma = sigma / 2
+        row0 += len(chunk)
 
-    required_z = {"ash_id", "age_ma", "sigma_ma"}
-    required_t = {"ash_id", "depth_m"}
+        # 若用户提供了 discordance 标记，默认剔除；只保留有深度的 ash（不做 merge）
+        keep = ash_id.isin(categories).to_numpy()
+        if "is_discordant" in chunk.columns:
+            keep = keep & (pd.to_numeric(chunk["is_discordant"], errors="coerce").fillna(0).to_numpy() == 0)
+        yield pd.DataFrame({
+            "ash_id": pd.Categorical(ash_id[keep], categories=categories),
+            "age_ma": age.to_numpy()[keep],
+            "sigma_ma": sigma.to_numpy(np.float32)[keep],
+        })
 
-    if not required_z.issubset(z.columns):
-        raise ValueError(f"zircon.csv 必须包含列：{sorted(required_z)}")
-    if not required_t.issubset(t.columns):
-        raise ValueError(f"tiepoints.csv 必须包含列：{sorted(required_t)}")
 
-    # 若用户提供了 discordance 标记，默认剔除
-    if "is_discordant" in z.columns:
-        z = z[z["is_discordant"].fillna(0).astype(int) == 0].copy()
+def read_inputs(zircon_path: str, tiepoints_path: str, *, sheet: Optional[str] = None) -> InputData:
+    """
+    读取并校验输入（CSV / Parquet / Feather / Excel）；所有检查都在加载 PyMC 之前完成，错误输入会立即报错。
+    锆石表分块读取，只保留用到的列，按 ash_id 排序后以紧凑类型常驻内存；InputData.iter_ashes 逐个 ash 取出。
+    """
+    t = read_tiepoints(tiepoints_path, sheet=sheet)
+    z = pd.concat(list(iter_zircon_chunks(zircon_path, t["ash_id"], sheet=sheet)), ignore_index=True)
 
-    # 只保留有 depth 的 ash
-    z = z.merge(t[["ash_id"]], on="ash_id", how="inner")
+    # 按 ash 排序（稳定排序，ash 内保持文件中的顺序），去掉没有锆石的 tie point 类别
+    z = z.iloc[np.argsort(z["ash_id"].cat.codes.to_numpy(), kind="stable")].reset_index(drop=True)
+    z["ash_id"] = z["ash_id"].cat.remove_unused_categories()
+    n_ash = len(z["ash_id"].cat.categories)
+    if n_ash < 2:
+        raise ValueError(
+            f"只有 {n_ash} 个 ash 同时有锆石年龄和深度；BAD 至少需要 2 个 tie points（检查两个文件的 ash_id 是否一致）"
+        )
     return InputData(zircon=z, tiepoints=t)
 
 
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import contextlib
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+@dataclass
+class CoreBudget:
+    total_cores: int    # 本次运行可用的总核数
+    jobs: int           # 同时拟合的 ash 数（进程池大小）
+    chain_cores: int    # 每个 ash 内并行的链数（传给 pm.sample 的 cores）
+    blas_threads: int   # 每条链可用的 BLAS 线程数
+
+
+def available_cores() -> int:
+    """Cores this process may run on (respects affinity masks / cgroups where exposed)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def plan_core_budget(
+    n_tasks: int,
+    chains: int,
+    cores: Optional[int] = None,
+    jobs: Optional[int] = None,
+) -> CoreBudget:
+    """
+    把总核数分给「并发 ash × 每个 ash 的链 × 每条链的 BLAS 线程」，保证乘积不超过 cores：
+    - jobs 未指定时，优先让每个 ash 的所有链都能并行（jobs = cores // chains）
+    - 每个 ash 分到 cores // jobs 个核，先给链用，剩余的给 BLAS
+    """
+    total = max(1, int(cores) if cores else available_cores())
+    chains = max(1, int(chains))
+    if jobs is None:
+        jobs = max(1, total // chains)
+    jobs = max(1, min(int(jobs), max(1, n_tasks), total))
+
+    per_job = max(1, total // jobs)
+    chain_cores = min(chains, per_job)
+    blas_threads = max(1, per_job // chain_cores)
+    return CoreBudget(total_cores=total, jobs=jobs, chain_cores=chain_cores, blas_threads=blas_threads)
+
+
+def ash_seed(seed: int, ash_id: str) -> int:
+    """
+    每个 ash 的随机种子：从 SeedSequence(seed) 派生子序列，spawn_key 取 ash_id 的 CRC32。
+    与 ash 的处理顺序、worker 数量无关，结果可复现。
+    """
+    key = zlib.crc32(str(ash_id).encode("utf-8"))
+    child = np.random.SeedSequence(entropy=int(seed), spawn_key=(key,))
+    return int(child.generate_state(1, dtype=np.uint32)[0] >> 1)
+
+
+@contextlib.contextmanager
+def limit_blas_threads(n_threads: int) -> Iterator[None]:
+    """Set BLAS/OpenMP thread env vars (inherited by child processes) and cap already-loaded pools."""
+    old = {k: os.environ.get(k) for k in _BLAS_ENV_VARS}
+    for k in _BLAS_ENV_VARS:
+        os.environ[k] = str(int(n_threads))
+    try:
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            limiter = contextlib.nullcontext()
+        else:
+            limiter = threadpool_limits(limits=int(n_threads))
+        with limiter:
+            yield
+    finally:
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _init_worker(blas_threads: int, channel=None) -> None:
+    if channel is not None:
+        from .progress import install
+
+        install(*channel)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=blas_threads)
+
+
+def _fit_one(task: Tuple[str, np.ndarray, np.ndarray, Dict]):
+    from .bea import fit_bea_for_ash
+    from .progress import fit
+
+    ash_id, ages, sigmas, kwargs = task
+    with fit(f"BEA {ash_id}"):
+        return fit_bea_for_ash(ash_id=ash_id, ages=ages, sigmas=sigmas, **kwargs)
+
+
+def fit_bea_parallel(
+    groups: Iterable[Tuple[str, np.ndarray, np.ndarray]],
+    *,
+    seed: int = 42,
+    chains: int = 2,
+    cores: Optional[int] = None,
+    jobs: Optional[int] = None,
+    on_result: Optional[Callable] = None,
+    warm_starts: Optional[Dict] = None,
+    group_kwargs: Optional[Sequence[Dict]] = None,
+    **fit_kwargs,
+) -> List:
+    """
+    并行 BEA：在进程池里按 ash 拟合，核预算在并发 ash 与链之间分配。
+
+    groups: (ash_id, ages, sigmas) 序列
+    fit_kwargs: 透传给 fit_bea_for_ash（use_bootstrap_prior, max_span_ma, draws, tune, ...）
+    on_result: 每个 ash 拟合完成时（按完成顺序）在主进程里调用 on_result(BEAResult)，用于逐 ash 写检查点
+    group_kwargs: 与 groups 等长的逐组覆盖参数（如 sweep 中同一 ash 在不同 max_span_ma 下各拟合一次）
+    warm_starts: {ash_id: TuningState}，有记录的 ash 从上次的调参状态热启动（见 sampling.run_sampler）
+    返回与 groups 同序的 BEAResult 列表；每个 ash 的种子由 ash_seed(seed, ash_id) 决定。
+    """
+    groups = list(groups)
+    budget = plan_core_budget(len(groups), chains=chains, cores=cores, jobs=jobs)
+
+    tasks = []
+    for i, (ash_id, ages, sigmas) in enumerate(groups):
+        kw = dict(fit_kwargs)
+        if group_kwargs is not None:
+            kw.update(group_kwargs[i])
+        kw.update(
+            seed=ash_seed(seed, ash_id),
+            chains=chains,
+            cores=budget.chain_cores,
+            progressbar=fit_kwargs.get("progressbar", True) and budget.jobs == 1,
+            warm_start=(warm_starts or {}).get(ash_id),
+        )
+        tasks.append((ash_id, np.asarray(ages, dtype=float), np.asarray(sigmas, dtype=float), kw))
+
+    from .progress import channel
+
+    with limit_blas_threads(budget.blas_threads):
+        if budget.jobs == 1:
+            results = []
+            for t in tasks:
+                results.append(_fit_one(t))
+                if on_result is not None:
+                    on_result(results[-1])
+            return results
+
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=budget.jobs,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(budget.blas_threads, channel()),
+        ) as ex:
+            futures = {ex.submit(_fit_one, t): i for i, t in enumerate(tasks)}
+            results = [None] * len(tasks)
+            for fut in as_completed(futures):
+                results[futures[fut]] = fut.result()
+                if on_result is not None:
+                    on_result(results[futures[fut]])
+            return results
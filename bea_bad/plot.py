@@ -1,45 +1,303 @@
 from __future__ import annotations
+import argparse
+import math
 import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 from .utils import ensure_dir
 
+# 图都用面向对象的 Figure + Agg 画布绘制，不经过 pyplot：没有全局状态，可在进程池 worker、
+# 无显示器的服务器和打包的 GUI 里并行使用，也不会改变调用方（如 notebook）的后端
 
-def plot_age_depth(
+# 后验曲线（spaghetti）默认最多画的 draw 数与每条曲线的点数
+MAX_CURVES = 200
+MAX_POINTS = 150
+
+VECTOR_FORMATS = ("svg", "pdf", "eps")
+
+
+def _figure(figsize=(6.4, 4.8)):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _save(fig, stem: str, formats: Sequence[str], dpi: int) -> List[str]:
+    """按 formats 写出 <stem>.<fmt>；矢量格式里 spaghetti 曲线已设为 rasterized，文件不会随 draw 数膨胀。"""
+    paths = []
+    for fmt in formats:
+        path = f"{stem}.{fmt}"
+        fig.savefig(path, dpi=dpi, format=fmt)
+        paths.append(path)
+    return paths
+
+
+def _stride(n: int, max_n: int) -> int:
+    return max(1, math.ceil(n / max(1, int(max_n))))
+
+
+def posterior_curves(posterior_path: str, depths: np.ndarray, *, max_curves: int = MAX_CURVES,
+                     max_points: int = MAX_POINTS):
+    """
+    从 bad_posterior.nc 均匀抽取至多 max_curves 个 draw（只从磁盘读这些 draw），
+    在至多 max_points 个深度上计算年龄。返回 (depths, ages[curves, points])。
+    """
+    from .bad import _piecewise_age_draws
+    from .store import open_group
+
+    depths = np.asarray(depths, dtype=float)
+    depths = depths[::_stride(len(depths), max_points)]
+    with open_group(posterior_path, "posterior") as ds:
+        n = ds.sizes["chain"] * ds.sizes["draw"]
+        sl = slice(None, None, _stride(n, max_curves))
+        d_tie = ds["d_true"].isel(draw=sl).values
+        age0 = ds["age0"].isel(draw=sl).values
+        rates = ds["rates"].isel(draw=sl).values
+    K = d_tie.shape[-1]
+    ages = _piecewise_age_draws(d_tie.reshape(-1, K), age0.reshape(-1), rates.reshape(-1, K - 1), depths)
+    return depths, ages[:max_curves]
+
+
+def bea_draws(bea_posterior_path: str) -> Dict[str, np.ndarray]:
+    """bea_posterior.nc → {ash_id: E 的全部 draws}。"""
+    from .store import bea_group, list_bea_ashes, read_draws
+
+    return {a: read_draws(bea_posterior_path, "E", group=bea_group(a)) for a in list_bea_ashes(bea_posterior_path)}
+
+
+def draw_age_depth(
+    ax,
     tie_summary: pd.DataFrame,
     query_summary: pd.DataFrame,
-    outdir: str,
-    filename: str = "age_depth_model.png",
-    invert_y: bool = True
-) -> str:
-    ensure_dir(outdir)
-    fig_path = os.path.join(outdir, filename)
+    *,
+    curves=None,
+    invert_y: bool = True,
+) -> None:
+    """在 ax 上画年龄–深度模型：95% HDI 带、均值、tie point 误差棒；curves=(depths, ages) 时加后验曲线。"""
+    from matplotlib.collections import LineCollection
 
     qq = query_summary["depth_m"].to_numpy(float)
-    plt.figure()
-    plt.fill_betweenx(
+    if curves is not None:
+        depths, ages = curves
+        segs = np.stack([ages, np.broadcast_to(depths, ages.shape)], axis=-1)
+        ax.add_collection(LineCollection(segs, colors="0.35", linewidths=0.4, alpha=0.15,
+                                         rasterized=True, zorder=1))
+    ax.fill_betweenx(
         qq,
         query_summary["age_hdi95_low_ma"].to_numpy(float),
         query_summary["age_hdi95_high_ma"].to_numpy(float),
-        alpha=0.3
+        alpha=0.3, zorder=2
     )
-    plt.plot(query_summary["age_mean_ma"].to_numpy(float), qq)
+    ax.plot(query_summary["age_mean_ma"].to_numpy(float), qq, zorder=3)
 
-    plt.errorbar(
+    ax.errorbar(
         tie_summary["eruption_obs_ma"].to_numpy(float),
         tie_summary["depth_obs_m"].to_numpy(float),
         xerr=1.96 * tie_summary["eruption_obs_sd_ma"].to_numpy(float),
-        fmt="o"
+        fmt="o", zorder=4
     )
-
+    ax.autoscale_view()
     if invert_y:
-        plt.gca().invert_yaxis()
-
-    plt.xlabel("Age (Ma)")
-    plt.ylabel("Depth (m)")
-    plt.title("Bayesian age–depth model (BAD-like) using BEA eruption ages")
-    plt.tight_layout()
-    plt.savefig(fig_path, dpi=200)
-    plt.close()
+        ax.invert_yaxis()
+    ax.set_xlabel("Age (Ma)")
+    ax.set_ylabel("Depth (m)")
+
+
+def draw_bea_histograms(axes, draws: Dict[str, np.ndarray], *, bins: int = 40) -> None:
+    """每个 ash 一个小图：E 后验的直方图（预先用 np.histogram 分箱，stairs 一次画出）。"""
+    axes = list(np.ravel(axes))
+    for ax, (ash_id, e) in zip(axes, draws.items()):
+        counts, edges = np.histogram(np.asarray(e, dtype=float), bins=bins, density=True)
+        ax.stairs(counts, edges, fill=True, alpha=0.6)
+        ax.set_title(str(ash_id), fontsize=7)
+        ax.tick_params(labelsize=6)
+        ax.set_yticks([])
+    for ax in axes[len(draws):]:
+        ax.set_visible(False)
+
+
+def plot_age_depth(
+    tie_summary: pd.DataFrame,
+    query_summary: pd.DataFrame,
+    outdir: str,
+    filename: str = "age_depth_model.png",
+    invert_y: bool = True,
+    posterior_path: Optional[str] = None,
+    max_curves: int = MAX_CURVES,
+    curves=None,
+    title: str = "Bayesian age–depth model (BAD-like) using BEA eruption ages",
+) -> str:
+    """
+    单个剖面的年龄–深度图；给出 posterior_path（bad_posterior.nc）时叠加抽稀后的后验曲线，
+    或直接给出 curves=(depths, ages)（preview 没有 posterior 文件）。
+    """
+    ensure_dir(outdir)
+    fig_path = os.path.join(outdir, filename)
+    if curves is None and posterior_path and max_curves > 0:
+        curves = posterior_curves(posterior_path, query_summary["depth_m"].to_numpy(float), max_curves=max_curves)
+
+    fig = _figure()
+    ax = fig.add_subplot()
+    draw_age_depth(ax, tie_summary, query_summary, curves=curves, invert_y=invert_y)
+    ax.set_title(title)
+    fig.tight_layout()
+    stem, ext = os.path.splitext(fig_path)
+    _save(fig, stem, [ext.lstrip(".") or "png"], dpi=200)
     return fig_path
+
+
+def plot_sweep(
+    query_summaries: Dict[str, pd.DataFrame],
+    tie_summaries: Dict[str, pd.DataFrame],
+    out_path: str,
+    *,
+    invert_y: bool = True,
+) -> str:
+    """
+    sweep 的叠加图：每个网格点一条均值曲线 + 95% HDI 带，以及该点的 tie point（BEA 年龄随 BEA 设置变化），
+    同一网格点同一颜色；两个 dict 以图例标签为键。
+    """
+    fig = _figure(figsize=(7.5, 5.5))
+    ax = fig.add_subplot()
+    for i, (label, q) in enumerate(query_summaries.items()):
+        qq = q["depth_m"].to_numpy(float)
+        color = f"C{i % 10}"
+        ax.fill_betweenx(qq, q["age_hdi95_low_ma"].to_numpy(float), q["age_hdi95_high_ma"].to_numpy(float),
+                         color=color, alpha=0.12, linewidth=0)
+        ax.plot(q["age_mean_ma"].to_numpy(float), qq, color=color, linewidth=1.0, label=label)
+        tie = tie_summaries.get(label)
+        if tie is not None:
+            ax.errorbar(
+                tie["eruption_obs_ma"].to_numpy(float),
+                tie["depth_obs_m"].to_numpy(float),
+                xerr=1.96 * tie["eruption_obs_sd_ma"].to_numpy(float),
+                fmt="o", color=color, markersize=3, elinewidth=0.8, alpha=0.8, zorder=4
+            )
+    if invert_y:
+        ax.invert_yaxis()
+    ax.set_xlabel("Age (Ma)")
+    ax.set_ylabel("Depth (m)")
+    ax.set_title("Hyperparameter sensitivity (mean and 95% HDI per setting)")
+    ax.legend(fontsize=6, loc="best")
+    fig.tight_layout()
+    stem, ext = os.path.splitext(out_path)
+    _save(fig, stem, [ext.lstrip(".") or "png"], dpi=200)
+    return out_path
+
+
+def plot_section_qa(
+    section_dir: str,
+    out_stem: Optional[str] = None,
+    *,
+    title: Optional[str] = None,
+    formats: Sequence[str] = ("png",),
+    dpi: int = 100,
+    max_curves: int = MAX_CURVES,
+    bins: int = 40,
+) -> List[str]:
+    """
+    一个剖面输出目录的 QA 图：左侧年龄–深度模型（含后验曲线），右侧每个 ash 的 BEA 后验直方图。
+    读取 tiepoint_summary.csv、query_age_summary.csv，以及存在时的 bad_posterior.nc / bea_posterior.nc。
+    """
+    tie = pd.read_csv(os.path.join(section_dir, "tiepoint_summary.csv"))
+    query = pd.read_csv(os.path.join(section_dir, "query_age_summary.csv"))
+    bad_path = os.path.join(section_dir, "bad_posterior.nc")
+    bea_path = os.path.join(section_dir, "bea_posterior.nc")
+    curves = None
+    if max_curves > 0 and os.path.exists(bad_path):
+        curves = posterior_curves(bad_path, query["depth_m"].to_numpy(float), max_curves=max_curves)
+    draws = bea_draws(bea_path) if os.path.exists(bea_path) else {}
+
+    fig = _figure(figsize=(11, 5.5) if draws else (6.4, 5.5))
+    if draws:
+        gs = fig.add_gridspec(1, 2, width_ratios=[3, 2])
+        ax = fig.add_subplot(gs[0])
+        ncols = math.ceil(math.sqrt(len(draws)))
+        nrows = math.ceil(len(draws) / ncols)
+        sub = gs[1].subgridspec(nrows, ncols)
+        draw_bea_histograms([fig.add_subplot(sub[i]) for i in range(nrows * ncols)], draws, bins=bins)
+    else:
+        ax = fig.add_subplot()
+    draw_age_depth(ax, tie, query, curves=curves)
+    ax.set_title(title or os.path.basename(os.path.normpath(section_dir)))
+    fig.tight_layout()
+    return _save(fig, out_stem or os.path.join(section_dir, "qa"), formats, dpi)
+
+
+def _render_one(task) -> Dict[str, object]:
+    section_dir, out_stem, kwargs = task
+    try:
+        paths = plot_section_qa(section_dir, out_stem, **kwargs)
+    except Exception as e:  # 单个剖面出错不影响其他剖面
+        return dict(section_dir=section_dir, paths=[], error=f"{type(e).__name__}: {e}")
+    return dict(section_dir=section_dir, paths=paths, error="")
+
+
+def render_sections(
+    section_dirs: Sequence[str],
+    outdir: Optional[str] = None,
+    *,
+    jobs: Optional[int] = None,
+    **kwargs,
+) -> List[Dict[str, object]]:
+    """
+    并行绘制多个剖面的 QA 图（进程池，每个 worker 只导入一次 matplotlib）。
+    outdir 给出时图写到 <outdir>/<剖面目录名>.<fmt>，否则写到各剖面目录下的 qa.<fmt>。
+    kwargs 传给 plot_section_qa（formats, dpi, max_curves, bins）。
+    """
+    from .parallel import available_cores
+
+    tasks = []
+    for d in section_dirs:
+        stem = None
+        if outdir is not None:
+            ensure_dir(outdir)
+            stem = os.path.join(outdir, os.path.basename(os.path.normpath(d)))
+        tasks.append((d, stem, kwargs))
+
+    jobs = max(1, min(len(tasks), jobs or available_cores()))
+    if jobs == 1:
+        return [_render_one(t) for t in tasks]
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as ex:
+        return list(ex.map(_render_one, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    import time
+
+    ap = argparse.ArgumentParser("bea_bad plots")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--sections", nargs="+", help="section output folders (each with tiepoint_summary.csv etc.)")
+    src.add_argument("--batch", help="batch output folder: plots every section marked ok in batch_summary.csv")
+    ap.add_argument("--outdir", default=None, help="write all figures here (default: qa.<fmt> in each section folder)")
+    ap.add_argument("--format", nargs="+", default=["png"], dest="formats",
+                    help="one or more of png, jpg, svg, pdf (vector formats keep posterior curves rasterized)")
+    ap.add_argument("--dpi", type=int, default=100, help="raster resolution (lower = smaller, faster files)")
+    ap.add_argument("--max_curves", type=int, default=MAX_CURVES, help="posterior draws drawn as curves (0 = none)")
+    ap.add_argument("--bins", type=int, default=40, help="bins of the per-ash BEA histograms")
+    ap.add_argument("--jobs", type=int, default=None, help="sections rendered in parallel (default: all cores)")
+    args = ap.parse_args(argv)
+
+    if args.batch:
+        summary = pd.read_csv(os.path.join(args.batch, "batch_summary.csv"))
+        sections = summary.loc[summary["status"] == "ok", "outdir"].tolist()
+    else:
+        sections = args.sections
+
+    t0 = time.perf_counter()
+    out = render_sections(sections, args.outdir, jobs=args.jobs, formats=args.formats, dpi=args.dpi,
+                          max_curves=args.max_curves, bins=args.bins)
+    failed = [r for r in out if r["error"]]
+    print(f"QA figures: {len(out) - len(failed)}/{len(out)} sections in {time.perf_counter() - t0:.1f} s")
+    for r in failed:
+        print(f"  {r['section_dir']}: FAILED ({r['error']})")
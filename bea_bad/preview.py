@@ -0,0 +1,227 @@
+from __future__ import annotations
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import progress
+from .bad import _piecewise_age_draws, sedrate_rho, summarize_draws
+from .dataio import read_inputs, read_query_depths
+from .parallel import ash_seed, available_cores
+from .plot import MAX_CURVES, plot_age_depth
+from .report import RunReport
+from .utils import bootstrap_min_kde_draws, ensure_dir, hdi_from_sorted, select_grains
+
+# 快速预览（--preview）：不用 PyMC，整个流程只用 NumPy，约一秒出结果，用来检查深度符号约定、
+# 找出明显有问题的 ash、试 max_span_ma。
+#   BEA：每个 ash 的喷发年龄直接取 bootstrap-min KDE（bootstrap_min_prior_kde）的样本
+#   BAD：与 bad.build_bad_model 相同的单调分段线性模型，按块生成提议（深度 ~ 先验，tie 年龄 ~ 上面的 KDE 样本），
+#        拒绝深度或年龄不单调的提议，其余按沉积速率先验加权（重要性抽样），最后重采样成等权 draws
+# tie 年龄的似然就是 bootstrap-min 分布本身（不是完整 BAD 的 Normal(e_mean, e_sd)），与提议相消；
+# 结果是近似的，输出的表里 method 列为 "preview"，图的标题也注明。
+
+METHOD = "preview"
+POOL_SIZE = 20000          # 每个 ash 的 KDE 样本数
+DRAWS = 4000               # 重采样后输出的 draws
+BLOCK_BYTES = 16 * 2**20   # 每块提议 (rows, K) 数组的大小上限
+MAX_PROPOSALS = 500_000
+ESS_TARGET = 2000.0
+ESS_WARN = 200.0           # 有效样本数低于此值时提示结果不可靠
+CONFLICT_P = 0.9           # 下面的 ash 比上面年轻的概率高于此值时标记该 ash
+
+
+@dataclass
+class PreviewBAD:
+    d_true: np.ndarray       # (DRAWS, K)
+    age0: np.ndarray         # (DRAWS,)
+    rates: np.ndarray        # (DRAWS, K-1)
+    n_proposals: int
+    acceptance: float        # 满足单调约束的提议比例
+    ess: float               # 重要性权重的有效样本数（Kish）
+    p_reversed: np.ndarray   # (K-1,) 每对相邻 tie 中下面的 ash 比上面年轻的提议比例
+
+
+def preview_bea(ash_id: str, ages: np.ndarray, sigmas: np.ndarray, *, max_span_ma: float = 1.0,
+                size: int = POOL_SIZE, seed: int = 42) -> Tuple[Dict[str, Any], np.ndarray]:
+    """一个 ash 的近似喷发年龄：返回 (bea_eruption_age_summary.csv 的一行, KDE 样本)。"""
+    ages2, sigmas2 = select_grains(ages, sigmas, max_span_ma=max_span_ma)
+    e = bootstrap_min_kde_draws(ages2, sigmas2, size, seed=seed)
+    lo, hi = hdi_from_sorted(np.sort(e), 0.95)
+    row = dict(ash_id=ash_id, e_mean=float(e.mean()), e_sd=float(e.std()),
+               hdi95_low=float(lo), hdi95_high=float(hi), n_used=int(ages2.size))
+    return row, e
+
+
+def _log_weights(d: np.ndarray, a: np.ndarray, *, age0_mu: float, age0_sd: float, rate_mu: float,
+                 rate_sigma: float, rho: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    单调提议 (深度 d, tie 年龄 a) 的对数重要性权重与对应的沉积速率。
+    目标密度在 (d, a) 坐标下：age0 先验 × log 速率的 AR(1) 先验 × 1/速率（LogNormal）× 1/段长（rates → a 的雅可比）；
+    深度先验与 tie 年龄的似然和提议相同，已相消。
+    """
+    seg = np.diff(d, axis=1)
+    rates = np.diff(a, axis=1) / seg
+    x = np.log(rates) - rate_mu
+    innov = x.copy()
+    innov[:, 1:] -= rho * x[:, :-1]
+    sd = rate_sigma * np.sqrt(np.concatenate([[1.0], 1.0 - rho ** 2]))
+    lw = (
+        -0.5 * ((a[:, 0] - age0_mu) / age0_sd) ** 2
+        - 0.5 * np.sum((innov / sd) ** 2, axis=1) - np.sum(np.log(sd))
+        - np.sum(np.log(rates), axis=1) - np.sum(np.log(seg), axis=1)
+    )
+    return lw, rates
+
+
+def preview_bad(
+    d_obs: np.ndarray,
+    pools: np.ndarray,
+    *,
+    depth_sigma_m: float = 0.03,
+    sedrate_logn_mu: float = np.log(0.05),
+    sedrate_logn_sigma: float = 1.0,
+    sedrate_corr_m: float = 0.0,
+    draws: int = DRAWS,
+    max_proposals: int = MAX_PROPOSALS,
+    ess_target: float = ESS_TARGET,
+    seed: int = 42,
+    labels: Optional[Sequence[str]] = None,
+) -> PreviewBAD:
+    """
+    d_obs: (K,) 已排序的 tie 深度；pools: (P, K) 每个 tie 的年龄样本（preview_bea 的 KDE 样本）；
+    labels: 各 tie 的 ash_id（只用于错误信息）。
+    按块生成提议，直到权重的有效样本数达到 ess_target 或提议数达到 max_proposals；
+    没有一个提议满足单调约束时抛出 ValueError（通常是深度符号约定反了或某个 ash 年龄明显不对）。
+    """
+    rng = np.random.default_rng(seed)
+    P, K = pools.shape
+    sd0 = float(np.std(pools[:, 0]))
+    hyper = dict(age0_mu=float(np.mean(pools[:, 0])), age0_sd=max(5 * sd0, 0.2), rate_mu=float(sedrate_logn_mu),
+                 rate_sigma=float(sedrate_logn_sigma), rho=sedrate_rho(d_obs, sedrate_corr_m))
+    block = int(np.clip(BLOCK_BYTES // (8 * K), 1000, 20000))
+    cols = np.arange(K)
+
+    kept_d: List[np.ndarray] = []
+    kept_a: List[np.ndarray] = []
+    kept_r: List[np.ndarray] = []
+    kept_lw: List[np.ndarray] = []
+    reversed_ = np.zeros(K - 1)
+    n = 0
+    ess = 0.0
+    while n < max_proposals and ess < ess_target:
+        m = min(block, max_proposals - n)
+        d = d_obs + depth_sigma_m * rng.standard_normal((m, K))
+        a = pools[rng.integers(0, P, size=(m, K)), cols]
+        up = np.diff(a, axis=1) > 0
+        reversed_ += m - up.sum(axis=0)
+        ok = up.all(axis=1) & (np.diff(d, axis=1) > 0).all(axis=1)
+        n += m
+        if ok.any():
+            lw, rates = _log_weights(d[ok], a[ok], **hyper)
+            kept_d.append(d[ok])
+            kept_a.append(a[ok])
+            kept_r.append(rates)
+            kept_lw.append(lw)
+            all_lw = np.concatenate(kept_lw)
+            w = np.exp(all_lw - all_lw.max())
+            ess = float(w.sum() ** 2 / np.sum(w ** 2))
+
+    p_reversed = reversed_ / max(n, 1)
+    if not kept_lw:
+        labels = list(labels) if labels is not None else [str(k) for k in range(K)]
+        pairs = [f"{labels[k]}/{labels[k + 1]}" for k in np.flatnonzero(p_reversed > 0.5)]
+        raise ValueError(
+            f"预览：{n} 个提议中没有一个满足年龄随深度单调递增；检查深度符号约定（见 README 的 "
+            f"Depth sign convention），以及下面的 ash 比上面的年轻的相邻 ash 对：{', '.join(pairs) or '无'}"
+        )
+
+    # 系统重采样成等权 draws
+    cdf = np.cumsum(w)
+    cdf /= cdf[-1]
+    idx = np.minimum(np.searchsorted(cdf, (rng.random() + np.arange(draws)) / draws), cdf.size - 1)
+    d_all, a_all, r_all = np.concatenate(kept_d), np.concatenate(kept_a), np.concatenate(kept_r)
+    return PreviewBAD(
+        d_true=d_all[idx], age0=a_all[idx, 0], rates=r_all[idx],
+        n_proposals=n, acceptance=all_lw.size / n, ess=ess, p_reversed=p_reversed
+    )
+
+
+def run_preview(args) -> dict:
+    """
+    run_pipeline 的 --preview 分支：读入、近似 BEA、近似 BAD、作图，输出文件名与完整运行相同
+    （bea_eruption_age_summary.csv, tiepoint_summary.csv, query_age_summary.csv, age_depth_model.png,
+    run_report.json），不写 posterior 文件、缓存与检查点。
+    已有完整运行结果（bad_posterior.nc）的 outdir 不会被覆盖。
+    """
+    if os.path.exists(os.path.join(args.outdir, "bad_posterior.nc")):
+        raise ValueError(f"{args.outdir} 中已有完整运行的结果，预览不会覆盖它们；请换一个 --outdir")
+    ensure_dir(args.outdir)
+    report = RunReport(progress.stage_hook(), argv=vars(args), cores=available_cores(), method=METHOD)
+
+    with report.stage("read_inputs"):
+        data = read_inputs(args.zircon, args.tiepoints, sheet=args.sheet)
+        qdepths = read_query_depths(args.query, data.tiepoints)
+
+    with report.stage("bea"):
+        rows, pools = [], {}
+        for ash_id, ages, sigmas in data.iter_ashes():
+            row, pools[ash_id] = preview_bea(ash_id, ages, sigmas, max_span_ma=args.max_span_ma,
+                                             seed=ash_seed(args.seed, ash_id))
+            rows.append(row)
+    bea_df = pd.DataFrame(rows).merge(data.tiepoints, on="ash_id", how="left").sort_values("depth_m")
+    bea_path = os.path.join(args.outdir, "bea_eruption_age_summary.csv")
+    bea_df.assign(method=METHOD).to_csv(bea_path, index=False)
+
+    with report.stage("bad"):
+        t0 = time.perf_counter()
+        # bea_df 已按深度排序
+        d_obs, E_obs, E_sd = (bea_df[c].to_numpy(float) for c in ("depth_m", "e_mean", "e_sd"))
+        ash_ids = bea_df["ash_id"].to_numpy()
+        res = preview_bad(
+            d_obs, np.stack([pools[a] for a in ash_ids], axis=1),
+            depth_sigma_m=args.depth_sigma_m, sedrate_logn_mu=args.sedrate_logn_mu,
+            sedrate_logn_sigma=args.sedrate_logn_sigma, sedrate_corr_m=args.sedrate_corr_m, seed=args.seed,
+            labels=ash_ids
+        )
+        tie_summary, query_summary = summarize_draws(res.d_true, res.age0, res.rates, d_obs, E_obs, E_sd, qdepths)
+        bad_s = time.perf_counter() - t0
+
+    tie_path = os.path.join(args.outdir, "tiepoint_summary.csv")
+    query_path = os.path.join(args.outdir, "query_age_summary.csv")
+    tie_summary.assign(method=METHOD).to_csv(tie_path, index=False)
+    query_summary.assign(method=METHOD).to_csv(query_path, index=False)
+
+    with report.stage("plot"):
+        depths = query_summary["depth_m"].to_numpy(float)
+        depths = depths[::max(1, depths.size // 150)]
+        curves = (depths, _piecewise_age_draws(res.d_true[:MAX_CURVES], res.age0[:MAX_CURVES],
+                                               res.rates[:MAX_CURVES], depths))
+        fig_path = plot_age_depth(tie_summary, query_summary, outdir=args.outdir, curves=curves,
+                                  title="Quick-look PREVIEW (approximate Monte Carlo, not MCMC)")
+
+    # 下面的 ash 几乎肯定比上面年轻：该 ash（或上面的 ash）的年龄有问题；多数相邻对倒置：深度约定反了
+    conflicts = [(ash_ids[k], ash_ids[k + 1], p) for k, p in enumerate(res.p_reversed) if p > CONFLICT_P]
+    flagged = {b for _, b, _ in conflicts}
+    report.bea = [dict(ash_id=r["ash_id"], n_used=r["n_used"], cached=False,
+                       flags=["order_conflict"] if r["ash_id"] in flagged else []) for r in rows]
+    report.bad = dict(method=METHOD, wall_s=bad_s, n_proposals=res.n_proposals, acceptance=res.acceptance,
+                      ess=res.ess, draws=int(res.age0.size))
+    report_path = report.write(os.path.join(args.outdir, "run_report.json"))
+
+    print(f"Preview (approximate, NumPy Monte Carlo): {res.n_proposals} proposals, "
+          f"acceptance {res.acceptance:.1%}, ESS {res.ess:.0f}, {bad_s:.2f} s")
+    for a, b, p in conflicts:
+        print(f"Preview: ash {b} is younger than ash {a} above it in {p:.0%} of draws")
+    if np.mean(res.p_reversed > 0.5) > 0.5:
+        print("Preview: ages mostly decrease with depth; check the depth sign convention")
+    if res.ess < ESS_WARN:
+        print(f"Preview: only {res.ess:.0f} effective draws; the preview is unreliable, run the full model")
+    print("BEA summary:", bea_path)
+    print("Tie summary:", tie_path)
+    print("Query summary:", query_path)
+    print("Figure:", fig_path)
+    print("Run report:", report_path)
+    return report.to_dict()
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import contextlib
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from .report import StageHook
+
+# 本进程的进度通道（install 之后才生效；未安装时所有函数都是空操作）
+_queue = None        # multiprocessing.Queue：事件 dict
+_cancel = None       # multiprocessing.Event：被设置后在下一个检查点抛出 Cancelled
+_fit: Dict[str, Any] = {}   # 当前采样的标签与每条链的总迭代数（sample_callback 用）
+
+# 每条链每隔多少次迭代发一次 draws 事件
+DRAW_EVERY = 50
+
+
+class Cancelled(Exception):
+    """运行被取消（GUI 的 Cancel）。"""
+
+
+def install(queue=None, cancel=None) -> None:
+    """
+    在本进程安装进度通道。GUI 的 worker 进程与 BEA 进程池的 worker 各自调用一次
+    （进程池通过 parallel._init_worker 继承同一个 queue / cancel）。
+    """
+    global _queue, _cancel
+    _queue, _cancel = queue, cancel
+
+
+def channel():
+    """(queue, cancel)，未安装时为 None；用于传给子进程。"""
+    return (_queue, _cancel) if (_queue is not None or _cancel is not None) else None
+
+
+def installed() -> bool:
+    return _queue is not None or _cancel is not None
+
+
+def emit(event: str, **data: Any) -> None:
+    """
+    发送一个事件：{"event": event, "t": time.time(), ...}。事件类型：
+      stage   stage, status=start|end, [wall_s]
+      ash     ash_id, done, total, elapsed_s, eta_s     （一个 ash 完成或从缓存/检查点取出）
+      fit     fit, status=start, chains, total          （一次 pm.sample 开始；total 为每条链的 tune + draws）
+      draws   fit, chain, draw, total, tuning            （每条链每 DRAW_EVERY 次迭代）
+    """
+    if _queue is not None:
+        _queue.put(dict(event=event, t=time.time(), **data))
+
+
+def check_cancelled() -> None:
+    if _cancel is not None and _cancel.is_set():
+        raise Cancelled("run cancelled")
+
+
+@contextlib.contextmanager
+def fit(label: str) -> Iterator[None]:
+    """标记当前的拟合（"BEA <ash_id>"、"BAD" 等），供 fit / draws 事件标注。"""
+    check_cancelled()
+    _fit["label"] = label
+    try:
+        yield
+    finally:
+        _fit.clear()
+
+
+def sampling_callback(*, chains: int, total: int):
+    """
+    sampling._sample 在每次调用 pm.sample 前调用：发送 fit 事件并返回 pm.sample 的 callback；
+    通道未安装时返回 None（不给 pm.sample 加回调）。
+    """
+    if not installed():
+        return None
+    check_cancelled()
+    _fit["total"] = int(total)
+    emit("fit", fit=_fit.get("label", ""), status="start", chains=int(chains), total=int(total))
+    return sample_callback
+
+
+def sample_callback(trace, draw) -> None:
+    """pm.sample 的 callback：发送链进度，并在取消时抛出 Cancelled 终止采样（多进程链也会被终止）。"""
+    i = int(draw.draw_idx) + 1
+    if i % DRAW_EVERY == 0 or i == _fit.get("total"):
+        emit("draws", fit=_fit.get("label", ""), chain=int(draw.chain), draw=i,
+             total=_fit.get("total"), tuning=bool(draw.tuning))
+    check_cancelled()
+
+
+def stage_hook(inner: Optional[StageHook] = None) -> StageHook:
+    """包装 RunReport 的阶段钩子：阶段开始前检查取消，开始 / 结束时发送 stage 事件。"""
+
+    @contextlib.contextmanager
+    def hook(stage: str) -> Iterator[None]:
+        check_cancelled()
+        emit("stage", stage=stage, status="start")
+        t0 = time.perf_counter()
+        with inner(stage) if inner is not None else contextlib.nullcontext():
+            yield
+        emit("stage", stage=stage, status="end", wall_s=time.perf_counter() - t0)
+
+    return hook
+
+
+class AshProgress:
+    """逐 ash 的完成计数与 ETA（按已拟合 ash 的平均耗时估计剩余时间；缓存命中不计入平均）。"""
+
+    def __init__(self, total: int):
+        self.total = int(total)
+        self.done = 0
+        self.fitted = 0
+        self._t0 = time.perf_counter()
+
+    def update(self, ash_id: str, *, cached: bool = False) -> None:
+        self.done += 1
+        self.fitted += 0 if cached else 1
+        elapsed = time.perf_counter() - self._t0
+        remaining = self.total - self.done
+        eta = elapsed / self.fitted * remaining if self.fitted else None
+        emit("ash", ash_id=str(ash_id), done=self.done, total=self.total, elapsed_s=elapsed, eta_s=eta)
+
+
+def worker_main(config, queue, cancel) -> None:
+    """PipelineWorker 的子进程入口：安装通道、运行流水线，最后发送 done / cancelled / error 事件。"""
+    import traceback
+
+    from .cli import run_pipeline
+
+    install(queue, cancel)
+    try:
+        report = run_pipeline(config)
+    except Cancelled:
+        emit("cancelled")
+    except Exception as e:
+        emit("error", message=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    else:
+        emit("done", outdir=config.outdir, wall_s=report["total"]["wall_s"])
+
+
+class PipelineWorker:
+    """
+    在独立进程（spawn）里运行 run_pipeline(config)，调用方（GUI 主线程）不阻塞：
+      start()       启动
+      poll()        取出目前为止的所有事件（不阻塞），见 emit 的事件类型，另有结束事件 done / cancelled / error
+      cancel()      请求取消：采样在下一次迭代、其余工作在下一个阶段 / ash 边界停止
+      terminate()   强制结束（取消后长时间没有退出时使用）
+    """
+
+    def __init__(self, config):
+        import multiprocessing
+
+        ctx = multiprocessing.get_context("spawn")
+        self.queue = ctx.Queue()
+        self._cancel = ctx.Event()
+        # 非 daemon：worker 自己还要启动 BEA 进程池 / 多进程链
+        self.process = ctx.Process(target=worker_main, args=(config, self.queue, self._cancel))
+
+    def start(self) -> "PipelineWorker":
+        self.process.start()
+        return self
+
+    def poll(self) -> list:
+        import queue as queue_mod
+
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue_mod.Empty:
+                return events
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def terminate(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .bad import (
+    _piecewise_age_draws,
+    _piecewise_depth_draws,
+    _tie_age_draws,
+    summarize_query_ages,
+    summarize_query_depths,
+)
+
+
+class AgeModel:
+    """
+    从已保存的 BAD 后验（bad_posterior.nc）回答查询，不重新拟合：
+      ages(depths)  给定深度的年龄（summary 或 draws × depths 的原始 draws）
+      depths(ages)  给定年龄的深度：每个 draw 的 age(depth) 单调，逐 draw 反解
+    后验只读一次并常驻内存；最近的 cache_size 个查询结果按 LRU 缓存。
+    LRU 的读写由锁保护，可供 serve_http 的多线程服务共用；计算本身在锁外进行。
+    """
+
+    def __init__(self, d_tie: np.ndarray, age0: np.ndarray, rates: np.ndarray, *, cache_size: int = 128):
+        self.d_tie = np.ascontiguousarray(d_tie, dtype=float)
+        self.age0 = np.ascontiguousarray(age0, dtype=float)
+        self.rates = np.ascontiguousarray(rates, dtype=float)
+        self.age_tie = _tie_age_draws(self.d_tie, self.age0, self.rates)
+        self.cache_size = int(cache_size)
+        self._cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, posterior_path: str, *, thin: int = 1, cache_size: int = 128) -> "AgeModel":
+        from .store import open_group
+
+        with open_group(posterior_path, "posterior") as ds:
+            sl = slice(None, None, max(1, int(thin)))
+            d_tie = ds["d_true"].isel(draw=sl).values
+            age0 = ds["age0"].isel(draw=sl).values
+            rates = ds["rates"].isel(draw=sl).values
+        K = d_tie.shape[-1]
+        return cls(d_tie.reshape(-1, K), age0.reshape(-1), rates.reshape(-1, K - 1), cache_size=cache_size)
+
+    @property
+    def n_draws(self) -> int:
+        return self.d_tie.shape[0]
+
+    def _cached(self, key: Tuple, compute):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                return hit
+        out = compute()
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[key] = out
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return out
+
+    def ages(self, depths: Sequence[float], *, draws: bool = False):
+        """draws=False 返回 DataFrame（depth_m + age_* 列，与 query_age_summary.csv 相同）；True 返回 (draws, depths)。"""
+        q = np.asarray(depths, dtype=float).ravel()
+        if draws:
+            return self._cached(("age_draws", q.tobytes()),
+                                lambda: _piecewise_age_draws(self.d_tie, self.age0, self.rates, q))
+        return self._cached(("age", q.tobytes()),
+                            lambda: summarize_query_ages(self.d_tie, self.age0, self.rates, q))
+
+    def depths(self, ages: Sequence[float], *, draws: bool = False):
+        """draws=False 返回 DataFrame（age_ma + depth_* 列）；True 返回 (draws, ages)。"""
+        a = np.asarray(ages, dtype=float).ravel()
+        if draws:
+            return self._cached(("depth_draws", a.tobytes()),
+                                lambda: _piecewise_depth_draws(self.d_tie, self.age_tie, self.rates, a))
+        return self._cached(("depth", a.tobytes()),
+                            lambda: summarize_query_depths(self.d_tie, self.age0, self.rates, a))
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        JSON 请求 → JSON 响应（serve 模式用）：
+          {"depths": [...]} 或 {"ages": [...]}，可选 "draws": true 返回原始 draws
+        """
+        want_draws = bool(request.get("draws", False))
+        if "depths" in request:
+            values, fn, key = request["depths"], self.ages, "depth_m"
+        elif "ages" in request:
+            values, fn, key = request["ages"], self.depths, "age_ma"
+        else:
+            raise ValueError("请求必须包含 'depths' 或 'ages'")
+        out = fn(values, draws=want_draws)
+        if want_draws:
+            return {key: list(map(float, np.ravel(values))), "draws": out.T.tolist()}
+        return {"rows": out.to_dict(orient="records")}
+
+
+def serve_stdin(model: AgeModel, stdin=None, stdout=None) -> None:
+    """每行一个 JSON 请求，每行输出一个 JSON 响应；出错时返回 {"error": ...}。"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            resp = model.answer(json.loads(line))
+        except Exception as e:  # 单个请求出错不终止服务
+            resp = {"error": str(e)}
+        stdout.write(json.dumps(resp) + "\n")
+        stdout.flush()
+
+
+def make_http_server(model: AgeModel, host: str = "127.0.0.1", port: int = 8765):
+    """
+    本机 HTTP 服务（尚未开始 serve_forever）：POST / 发送与 serve_stdin 相同的 JSON 请求；
+    也可 GET /age?depth=10,20 或 /depth?age=251.2,251.5。请求无法解析时返回 400。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self, request: Dict[str, Any]) -> None:
+            try:
+                self._reply(200, model.answer(request))
+            except Exception as e:
+                self._reply(400, {"error": str(e)})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            qs = parse_qs(url.query)
+            draws = qs.get("draws", ["0"])[0] in ("1", "true")
+            if url.path == "/age" and "depth" in qs:
+                key, values = "depths", qs["depth"][0]
+            elif url.path == "/depth" and "age" in qs:
+                key, values = "ages", qs["age"][0]
+            else:
+                self._reply(404, {"error": "use /age?depth=... or /depth?age=..."})
+                return
+            try:
+                parsed = [float(x) for x in values.split(",")]
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._handle({key: parsed, "draws": draws})
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(n) or b"{}")
+            except json.JSONDecodeError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._handle(request)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve_http(model: AgeModel, host: str = "127.0.0.1", port: int = 8765) -> None:
+    """在前台运行 make_http_server 的服务，直到 Ctrl+C。"""
+    server = make_http_server(model, host, port)
+    print(f"Serving age model on http://{host}:{server.server_address[1]} (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _read_values(values: Optional[Sequence[float]], csv: Optional[str], column: str) -> Optional[np.ndarray]:
+    if values:
+        return np.asarray(values, dtype=float)
+    if csv:
+        df = pd.read_csv(csv)
+        if column not in df.columns:
+            raise ValueError(f"{csv} 必须包含列：{column}")
+        return df[column].to_numpy(float)
+    return None
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    ap = argparse.ArgumentParser("bea_bad query")
+    ap.add_argument("--posterior", default="out/bad_posterior.nc", help="bad_posterior.nc from a previous run")
+    ap.add_argument("--depths", type=float, nargs="+", default=None, help="depths (m) to get ages for")
+    ap.add_argument("--depth_csv", default=None, help="CSV with a depth_m column")
+    ap.add_argument("--ages", type=float, nargs="+", default=None, help="ages (Ma) to get depths for")
+    ap.add_argument("--age_csv", default=None, help="CSV with an age_ma column")
+    ap.add_argument("--draws", action="store_true", help="write raw draws (one column per query) instead of summaries")
+    ap.add_argument("--thin", type=int, default=1, help="use every N-th posterior draw")
+    ap.add_argument("--out", default=None, help="output CSV (default: print to stdout)")
+    ap.add_argument("--serve", choices=["stdin", "http"], default=None,
+                    help="keep the posterior loaded and answer JSON requests on stdin or on a localhost HTTP port")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args(argv)
+
+    model = AgeModel.load(args.posterior, thin=args.thin)
+
+    if args.serve == "stdin":
+        serve_stdin(model)
+        return
+    if args.serve == "http":
+        serve_http(model, port=args.port)
+        return
+
+    depths = _read_values(args.depths, args.depth_csv, "depth_m")
+    ages = _read_values(args.ages, args.age_csv, "age_ma")
+    if (depths is None) == (ages is None):
+        ap.error("give exactly one of --depths/--depth_csv or --ages/--age_csv (or use --serve)")
+
+    if depths is not None:
+        out = model.ages(depths, draws=args.draws)
+        cols = [f"age_ma@{d:g}" for d in depths]
+    else:
+        out = model.depths(ages, draws=args.draws)
+        cols = [f"depth_m@{a:g}" for a in ages]
+    if args.draws:
+        out = pd.DataFrame(out, columns=cols)
+
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print("Query result:", args.out)
+    else:
+        print(out.to_csv(index=False), end="")
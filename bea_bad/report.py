@@ -0,0 +1,187 @@
+from __future__ import annotations
+import contextlib
+import datetime
+import importlib
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 阶段钩子：hook(stage_name) 返回一个上下文管理器，包住该阶段（用于接入外部 profiler）
+StageHook = Callable[[str], ContextManager]
+
+# 超过这些阈值的 ash 会在报告中标记出来（需要更长的 tune / 更高的 target_accept）；
+# CLI 传入 --rhat_max / --ess_target（默认值相同）
+RHAT_MAX = 1.01
+ESS_MIN = 400.0
+
+
+def cpu_time() -> float:
+    """本进程 + 已回收子进程（多进程链、进程池 worker）的 user+sys CPU 秒数。"""
+    if resource is None:
+        return time.process_time()
+    s = resource.getrusage(resource.RUSAGE_SELF)
+    c = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return s.ru_utime + s.ru_stime + c.ru_utime + c.ru_stime
+
+
+def peak_rss_mb() -> Optional[float]:
+    """本进程与已回收子进程中最大的峰值常驻内存（MB）；没有 resource 模块（Windows）时返回 None。"""
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # macOS 以字节计，Linux 以 KB 计
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class StageTimer:
+    """按阶段累计墙钟时间与 CPU 时间（同名阶段多次进入时累加）；hook 见 StageHook。"""
+
+    def __init__(self, hook: Optional[StageHook] = None):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.hook = hook
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        outer = self.hook(name) if self.hook is not None else contextlib.nullcontext()
+        with outer:
+            w0, c0 = time.perf_counter(), cpu_time()
+            try:
+                yield
+            finally:
+                rec = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+                rec["wall_s"] += time.perf_counter() - w0
+                rec["cpu_s"] += cpu_time() - c0
+                rec["calls"] += 1
+
+
+def _flags(stats: Dict[str, Any], rhat_max: float = RHAT_MAX, ess_min: float = ESS_MIN) -> List[str]:
+    out = []
+    if stats.get("divergences", 0) > 0:
+        out.append("divergences")
+    if stats.get("rhat_max", 0.0) > rhat_max:
+        out.append("rhat")
+    if stats.get("ess_bulk_min", math.inf) < ess_min or stats.get("ess_tail_min", math.inf) < ess_min:
+        out.append("low_ess")
+    return out
+
+
+def _clean(obj: Any) -> Any:
+    """NaN/inf → None，numpy 标量 → Python 标量，保证输出是严格 JSON。"""
+    if isinstance(obj, dict):
+        return {str(k): _clean(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean(v) for v in obj]
+    if hasattr(obj, "item") and not isinstance(obj, (str, bytes)):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+class RunReport(StageTimer):
+    """
+    一次 CLI 运行的报告：各阶段墙钟/CPU 时间、逐 ash 的耗时与采样诊断、BAD 的耗时与诊断、峰值内存，
+    以及从运行开始到第一个 posterior draw 的时间（time_to_first_draw_s：导入、读入、编译与初始化的总开销）。
+    write() 输出 run_report.json。逐 ash 的时间来自 BEAResult.timings（在 worker 进程内测得），
+    缓存命中的 ash 记为 cached。rhat_max / ess_min 是标记 flags 的阈值。
+    """
+
+    def __init__(self, hook: Optional[StageHook] = None, *, rhat_max: float = RHAT_MAX,
+                 ess_min: float = ESS_MIN, **meta: Any):
+        super().__init__(hook)
+        self.meta = meta
+        self.thresholds = {"rhat_max": float(rhat_max), "ess_min": float(ess_min)}
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self.bea: List[Dict[str, Any]] = []
+        self.bad: Optional[Dict[str, Any]] = None
+        self._w0, self._c0 = time.perf_counter(), cpu_time()
+        self._t0 = time.time()
+        self._first_draw_at: Optional[float] = None
+
+    def _saw_draw(self, stats) -> None:
+        at = getattr(stats, "first_draw_at", None)
+        if at is not None and (self._first_draw_at is None or at < self._first_draw_at):
+            self._first_draw_at = at
+
+    @property
+    def time_to_first_draw_s(self) -> Optional[float]:
+        return None if self._first_draw_at is None else self._first_draw_at - self._t0
+
+    def add_bea(self, results) -> None:
+        for r in results:
+            rec: Dict[str, Any] = {"ash_id": r.ash_id, "n_used": r.n_used, "cached": not r.timings}
+            rec.update(r.timings)
+            if r.stats is not None:
+                rec.update(r.stats.row())
+                rec["flags"] = _flags(rec, **self.thresholds)
+                self._saw_draw(r.stats)
+            self.bea.append(rec)
+
+    def set_bad(self, bad_out) -> None:
+        rec: Dict[str, Any] = {"cached": not bad_out.timings}
+        rec.update(bad_out.timings)
+        if bad_out.stats is not None:
+            rec.update(bad_out.stats.row())
+            rec["flags"] = _flags(rec, **self.thresholds)
+            self._saw_draw(bad_out.stats)
+        self.bad = rec
+
+    def to_dict(self) -> Dict[str, Any]:
+        return _clean({
+            "started": self.started,
+            "meta": self.meta,
+            "total": {
+                "wall_s": time.perf_counter() - self._w0,
+                "cpu_s": cpu_time() - self._c0,
+                "peak_rss_mb": peak_rss_mb(),
+                "time_to_first_draw_s": self.time_to_first_draw_s,
+            },
+            "stages": self.stages,
+            "thresholds": self.thresholds,
+            "bea": self.bea,
+            "bad": self.bad,
+        })
+
+    def write(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+def load_hook(spec: str) -> StageHook:
+    """按 "package.module:callable" 导入阶段钩子（CLI 的 --profile_hook）。"""
+    mod_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"profile hook 格式应为 'module:callable'，得到 {spec!r}")
+    return getattr(importlib.import_module(mod_name), attr)
+
+
+def cprofile_hook(outdir: str) -> StageHook:
+    """
+    内置钩子：每个阶段用 cProfile 记录，写到 <outdir>/profile_<stage>.prof（可用 snakeviz 等查看）。
+    只覆盖主进程；进程池 worker 与多进程链中的时间不在 profile 里。
+    """
+    import cProfile
+
+    @contextlib.contextmanager
+    def hook(stage: str) -> Iterator[None]:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(os.path.join(outdir, f"profile_{stage}.prof"))
+
+    return hook
@@ -0,0 +1,516 @@
+from __future__ import annotations
+import importlib.util
+import json
+import os
+import time
+import warnings
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLERS = ("pymc", "nutpie", "numpyro", "blackjax")
+
+# 各后端需要的模块（numpyro / blackjax 通过 PyMC 的 JAX 桥接）
+_REQUIRES = {
+    "pymc": (),
+    "nutpie": ("nutpie",),
+    "numpyro": ("numpyro", "jax"),
+    "blackjax": ("blackjax", "jax"),
+}
+
+
+@dataclass
+class SampleStats:
+    sampler: str
+    wall_time_s: float
+    draws: int
+    tune: int
+    chains: int
+    divergences: int
+    ess_bulk_min: float
+    ess_tail_min: float
+    rhat_max: float
+    ess_bulk_per_s: float          # 按纯采样时间计算
+    compile_time_s: float = 0.0    # 编译 logp/dlogp + NUTS 初始化（外部后端无法单独计时，记为 0）
+    increments: int = 1            # 自适应采样的轮数（见 AdaptiveSettings）
+    # pymc 后端结束时的调参状态（供下次热启动，见 TuningState）；不写入 sampler_stats.csv / run_report.json
+    tuning: Optional["TuningState"] = field(default=None, repr=False, compare=False)
+    # 第一个 draw 返回的时刻（time.time()，跨进程可比），供 run_report 计算 time to first draw；外部后端为 None
+    first_draw_at: Optional[float] = field(default=None, repr=False, compare=False)
+
+    def row(self) -> Dict[str, Any]:
+        """sampler_stats.csv / run_report.json 中的字段（不含 tuning / first_draw_at）。"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name not in ("tuning", "first_draw_at")}
+
+
+@dataclass
+class AdaptiveSettings:
+    """
+    收敛驱动的采样：先以 draws/tune 采一轮，之后按需追加，直到 bulk/tail ESS ≥ ess_target
+    且 R-hat ≤ rhat_max，或每条链保留的 draws 达到 max_draws。
+    R-hat 超过 restart_rhat（链明显没有混合好）时把已有 draws 当作额外的调参丢弃，
+    下一轮调参加倍（累计不超过 max_tune）。max_rounds 是轮数的硬上限（正常情况下 max_draws /
+    max_tune 先让循环结束）。
+    """
+    ess_target: float = 400.0
+    rhat_max: float = 1.01
+    restart_rhat: float = 1.05
+    draws: int = 500         # 第一轮的 draws，也是之后每轮追加的最少 draws（每条链）
+    tune: int = 500          # 第一轮的调参
+    warm_tune: int = 200     # 续跑时重新适应步长的调参
+    max_draws: int = 10000
+    max_tune: int = 5000
+    max_rounds: int = 64
+
+
+@dataclass
+class TuningState:
+    """
+    一次 pymc NUTS 采样结束时调好的状态（无约束空间），供之后同一 / 相近模型的运行热启动：
+      step_size  各链调好的步长的中位数
+      mean, var  各 value 变量（如 tau_log__）的后验均值与方差：分别作为初值与对角 mass matrix 的初值
+      n_draws    估计 mean / var 所用的 draws 数
+    """
+    step_size: float
+    mean: Dict[str, List[float]]
+    var: Dict[str, List[float]]
+    n_draws: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TuningState":
+        return cls(**d)
+
+
+def save_tuning_states(path: str, states: Dict[str, TuningState]) -> str:
+    """写 warm_start.json：{拟合名: TuningState}，拟合名如 "bea/<ash_id>"、"bad"。"""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({k: v.to_dict() for k, v in states.items()}, f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_tuning_states(path: str) -> Dict[str, TuningState]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {k: TuningState.from_dict(v) for k, v in json.load(f).items()}
+
+
+def sampler_available(name: str) -> bool:
+    if name not in _REQUIRES:
+        return False
+    return all(importlib.util.find_spec(m) is not None for m in _REQUIRES[name])
+
+
+def resolve_sampler(name: str) -> str:
+    """
+    返回实际可用的后端名：未安装时发出警告并退回 PyMC 自带的 NUTS。
+    JAX 后端固定在 CPU 上运行，并在 jax 尚未导入时按 CPU 核数开放 host 设备，供多链并行。
+    """
+    if name not in SAMPLERS:
+        raise ValueError(f"sampler 必须是 {SAMPLERS} 之一，得到 {name!r}")
+    if not sampler_available(name):
+        warnings.warn(
+            f"sampler '{name}' is not installed (needs {', '.join(_REQUIRES[name])}); falling back to 'pymc'",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+        return "pymc"
+    if name in ("numpyro", "blackjax"):
+        os.environ.setdefault("JAX_PLATFORMS", "cpu")
+        if "XLA_FLAGS" not in os.environ:
+            os.environ["XLA_FLAGS"] = f"--xla_force_host_platform_device_count={os.cpu_count() or 1}"
+    return name
+
+
+def sampling_stats(idata, sampler: str, wall_time_s: float, var_names: Optional[List[str]] = None,
+                   *, draws: int, tune: int, chains: int, compile_time_s: float = 0.0) -> SampleStats:
+    """从 InferenceData 汇总发散数、最小 bulk/tail ESS、最大 R-hat 与每秒 ESS。"""
+    import arviz as az
+
+    post = idata.posterior
+    if var_names is not None:
+        post = post[[v for v in var_names if v in post]]
+
+    def _extreme(ds, fn):
+        vals = [np.asarray(ds[v]).ravel() for v in ds.data_vars]
+        vals = np.concatenate(vals) if vals else np.array([np.nan])
+        vals = vals[np.isfinite(vals)]
+        return float(fn(vals)) if vals.size else float("nan")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        ess_bulk = _extreme(az.ess(post, method="bulk"), np.min)
+        ess_tail = _extreme(az.ess(post, method="tail"), np.min)
+        rhat = _extreme(az.rhat(post), np.max) if chains > 1 else float("nan")
+
+    divergences = 0
+    if hasattr(idata, "sample_stats") and "diverging" in idata.sample_stats:
+        divergences = int(np.asarray(idata.sample_stats["diverging"]).sum())
+
+    return SampleStats(
+        sampler=sampler,
+        wall_time_s=float(wall_time_s),
+        draws=int(draws),
+        tune=int(tune),
+        chains=int(chains),
+        divergences=divergences,
+        ess_bulk_min=ess_bulk,
+        ess_tail_min=ess_tail,
+        rhat_max=rhat,
+        ess_bulk_per_s=ess_bulk / wall_time_s if wall_time_s > 0 else float("nan"),
+        compile_time_s=float(compile_time_s),
+    )
+
+
+def _init_pymc_nuts(model, *, chains: int, seed: int, initvals, tune: int, target_accept: float):
+    """显式调用 pm.init_nuts（jitter+adapt_diag，与 pm.sample 默认相同），返回 (初值, step, 耗时)。"""
+    import pymc as pm
+
+    # 与 pm.sample 内部相同的逐链种子派生
+    seeds = [int(r.integers(2**30)) for r in np.random.default_rng(seed).spawn(chains)]
+    t0 = time.perf_counter()
+    initial_points, step = pm.init_nuts(
+        init="jitter+adapt_diag", chains=chains, model=model, random_seed=seeds,
+        initvals=initvals, tune=tune, target_accept=target_accept, progressbar=False
+    )
+    return initial_points, step, time.perf_counter() - t0
+
+
+def _sample(model, sampler: str, *, draws, tune, chains, cores, target_accept, seed, progressbar,
+            step=None, initvals=None, idata_kwargs=None):
+    """返回 (idata, 墙钟秒数, 第一个 draw 的时刻或 None)。"""
+    import pymc as pm
+
+    kwargs: Dict[str, Any] = dict(
+        draws=draws, tune=tune, chains=chains, cores=cores,
+        random_seed=seed, progressbar=progressbar, model=model,
+    )
+    if idata_kwargs:
+        kwargs.update(idata_kwargs=idata_kwargs)
+    if sampler == "pymc":
+        kwargs.update(step=step)
+        if initvals is not None:
+            kwargs.update(initvals=initvals)
+    else:
+        kwargs.update(nuts_sampler=sampler, nuts={"target_accept": target_accept})
+        if sampler in ("numpyro", "blackjax"):
+            kwargs.update(nuts_sampler_kwargs={"chain_method": "parallel" if (cores or 1) > 1 else "sequential"})
+
+    first: List[float] = []
+    if sampler == "pymc":
+        from .progress import sampling_callback
+
+        progress_cb = sampling_callback(chains=chains, total=tune + draws)
+
+        def callback(trace, draw):
+            if not first:
+                first.append(time.time())
+            if progress_cb is not None:
+                progress_cb(trace, draw)
+
+        kwargs.update(callback=callback)
+
+    t0 = time.perf_counter()
+    idata = pm.sample(**kwargs)
+    return idata, time.perf_counter() - t0, (first[0] if first else None)
+
+
+def run_sampler(
+    model,
+    *,
+    sampler: str = "pymc",
+    draws: int = 2000,
+    tune: int = 2000,
+    chains: int = 2,
+    cores: Optional[int] = None,
+    target_accept: float = 0.9,
+    seed: int = 42,
+    progressbar: bool = True,
+    step=None,
+    initvals=None,
+    var_names: Optional[List[str]] = None,
+    adaptive: Optional[AdaptiveSettings] = None,
+    warm_start: Optional[TuningState] = None,
+    warm_tune: int = 200,
+) -> Tuple[Any, SampleStats]:
+    """
+    pm.sample 的统一入口：选择 NUTS 后端（pymc / nutpie / numpyro / blackjax，缺失时退回 pymc），
+    计时并返回 (idata, SampleStats)。step（已编译的 NUTS，见 bea_model）只适用于 pymc 后端；
+    指定了其它后端时忽略 step，由后端自己编译模型。
+    pymc 后端未给 step 时先显式调用 pm.init_nuts（jitter+adapt_diag，与 pm.sample 默认相同），
+    这样编译/初始化时间记在 compile_time_s，wall_time_s 只含采样。
+    adaptive 不为 None 时忽略 draws/tune，按 AdaptiveSettings 分轮采样（见 _run_adaptive）。
+    pymc 后端的调参结果记在 stats.tuning；warm_start（上次运行的 TuningState）覆盖本模型全部变量时
+    从它的步长、mass matrix 与后验均值出发，只调参 warm_tune 步（外部后端忽略 warm_start）。
+    """
+    sampler = resolve_sampler(sampler)
+    if var_names is None:
+        var_names = [rv.name for rv in model.free_RVs]
+    common = dict(chains=chains, cores=cores, target_accept=target_accept, progressbar=progressbar)
+
+    if adaptive is not None:
+        return _run_adaptive(
+            model, sampler, adaptive, seed=seed, step=step, initvals=initvals, var_names=var_names,
+            warm_start=warm_start, **common
+        )
+
+    if sampler != "pymc":
+        idata, wall, _ = _sample(model, sampler, draws=draws, tune=tune, seed=seed, **common)
+        return idata, sampling_stats(idata, sampler, wall, var_names, draws=draws, tune=tune, chains=chains)
+
+    compile_s = 0.0
+    if step is None:
+        initvals, step, compile_s = _init_pymc_nuts(
+            model, chains=chains, seed=seed, initvals=initvals, tune=tune, target_accept=target_accept
+        )
+    saved = _tuning_state(step)
+    try:
+        if warm_start is not None:
+            initvals, matched = _apply_warm_start(model, step, warm_start, initvals, chains)
+            if _fully_matched(step, matched):
+                tune = warm_tune
+        idata, wall, first_at = _sample(
+            model, sampler, draws=draws, tune=tune, seed=seed, step=step, initvals=initvals,
+            idata_kwargs={"include_transformed": True}, **common
+        )
+    finally:
+        _set_tuning_state(step, saved)
+    stats = sampling_stats(
+        idata, sampler, wall, var_names,
+        draws=draws, tune=tune, chains=chains, compile_time_s=compile_s
+    )
+    stats.tuning = tuning_state(step, idata)
+    stats.first_draw_at = first_at
+    _drop_transformed(idata, step, var_names)
+    return idata, stats
+
+
+def _converged(st: SampleStats, adaptive: AdaptiveSettings) -> bool:
+    ess_ok = st.ess_bulk_min >= adaptive.ess_target and st.ess_tail_min >= adaptive.ess_target
+    return ess_ok and (st.chains < 2 or st.rhat_max <= adaptive.rhat_max)
+
+
+def _round_seed(seed: int, i: int) -> int:
+    return seed if i == 0 else int(np.random.default_rng([seed, i]).integers(2**31))
+
+
+def _concat_draws(parts: list):
+    """按 draw 维拼接各轮的 posterior / sample_stats（每轮都从上一轮的末状态续跑）。"""
+    import arviz as az
+    import xarray as xr
+
+    if len(parts) == 1:
+        return parts[0]
+    groups = {g: parts[-1][g] for g in parts[-1].groups()}
+    for g in ("posterior", "sample_stats"):
+        ds = xr.concat([p[g] for p in parts], dim="draw")
+        groups[g] = ds.assign_coords(draw=np.arange(ds.sizes["draw"]))
+    return az.InferenceData(**groups)
+
+
+# 调参初始值是 PyMC 的私有属性（environment.yml 固定的 pymc 5.25 中存在）；
+# 不存在时（其它 PyMC 版本 / 其它 potential）不预热 step，按冷启动完整调参
+_POTENTIAL_ATTRS = ("_initial_mean", "_initial_diag", "_initial_weight")
+
+
+def _has_tuning_state(step) -> bool:
+    pot, adapt = getattr(step, "potential", None), getattr(step, "step_adapt", None)
+    return all(hasattr(pot, a) for a in _POTENTIAL_ATTRS) and hasattr(adapt, "_initial_step")
+
+
+def _tuning_state(step):
+    """(mass matrix 均值, 对角, 权重, 初始步长)；step 不支持时为 None。"""
+    if not _has_tuning_state(step):
+        return None
+    pot, adapt = step.potential, step.step_adapt
+    return pot._initial_mean, pot._initial_diag, pot._initial_weight, adapt._initial_step
+
+
+def _set_tuning_state(step, state) -> bool:
+    """
+    pm.sample 对每条链调用 step.reset_tuning()，会从这些初始值重新开始适应。
+    返回是否已写入（state 为 None 或 step 不支持时不改动 step）。
+    """
+    if state is None or not _has_tuning_state(step):
+        return False
+    pot, adapt = step.potential, step.step_adapt
+    pot._initial_mean, pot._initial_diag, pot._initial_weight, adapt._initial_step = state
+    return True
+
+
+def reset_initial_mean(model, step, initvals) -> None:
+    """
+    重用的 step（见 bea_model）构建时的 mass matrix 均值来自占位数据；换数据后按 init_nuts
+    的 jitter+adapt_diag 做法，改为各链初值（无约束空间）的平均。对角初值、权重与步长不变。
+    """
+    from pymc.blocking import DictToArrayBijection
+    from pymc.initial_point import make_initial_point_fn
+
+    if initvals is None or isinstance(initvals, dict):
+        initvals = [initvals or {}]
+    points = []
+    for iv in initvals:
+        ip = make_initial_point_fn(model=model, overrides=iv, jitter_rvs=set(), return_transformed=True)(0)
+        points.append(DictToArrayBijection.map({v.name: ip[v.name] for v in step.vars}).data)
+    state = _tuning_state(step)
+    if state is not None:
+        _set_tuning_state(step, (np.mean(points, axis=0),) + tuple(state[1:]))
+
+
+def tuning_state(step, idata) -> TuningState:
+    """由无约束空间的 draws（include_transformed）得到各变量的后验均值 / 方差，步长取各链调好的步长中位数。"""
+    post = idata.posterior
+    n = post.sizes["chain"] * post.sizes["draw"]
+    mean, var = {}, {}
+    for v in step.vars:
+        x = post[v.name].values.reshape(n, -1)
+        mean[v.name] = x.mean(axis=0).tolist()
+        var[v.name] = np.clip(x.var(axis=0), 1e-10, None).tolist()
+    h = float(np.median(idata.sample_stats["step_size_bar"].values[:, -1]))
+    return TuningState(step_size=h, mean=mean, var=var, n_draws=int(n))
+
+
+def _warm_state(step, idata) -> tuple:
+    """由上一轮的无约束空间 draws 得到 mass matrix（对角方差）初值，步长取各链调好的步长中位数。"""
+    ws = tuning_state(step, idata)
+    names = [v.name for v in step.vars]
+    return (
+        np.concatenate([ws.mean[n] for n in names]), np.concatenate([ws.var[n] for n in names]),
+        min(ws.n_draws, 100), ws.step_size,
+    )
+
+
+def _fully_matched(step, matched) -> bool:
+    """warm_start 覆盖了 step 的全部变量时才能缩短调参；部分匹配时其余变量仍需完整调参。"""
+    return bool(matched) and set(matched) == {v.name for v in step.vars}
+
+
+def _apply_warm_start(model, step, ws: TuningState, initvals, chains: int):
+    """
+    ws 中与 step.vars 同名且大小相同的变量：写入 mass matrix 的均值 / 对角初值，并以后验均值作为各链初值；
+    结构变了的变量（如颗粒数变化后的 delta）保持冷启动的设置。有匹配时步长取 ws 的步长。
+    返回 (各链初值, 匹配上的变量名)；调用方负责事后恢复 step 的调参状态。
+    step 不支持写入调参状态时不做任何改动（冷启动）。
+    """
+    state = _tuning_state(step)
+    if state is None:
+        return initvals, []
+    ip = model.initial_point()
+    mean0, diag0, _, _ = state
+    mean, diag = np.array(mean0, dtype=float), np.array(diag0, dtype=float)
+    matched: Dict[str, np.ndarray] = {}
+    drop = set()
+    start = 0
+    for v in step.vars:
+        size = int(np.size(ip[v.name]))
+        if len(ws.mean.get(v.name, ())) == size:
+            mean[start:start + size] = ws.mean[v.name]
+            diag[start:start + size] = ws.var[v.name]
+            matched[v.name] = np.reshape(np.asarray(ws.mean[v.name], dtype=float), np.shape(ip[v.name]))
+            drop.add(model.values_to_rvs[v].name)
+        start += size
+    if not matched:
+        return initvals, []
+    _set_tuning_state(step, (mean, diag, min(ws.n_draws, 100), ws.step_size))
+
+    if initvals is None:
+        initvals = [{} for _ in range(chains)]
+    elif isinstance(initvals, dict):
+        initvals = [initvals] * chains
+    out = []
+    for iv in initvals:
+        iv = {k: x for k, x in iv.items() if k not in drop and k not in matched}
+        iv.update(matched)
+        out.append(iv)
+    return out, list(matched)
+
+
+def _drop_transformed(idata, step, var_names) -> None:
+    """去掉 include_transformed 带来的无约束空间变量（及只被它们使用的维度）。"""
+    transformed = [v.name for v in step.vars if v.name not in var_names]
+    post = idata.posterior.drop_vars([v for v in transformed if v in idata.posterior])
+    used = {d for v in post.data_vars for d in post[v].dims}
+    idata.posterior = post.drop_dims([d for d in post.dims if d not in used])
+
+
+def _last_points(step, idata) -> List[Dict[str, np.ndarray]]:
+    post = idata.posterior
+    return [{v.name: post[v.name].values[c, -1] for v in step.vars} for c in range(post.sizes["chain"])]
+
+
+def _run_adaptive(model, sampler, adaptive: AdaptiveSettings, *, chains, cores, target_accept, seed,
+                  progressbar, step, initvals, var_names, warm_start=None) -> Tuple[Any, SampleStats]:
+    """
+    pymc 后端：每轮从上一轮各链的末状态续跑，用上一轮的后验方差与步长预热 step，
+    只需 warm_tune 次调参；追加的 draws 按当前 ESS 外推到 ess_target 所需的量。
+    外部后端无法续跑链，每轮从头以加倍的 draws/tune 重新采样。
+    warm_start 覆盖模型全部变量时第一轮也从它出发，只调参 warm_tune 步。
+    """
+    common = dict(chains=chains, cores=cores, target_accept=target_accept, progressbar=progressbar)
+    draws, tune = adaptive.draws, adaptive.tune
+
+    if sampler != "pymc":
+        wall = 0.0
+        for i in range(adaptive.max_rounds):
+            idata, w, _ = _sample(model, sampler, draws=draws, tune=tune, seed=_round_seed(seed, i), **common)
+            wall += w
+            st = sampling_stats(idata, sampler, wall, var_names, draws=draws, tune=tune, chains=chains)
+            if _converged(st, adaptive) or draws >= adaptive.max_draws:
+                break
+            draws, tune = min(2 * draws, adaptive.max_draws), min(2 * tune, adaptive.max_tune)
+        st.increments = i + 1
+        return idata, st
+
+    compile_s = 0.0
+    if step is None:
+        initvals, step, compile_s = _init_pymc_nuts(
+            model, chains=chains, seed=seed, initvals=initvals, tune=tune, target_accept=target_accept
+        )
+    saved = _tuning_state(step)
+    parts, wall, total_tune, kept, first_at = [], 0.0, 0, 0, None
+    try:
+        if warm_start is not None:
+            initvals, matched = _apply_warm_start(model, step, warm_start, initvals, chains)
+            if _fully_matched(step, matched):
+                tune = adaptive.warm_tune
+        for i in range(adaptive.max_rounds):
+            part, w, at = _sample(
+                model, sampler, draws=draws, tune=tune, seed=_round_seed(seed, i),
+                step=step, initvals=initvals, idata_kwargs={"include_transformed": True}, **common
+            )
+            first_at = first_at or at
+            parts.append(part)
+            wall += w
+            total_tune += tune
+            kept += draws
+            idata = _concat_draws(parts)
+            st = sampling_stats(idata, sampler, wall, var_names, draws=kept, tune=total_tune, chains=chains)
+            if _converged(st, adaptive) or kept >= adaptive.max_draws:
+                break
+
+            if chains > 1 and st.rhat_max > adaptive.restart_rhat and total_tune < adaptive.max_tune:
+                # 链之间仍不一致：已有 draws 作为额外的调参丢弃，加长下一轮调参
+                tune = min(2 * tune, adaptive.max_tune - total_tune)
+                parts, kept = [], 0
+                draws = adaptive.draws
+            else:
+                ess = max(min(st.ess_bulk_min, st.ess_tail_min), 1.0)
+                need = int(np.ceil(kept * adaptive.ess_target / ess)) - kept
+                draws = int(np.clip(need, adaptive.draws, adaptive.max_draws - kept))
+                tune = adaptive.warm_tune
+            if not _set_tuning_state(step, _warm_state(step, part)):
+                # 无法预热 step：按冷启动重新完整调参
+                tune = max(tune, adaptive.tune)
+            initvals = _last_points(step, part)
+    finally:
+        _set_tuning_state(step, saved)
+
+    st.tuning = tuning_state(step, idata)
+    st.first_draw_at = first_at
+    _drop_transformed(idata, step, var_names)
+    st.compile_time_s = compile_s
+    st.increments = i + 1
+    return idata, st
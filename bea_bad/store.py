@@ -0,0 +1,116 @@
+from __future__ import annotations
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+ENGINE = "h5netcdf"   # ArviZ 的依赖，已随 PyMC 安装
+
+
+@dataclass
+class StoreSettings:
+    """后验 draws 的存储方式：HDF5/NetCDF4，按 (1 条链, chunk_draws 个 draw) 分块并 zlib 压缩。"""
+    float32: bool = False     # 浮点变量存为 float32（年龄约 250 Ma 时精度约 1e-5 Ma）
+    thin: int = 1             # 每 thin 个 draw 保留一个
+    complevel: int = 4
+    chunk_draws: int = 1000
+
+
+def encode_dataset(ds, settings: StoreSettings):
+    """按 settings 抽稀 / 降精度，并给每个变量生成分块压缩的 encoding。返回 (ds, encoding)。"""
+    if settings.thin > 1 and "draw" in ds.dims:
+        ds = ds.isel(draw=slice(None, None, int(settings.thin)))
+    if settings.float32:
+        ds = ds.map(lambda v: v.astype(np.float32) if v.dtype == np.float64 else v)
+
+    encoding = {}
+    for name, var in ds.data_vars.items():
+        enc = {"zlib": True, "complevel": int(settings.complevel), "shuffle": True}
+        if var.ndim:
+            enc["chunksizes"] = tuple(
+                1 if d == "chain" else min(n, int(settings.chunk_draws)) if d == "draw" else n
+                for d, n in zip(var.dims, var.shape)
+            )
+        encoding[name] = enc
+    return ds, encoding
+
+
+def write_dataset(ds, path: str, group: str, settings: Optional[StoreSettings] = None, *, mode: str = "a") -> None:
+    ds, encoding = encode_dataset(ds, settings or StoreSettings())
+    if mode == "a" and not os.path.exists(path):
+        mode = "w"
+    ds.to_netcdf(path, group=group, mode=mode, engine=ENGINE, encoding=encoding)
+
+
+def write_idata(idata, path: str, settings: Optional[StoreSettings] = None) -> str:
+    """
+    InferenceData 的各个组写到 path 根下同名的组（与 idata.to_netcdf 的布局相同，az.from_netcdf 可直接读），
+    posterior / sample_stats 按 settings 抽稀、降精度并分块压缩。
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    for g in idata.groups():
+        write_dataset(idata[g], path, g, settings)
+    return path
+
+
+def bea_group(ash_id: str) -> str:
+    """ash_id → HDF5 组名（ash_id 可能含 '/'，整体做 URL 编码）。"""
+    return quote(str(ash_id), safe="") + "/posterior"
+
+
+def write_bea_draws(posteriors: Dict[str, object], path: str, settings: Optional[StoreSettings] = None) -> str:
+    """每个 ash 的 BEA 后验（E, tau, delta）写到同一个文件的一个组里。"""
+    if os.path.exists(path):
+        os.remove(path)
+    for ash_id, ds in posteriors.items():
+        write_dataset(ds.assign_attrs(ash_id=str(ash_id)), path, bea_group(ash_id), settings)
+    return path
+
+
+def list_bea_ashes(path: str) -> List[str]:
+    import h5netcdf
+
+    with h5netcdf.File(path, "r") as f:
+        return [unquote(g) for g in f.groups]
+
+
+def open_group(path: str, group: str = "posterior"):
+    """惰性打开一个组：只有被访问（并按 isel 切片）的变量/draw 范围才会从磁盘解压读入。"""
+    import xarray as xr
+
+    return xr.open_dataset(path, group=group, engine=ENGINE)
+
+
+def read_draws(
+    path: str,
+    var: str,
+    *,
+    group: str = "posterior",
+    draws: Optional[slice] = None,
+    chains: Optional[slice] = None,
+) -> np.ndarray:
+    """
+    读取一个变量的一段 draws，返回 (chain × draw, ...) 的 ndarray。
+    例：read_draws("out/bad_posterior.nc", "rates", draws=slice(0, 500))
+        read_draws("out/bea_posterior.nc", "E", group=bea_group(ash_id))
+    """
+    with open_group(path, group) as ds:
+        da = ds[var]
+        sel = {}
+        if draws is not None:
+            sel["draw"] = draws
+        if chains is not None:
+            sel["chain"] = chains
+        values = da.isel(sel).values
+    return values.reshape((-1,) + values.shape[2:])
+
+
+def load_bea_draws(path: str, ash_id: str):
+    """把一个 ash 的 BEA 后验完整读入内存（Dataset）。"""
+    import xarray as xr
+
+    return xr.load_dataset(path, group=bea_group(ash_id), engine=ENGINE)
+
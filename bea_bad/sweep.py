@@ -0,0 +1,313 @@
+from __future__ import annotations
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import compilecache
+from .utils import ensure_dir
+
+# 可扫描的超参数（与流水线选项同名）；前两个影响 BEA，其余只影响 BAD
+BEA_PARAMS = ("max_span_ma", "no_bootstrap_prior")
+BAD_PARAMS = ("depth_sigma_m", "sedrate_logn_mu", "sedrate_logn_sigma", "sedrate_corr_m", "bad_model")
+SWEEP_PARAMS = BEA_PARAMS + BAD_PARAMS
+
+# sweep 不缓存结果、不写检查点 / 预热状态 / profile，BEA 只按 ash 逐个拟合：这些选项取非默认值时报错
+UNSUPPORTED_OPTIONS = (
+    "bea_mode", "report_speedup", "bea_cross_check", "warm_start", "save_warm_start",
+    "cache_dir", "cache_max_mb", "resume", "profile", "profile_hook",
+)
+
+
+def parse_grid(specs: Sequence[str]) -> pd.DataFrame:
+    """["depth_sigma_m=0.01,0.03", "no_bootstrap_prior=false,true"] → 笛卡尔积，每行一个网格点（值为字符串）。"""
+    axes: Dict[str, List[str]] = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        name = name.strip()
+        if not sep or not values.strip():
+            raise ValueError(f"--param 的格式为 name=v1,v2,...，得到 {spec!r}")
+        if name in axes:
+            raise ValueError(f"--param {name} 重复")
+        axes[name] = [v.strip() for v in values.split(",") if v.strip()]
+    return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+
+def read_grid(path: str) -> pd.DataFrame:
+    """网格点文件（CSV 或 JSON 记录列表），每行一个网格点，列为要改变的超参数。"""
+    if path.lower().endswith(".json"):
+        return pd.read_json(path, orient="records", dtype=False).astype(str)
+    return pd.read_csv(path, dtype=str)
+
+
+def grid_points(defaults: argparse.Namespace, grid: pd.DataFrame,
+                outdir: str) -> List[Tuple[str, argparse.Namespace]]:
+    """
+    每个网格点的 (point_id, args)：命令行设置 + 该点的超参数（按 PipelineConfig 字段的类型转换）。
+    defaults 中 UNSUPPORTED_OPTIONS 取非默认值时报 ValueError。
+    """
+    from .batch import section_args
+    from .cli import PipelineConfig
+
+    base = PipelineConfig(zircon="", tiepoints="")
+    ignored = [f"--{k}" for k in UNSUPPORTED_OPTIONS if getattr(defaults, k) != getattr(base, k)]
+    if ignored:
+        raise ValueError(f"sweep 不支持 {', '.join(ignored)}（只支持逐 ash 的 BEA，不缓存、不写检查点）")
+    unknown = [c for c in grid.columns if c not in SWEEP_PARAMS]
+    if unknown:
+        raise ValueError(f"不能扫描的参数：{unknown}（可扫描：{list(SWEEP_PARAMS)}）")
+    if grid.empty:
+        raise ValueError("参数网格为空")
+    points = []
+    for i, row in enumerate(grid.to_dict(orient="records")):
+        point_id = f"p{i:03d}"
+        args = section_args(defaults, dict(row, section_id=point_id), os.path.join(outdir, "points"))
+        if args.sedrate_corr_m > 0 and args.bad_model != "scalable":
+            raise ValueError(f"网格点 {point_id}：sedrate_corr_m > 0 需要 bad_model=scalable")
+        points.append((point_id, args))
+    return points
+
+
+def _bea_kwargs(args) -> Dict[str, Any]:
+    return dict(
+        use_bootstrap_prior=(not args.no_bootstrap_prior),
+        max_span_ma=args.max_span_ma,
+    )
+
+
+def _fit_point(task) -> Dict[str, Any]:
+    """一个网格点的 BAD 拟合（进程池 worker）；同一 worker 内的网格点共用一个已编译模型。"""
+    from .bad import fit_bad
+    from .progress import fit
+
+    point_id, bad_kwargs = task
+    t0 = time.perf_counter()
+    with fit(f"BAD {point_id}"):
+        out = fit_bad(**bad_kwargs, reuse_model=True, progressbar=False)
+    out.tie_summary.to_csv(os.path.join(bad_kwargs["outdir"], "tiepoint_summary.csv"), index=False)
+    out.query_summary.to_csv(os.path.join(bad_kwargs["outdir"], "query_age_summary.csv"), index=False)
+    return dict(point_id=point_id, out=out, wall_s=time.perf_counter() - t0)
+
+
+def _run_bad_points(tasks: List[Tuple[str, Dict[str, Any]]], *, cores: Optional[int],
+                    jobs: Optional[int]) -> Dict[str, Dict[str, Any]]:
+    from .parallel import _init_worker, limit_blas_threads, plan_core_budget
+    from .progress import channel
+
+    budget = plan_core_budget(len(tasks), chains=2, cores=cores, jobs=jobs)
+    for _, kw in tasks:
+        kw["cores"] = budget.chain_cores
+
+    done: Dict[str, Dict[str, Any]] = {}
+    with limit_blas_threads(budget.blas_threads):
+        if budget.jobs == 1:
+            for t in tasks:
+                done[t[0]] = _fit_point(t)
+            return done
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=budget.jobs, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(budget.blas_threads, channel())) as ex:
+            futures = [ex.submit(_fit_point, t) for t in tasks]
+            for fut in as_completed(futures):
+                res = fut.result()
+                done[res["point_id"]] = res
+    return done
+
+
+def run_sweep(
+    points: List[Tuple[str, argparse.Namespace]],
+    *,
+    zircon: str,
+    tiepoints: str,
+    query: Optional[str],
+    outdir: str,
+    cores: Optional[int] = None,
+    jobs: Optional[int] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    对每个网格点跑 BEA + BAD，输入只读一次：
+      - BEA 按不同的 (max_span_ma, no_bootstrap_prior) 去重，只改 BAD 超参数的网格点共用同一组 BEA 结果；
+        所有 (BEA 设置 × ash) 在一个进程池里拟合，重用按形状分桶编译的模型（这些超参数是模型的 pm.Data）
+      - 各网格点的 BAD 在进程池里并行，每个 worker 只编译一次 BAD 模型（bad_model.ReusableBADModel）
+    所有网格点使用相同的种子（common random numbers），差异只来自超参数。
+    返回 (comparison, points)：
+      comparison  长表：每个网格点 × {eruption_age（BEA）, tie_age, query_age} × ash / 深度 的均值与 95% HDI
+      points      每个网格点一行：超参数、BAD 诊断、耗时、输出目录
+    """
+    from .dataio import read_inputs, read_query_depths
+    from .parallel import fit_bea_parallel
+    from .cli import _adaptive_settings, _store_settings
+
+    base = points[0][1]
+    data = read_inputs(zircon, tiepoints, sheet=base.sheet)
+    qdepths = read_query_depths(query, data.tiepoints)
+    groups = list(data.iter_ashes())
+
+    # ---- BEA：每个不同的 BEA 设置拟合一次
+    bea_keys = {pid: tuple(getattr(a, p) for p in BEA_PARAMS) for pid, a in points}
+    settings = {}
+    for pid, a in points:
+        settings.setdefault(bea_keys[pid], _bea_kwargs(a))
+    t0 = time.perf_counter()
+    tasks, group_kwargs = [], []
+    for kw in settings.values():
+        tasks.extend(groups)
+        group_kwargs.extend([kw] * len(groups))
+    results = fit_bea_parallel(
+        tasks,
+        group_kwargs=group_kwargs,
+        seed=base.seed,
+        cores=cores,
+        jobs=jobs,
+        reuse_model=(not base.no_model_reuse),
+        engine=base.bea_engine,
+        sampler=base.sampler,
+        draws=base.bea_draws,
+        tune=base.bea_tune,
+        target_accept=base.target_accept,
+        adaptive=_adaptive_settings(base),
+    )
+    bea: Dict[tuple, pd.DataFrame] = {}
+    for i, key in enumerate(settings):
+        rows = [r.row() for r in results[i * len(groups):(i + 1) * len(groups)]]
+        bea[key] = (pd.DataFrame(rows).merge(data.tiepoints, on="ash_id", how="left")
+                    .sort_values("depth_m", kind="stable").reset_index(drop=True))
+    print(f"Sweep BEA: {len(settings)} setting(s) × {len(groups)} ashes in {time.perf_counter() - t0:.1f} s")
+
+    # ---- BAD：每个网格点一次
+    t0 = time.perf_counter()
+    bad_tasks = []
+    for pid, a in points:
+        ensure_dir(a.outdir)
+        bea_df = bea[bea_keys[pid]]
+        bea_df.to_csv(os.path.join(a.outdir, "bea_eruption_age_summary.csv"), index=False)
+        bad_tasks.append((pid, dict(
+            tie_depths_m=bea_df["depth_m"].to_numpy(float),
+            tie_age_mean_ma=bea_df["e_mean"].to_numpy(float),
+            tie_age_sd_ma=bea_df["e_sd"].to_numpy(float),
+            query_depths_m=qdepths,
+            depth_sigma_m=a.depth_sigma_m,
+            sedrate_logn_mu=a.sedrate_logn_mu,
+            sedrate_logn_sigma=a.sedrate_logn_sigma,
+            model=a.bad_model,
+            sedrate_corr_m=a.sedrate_corr_m,
+            draws=a.bad_draws,
+            tune=a.bad_tune,
+            seed=a.seed,
+            target_accept=a.target_accept,
+            outdir=a.outdir,
+            sampler=a.sampler,
+            adaptive=_adaptive_settings(a),
+            store=_store_settings(a),
+        )))
+    bad = _run_bad_points(bad_tasks, cores=cores, jobs=jobs)
+    print(f"Sweep BAD: {len(points)} grid point(s) in {time.perf_counter() - t0:.1f} s")
+
+    comparison, rows = [], []
+    for pid, a in points:
+        params = {p: getattr(a, p) for p in SWEEP_PARAMS}
+        out = bad[pid]["out"]
+        bea_df = bea[bea_keys[pid]]
+        comparison.append(pd.DataFrame(dict(
+            quantity="eruption_age", ash_id=bea_df["ash_id"].to_numpy(), depth_m=bea_df["depth_m"].to_numpy(float),
+            mean_ma=bea_df["e_mean"].to_numpy(float), hdi95_low_ma=bea_df["hdi95_low"].to_numpy(float),
+            hdi95_high_ma=bea_df["hdi95_high"].to_numpy(float),
+        )).assign(point_id=pid, **params))
+        tie = out.tie_summary
+        # tie_summary 与 bea_df 都按深度稳定排序（见 bad.sort_tiepoints），逐行对应同一个 ash
+        if not np.array_equal(tie["depth_obs_m"].to_numpy(float), bea_df["depth_m"].to_numpy(float)):
+            raise RuntimeError(f"网格点 {pid}：BAD tie points 与 BEA 结果的深度顺序不一致")
+        comparison.append(pd.DataFrame(dict(
+            quantity="tie_age", ash_id=bea_df["ash_id"].to_numpy(), depth_m=tie["depth_obs_m"].to_numpy(float),
+            mean_ma=tie["age_model_mean_ma"].to_numpy(float),
+            hdi95_low_ma=tie["age_model_hdi95_low_ma"].to_numpy(float),
+            hdi95_high_ma=tie["age_model_hdi95_high_ma"].to_numpy(float),
+        )).assign(point_id=pid, **params))
+        q = out.query_summary
+        comparison.append(pd.DataFrame(dict(
+            quantity="query_age", ash_id="", depth_m=q["depth_m"].to_numpy(float),
+            mean_ma=q["age_mean_ma"].to_numpy(float), hdi95_low_ma=q["age_hdi95_low_ma"].to_numpy(float),
+            hdi95_high_ma=q["age_hdi95_high_ma"].to_numpy(float),
+        )).assign(point_id=pid, **params))
+        st = out.stats
+        rows.append(dict(
+            point_id=pid, **params,
+            bad_divergences=st.divergences if st else None,
+            bad_rhat_max=st.rhat_max if st else None,
+            bad_ess_bulk_min=st.ess_bulk_min if st else None,
+            bad_wall_s=bad[pid]["wall_s"],
+            outdir=a.outdir,
+        ))
+
+    cols = ["point_id", *SWEEP_PARAMS, "quantity", "ash_id", "depth_m", "mean_ma", "hdi95_low_ma", "hdi95_high_ma"]
+    return pd.concat(comparison, ignore_index=True)[cols], pd.DataFrame(rows)
+
+
+def _labels(points_df: pd.DataFrame) -> Dict[str, str]:
+    """图例：只列出网格点之间取值不同的超参数。"""
+    varied = [p for p in SWEEP_PARAMS if points_df[p].nunique() > 1] or list(SWEEP_PARAMS[:1])
+    return {
+        r["point_id"]: ", ".join(f"{p}={r[p]:g}" if isinstance(r[p], float) else f"{p}={r[p]}" for p in varied)
+        for r in points_df.to_dict(orient="records")
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    from .cli import add_pipeline_options
+    from .plot import plot_sweep
+
+    ap = argparse.ArgumentParser("bea_bad sweep")
+    ap.add_argument("--zircon", required=True, help="zircon table (same formats as the main pipeline)")
+    ap.add_argument("--tiepoints", required=True, help="tiepoints table")
+    ap.add_argument("--query", default=None, help="query_depths.csv (depth_m). optional")
+    ap.add_argument("--outdir", default="sweep_out", help="per-point outputs go to <outdir>/points/<point_id>")
+    grid = ap.add_mutually_exclusive_group(required=True)
+    grid.add_argument("--param", action="append", metavar="NAME=V1,V2,...",
+                      help=f"hyperparameter values to sweep (repeat; the grid is the cartesian product). "
+                           f"One of: {', '.join(SWEEP_PARAMS)}")
+    grid.add_argument("--grid", help="CSV/JSON with one grid point per row and one column per swept hyperparameter")
+    add_pipeline_options(ap, jobs_help="ashes / grid points fitted concurrently (default: cores // chains)")
+    args = ap.parse_args(argv)
+    if args.preview:
+        ap.error("--preview is not available for sweep; run `bea_bad --preview` once per setting instead")
+    compilecache.configure(args.compiledir)
+    if args.sampler != "pymc":
+        print(f"Note: --sampler {args.sampler} recompiles the BAD model for every grid point (no model reuse)")
+
+    table = parse_grid(args.param) if args.param else read_grid(args.grid)
+    points = grid_points(args, table, args.outdir)
+    ensure_dir(args.outdir)
+
+    t0 = time.perf_counter()
+    comparison, points_df = run_sweep(points, zircon=args.zircon, tiepoints=args.tiepoints, query=args.query,
+                                      outdir=args.outdir, cores=args.cores, jobs=args.jobs)
+    comparison_path = os.path.join(args.outdir, "sweep_comparison.csv")
+    points_path = os.path.join(args.outdir, "sweep_points.csv")
+    comparison.to_csv(comparison_path, index=False)
+    points_df.to_csv(points_path, index=False)
+
+    labels = _labels(points_df)
+    query = comparison[comparison["quantity"] == "query_age"].rename(columns={
+        "mean_ma": "age_mean_ma", "hdi95_low_ma": "age_hdi95_low_ma", "hdi95_high_ma": "age_hdi95_high_ma"
+    })
+    fig_path = plot_sweep(
+        {labels[pid]: g for pid, g in query.groupby("point_id", sort=False)},
+        {labels[r["point_id"]]: pd.read_csv(os.path.join(r["outdir"], "tiepoint_summary.csv"))
+         for r in points_df.to_dict(orient="records")},
+        os.path.join(args.outdir, "sweep_age_depth.png"),
+    )
+
+    print(f"Sweep done: {len(points_df)} grid points in {time.perf_counter() - t0:.1f} s")
+    print("Comparison table:", comparison_path)
+    print("Grid points:", points_path)
+    print("Figure:", fig_path)
+
+
+if __name__ == "__main__":
+    main()
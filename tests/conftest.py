@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def example_ashes():
+    """示例数据（zircon_depthdown.csv + tiepoints_depthdown.csv）中的 {ash_id: (ages, sigmas)}。"""
+    from bea_bad.dataio import read_inputs
+
+    data = read_inputs(
+        os.path.join(ROOT, "zircon_depthdown.csv"), os.path.join(ROOT, "tiepoints_depthdown.csv")
+    )
+    return {ash: (ages, sigmas) for ash, ages, sigmas in data.iter_ashes()}
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytensor
+import pytest
+from pytensor.gradient import jacobian
+
+from bea_bad.bad import (
+    _piecewise_age_draws, _piecewise_age_one_draw, build_bad_model, scalable_inputs, summarize_query_ages
+)
+from bea_bad.bad_model import ReusableBADModel
+from bea_bad.utils import hdi_along_axis0
+
+HYPER = dict(depth_sigma_m=0.5, sedrate_logn_mu=np.log(0.1), sedrate_logn_sigma=0.8)
+
+
+def _draws(S=200, K=6, seed=0):
+    rng = np.random.default_rng(seed)
+    d_tie = np.sort(rng.uniform(0.0, 50.0, size=(S, K)), axis=1)
+    age0 = 250.0 + rng.normal(0.0, 0.1, size=S)
+    rates = rng.lognormal(np.log(0.05), 0.5, size=(S, K - 1))
+    return d_tie, age0, rates
+
+
+def test_piecewise_age_draws_matches_one_draw():
+    d_tie, age0, rates = _draws()
+    # 包括第一个 tie 之上、最后一个 tie 之下以及正好落在 tie 上的深度
+    q = np.concatenate([[-10.0, 0.0, 60.0], d_tie[0], np.linspace(0.0, 50.0, 37)])
+    got = _piecewise_age_draws(d_tie, age0, rates, q)
+    assert got.shape == (d_tie.shape[0], q.size)
+    for s in range(d_tie.shape[0]):
+        np.testing.assert_allclose(got[s], _piecewise_age_one_draw(d_tie[s], age0[s], rates[s], q), rtol=1e-12)
+
+
+def test_chunked_summary_matches_single_pass():
+    d_tie, age0, rates = _draws()
+    q = np.linspace(-20.0, 70.0, 41)
+    one = summarize_query_ages(d_tie, age0, rates, q)
+    # 每块只有 2 列
+    chunked = summarize_query_ages(d_tie, age0, rates, q, max_chunk_bytes=2 * d_tie.shape[0] * 8 * 6)
+    assert list(one.columns) == [
+        "depth_m", "age_mean_ma", "age_hdi95_low_ma", "age_hdi95_high_ma", "age_eti95_low_ma", "age_eti95_high_ma"
+    ]
+    pd.testing.assert_frame_equal(chunked.reset_index(drop=True), one.reset_index(drop=True))
+
+    ages = np.stack([_piecewise_age_one_draw(d_tie[s], age0[s], rates[s], q) for s in range(d_tie.shape[0])])
+    np.testing.assert_allclose(one["age_mean_ma"], ages.mean(axis=0))
+    np.testing.assert_allclose(one["age_eti95_low_ma"], np.quantile(ages, 0.025, axis=0))
+    np.testing.assert_allclose(one["age_eti95_high_ma"], np.quantile(ages, 0.975, axis=0))
+    low, high = hdi_along_axis0(ages, 0.95)
+    np.testing.assert_allclose(one["age_hdi95_low_ma"], low)
+    np.testing.assert_allclose(one["age_hdi95_high_ma"], high)
+
+
+def _section(K, seed=0):
+    rng = np.random.default_rng(seed)
+    d = np.cumsum(rng.uniform(0.5, 2.0, size=K))
+    sd = rng.uniform(0.03, 0.08, size=K)
+    return d, 250.0 + 0.1 * d + sd * rng.standard_normal(K), sd
+
+
+def _ordered_logp_at(m, d_true, rates, age0):
+    """ordered 模型在 (d_true, rates, age0) 处不含变换 Jacobian 的 logp。"""
+    logp = m.compile_logp(jacobian=False)
+    return logp({
+        "d_true_ordered__": np.concatenate([d_true[:1], np.log(np.diff(d_true))]),
+        "rates_log__": np.log(rates), "age0": age0,
+    })
+
+
+def test_scalable_targets_same_posterior_as_ordered():
+    d, E, sd = _section(6)
+    mo = build_bad_model(d, E, sd, **HYPER)
+    ms = build_bad_model(d, E, sd, model="scalable", **HYPER)
+    dz, az = ms.rvs_to_values[ms["depth_z"]], ms.rvs_to_values[ms["age_z"]]
+    d_true, age_ties, rates, age0 = ms.replace_rvs_by_values([ms[k] for k in ("d_true", "age_ties", "rates", "age0")])
+    outs = [d_true, age_ties, rates, age0, jacobian(d_true, dz), jacobian(age_ties, az)]
+    f = pytensor.function([dz, az], outs)
+    logp_s = ms.compile_logp()
+
+    rng = np.random.default_rng(1)
+    diffs = []
+    for _ in range(10):
+        # 深度 sd 与间距同量级：部分点落在平滑累计最大值贴住前一项的区域
+        z_d, z_a = rng.standard_normal((2, d.size))
+        d_true, age_ties, rates, age0, jd, ja = f(z_d, z_a)
+        assert np.all(np.diff(d_true) > 0) and np.all(rates > 0)
+        # (d_true, age0, rates) → (d_true, age_ties) 的 Jacobian 为 Π seg_len，再换元到 (z_d, z_a)
+        target = (_ordered_logp_at(mo, d_true, rates, age0) - np.sum(np.log(np.diff(d_true)))
+                  + np.linalg.slogdet(jd)[1] + np.linalg.slogdet(ja)[1])
+        diffs.append(logp_s({"depth_z": z_d, "age_z": z_a}) - target)
+    # 两个密度只差一个常数（_soft_ordered 的 Jacobian 省略了与 z 无关的项）
+    assert np.ptp(diffs) < 1e-8
+
+
+def test_reusable_scalable_model_refits_with_new_window():
+    K = 5
+    rm = ReusableBADModel(K, model="scalable")
+    dense = _section(K, seed=2)
+    # 间距远大于平滑尺度：窗口宽度为 1
+    sparse = (np.arange(K) * 40.0, 250.0 + 4.0 * np.arange(K), np.full(K, 0.05))
+    hypers = [HYPER, dict(depth_sigma_m=0.03, sedrate_logn_mu=np.log(0.1), sedrate_logn_sigma=1.0)]
+    widths = [scalable_inputs(*s, **h)["depth_idx"].shape[1] for s, h in zip((dense, sparse), hypers)]
+    assert widths[0] > 1 and widths[1] == 1
+
+    rng = np.random.default_rng(3)
+    for (d, E, sd), h in zip((dense, sparse), hypers):
+        idata, _ = rm.sample(d, E, sd, draws=100, tune=100, chains=1, cores=1, progressbar=False, **h)
+        assert idata.posterior["age_ties"].shape[-1] == K
+
+        fresh = build_bad_model(d, E, sd, model="scalable", **h)
+        fns = [(m.compile_logp(), m.compile_dlogp()) for m in (rm.model, fresh)]
+        for _ in range(3):
+            p = {"depth_z": rng.standard_normal(K), "age_z": rng.standard_normal(K)}
+            (lp, dlp), (lp0, dlp0) = fns
+            np.testing.assert_allclose(lp(p), lp0(p), rtol=1e-7)
+            np.testing.assert_allclose(dlp(p), dlp0(p), rtol=1e-7, atol=1e-9)
+
+    with pytest.raises(ValueError, match="K=5"):
+        rm.set_inputs(*_section(K + 1), **HYPER)
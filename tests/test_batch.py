@@ -0,0 +1,60 @@
+import argparse
+
+import pandas as pd
+import pytest
+
+from bea_bad.batch import section_args
+from bea_bad.cli import PipelineConfig, add_pipeline_options, parse_option
+from bea_bad.sweep import grid_points
+
+
+@pytest.fixture
+def defaults():
+    ap = argparse.ArgumentParser()
+    add_pipeline_options(ap)
+    return ap.parse_args([])
+
+
+def test_parse_option_follows_pipeline_config_types():
+    assert parse_option("seed", "7") == 7
+    assert parse_option("depth_sigma_m", "0.05") == 0.05
+    assert parse_option("no_bootstrap_prior", "True") is True
+    assert parse_option("no_bootstrap_prior", "0") is False
+    assert parse_option("sheet", "Sheet2") == "Sheet2"
+    with pytest.raises(ValueError):
+        parse_option("bad_model", "spline")
+    with pytest.raises(ValueError):
+        parse_option("not_an_option", "1")
+
+
+def test_parser_defaults_match_pipeline_config(defaults):
+    cfg = PipelineConfig.from_namespace(argparse.Namespace(zircon="z", tiepoints="t", query=None, outdir="out",
+                                                           **vars(defaults)))
+    assert cfg == PipelineConfig(zircon="z", tiepoints="t")
+
+
+def test_section_args_overrides_and_rejects(defaults, tmp_path):
+    row = {"section_id": "S1", "zircon": "/z.csv", "tiepoints": "/t.csv", "seed": 3, "bea_engine": "grid",
+           "adaptive": "yes", "max_span_ma": float("nan")}
+    args = section_args(defaults, row, str(tmp_path))
+    assert (args.seed, args.bea_engine, args.adaptive, args.max_span_ma) == (3, "grid", True, defaults.max_span_ma)
+    assert args.outdir == str(tmp_path / "S1")
+    for bad in ({"jobs": 2}, {"manifest": "m.csv"}, {"sampler": "stan"}):
+        with pytest.raises(ValueError):
+            section_args(defaults, dict(row, **bad), str(tmp_path))
+
+
+def test_grid_points_types(defaults, tmp_path):
+    grid = pd.DataFrame({"depth_sigma_m": ["0.01", "0.1"], "bad_model": ["ordered", "scalable"]})
+    points = grid_points(defaults, grid, str(tmp_path))
+    assert [(p, a.depth_sigma_m, a.bad_model) for p, a in points] == [
+        ("p000", 0.01, "ordered"), ("p001", 0.1, "scalable")
+    ]
+
+
+@pytest.mark.parametrize("option", [{"bea_mode": "joint"}, {"resume": True}, {"cache_dir": "c"}])
+def test_grid_points_rejects_unsupported_options(defaults, tmp_path, option):
+    for k, v in option.items():
+        setattr(defaults, k, v)
+    with pytest.raises(ValueError, match=f"--{next(iter(option))}"):
+        grid_points(defaults, pd.DataFrame({"depth_sigma_m": ["0.01"]}), str(tmp_path))
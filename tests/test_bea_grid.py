@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.stats import norm
+
+from bea_bad.bea import BEAInputs
+from bea_bad.bea_grid import emg_logpdf, fit_bea_grid
+
+
+def test_emg_logpdf_moments():
+    mu, lam, sigma = 1.0, 4.0, 0.3
+    x = np.linspace(mu - 10 * sigma, mu + 30 / lam, 200_001)
+    p = np.exp(emg_logpdf(x, mu, lam, sigma))
+    dx = x[1] - x[0]
+    mean = np.sum(x * p) * dx
+    assert abs(np.sum(p) * dx - 1.0) < 1e-6
+    assert abs(mean - (mu + 1 / lam)) < 1e-6
+    assert abs(np.sum((x - mean) ** 2 * p) * dx - (sigma**2 + 1 / lam**2)) < 1e-6
+
+
+def test_grid_engine_matches_conjugate_normal_posterior():
+    # tau → 0 时 delta ≈ 0，Normal 先验下 E 的后验是共轭正态
+    rng = np.random.default_rng(3)
+    sigmas = rng.uniform(0.03, 0.08, size=12)
+    ages = 251.9 + sigmas * rng.standard_normal(12)
+    mu0, sd0 = 251.8, 0.2
+    inputs = BEAInputs(ages=ages, sigmas=sigmas, tau_scale=1e-6, grid=None, pdf=None, mu0=mu0, sd0=sd0)
+
+    prec = 1 / sd0**2 + np.sum(1 / sigmas**2)
+    mean = (mu0 / sd0**2 + np.sum(ages / sigmas**2)) / prec
+    sd = prec**-0.5
+
+    res = fit_bea_grid("synthetic", inputs)
+    assert res.n_used == 12
+    assert abs(res.e_mean - mean) < 0.01 * sd
+    assert abs(res.e_sd / sd - 1) < 0.01
+    half = norm.ppf(0.975) * sd
+    assert abs(res.hdi95_low - (mean - half)) < 0.05 * sd
+    assert abs(res.hdi95_high - (mean + half)) < 0.05 * sd
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from bea_bad.bea import fit_bea_for_ash
+
+SAMPLING = dict(draws=1000, tune=1000, chains=2, cores=1, seed=7, progressbar=False)
+
+
+@pytest.mark.parametrize("use_bootstrap_prior", [True, False])
+def test_reused_model_matches_fresh_fit(example_ashes, use_bootstrap_prior):
+    (other, (a0, s0)), (ash, (ages, sigmas)) = list(example_ashes.items())[:2]
+    kw = dict(use_bootstrap_prior=use_bootstrap_prior, **SAMPLING)
+
+    # 先用另一个 ash 跑一次，共享的 step 不再处于刚构建时的状态
+    fit_bea_for_ash(other, a0, s0, reuse_model=True, **kw)
+    reused = fit_bea_for_ash(ash, ages, sigmas, reuse_model=True, **kw)
+    fresh = fit_bea_for_ash(ash, ages, sigmas, reuse_model=False, **kw)
+
+    assert reused.n_used == fresh.n_used
+    assert abs(reused.e_mean - fresh.e_mean) < 0.3 * fresh.e_sd
+    assert 0.75 < reused.e_sd / fresh.e_sd < 1.33
+    assert np.isfinite([reused.hdi95_low, reused.hdi95_high]).all()
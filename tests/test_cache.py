@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from bea_bad.cache import ResultCache, bad_cache_key, bea_cache_key, hash_key
+
+SETTINGS = dict(draws=2000, tune=2000, target_accept=0.9, max_span_ma=1.0, use_bootstrap_prior=True)
+
+
+def _ash():
+    rng = np.random.default_rng(0)
+    return 251.0 + 0.1 * rng.random(10), np.full(10, 0.05)
+
+
+def test_bea_key_follows_inputs_and_settings():
+    ages, sigmas = _ash()
+    key = bea_cache_key("A", ages, sigmas, seed=1, settings=SETTINGS)
+    assert key == bea_cache_key("A", ages.copy(), sigmas.copy(), seed=1, settings=dict(reversed(SETTINGS.items())))
+    changed = [
+        bea_cache_key("B", ages, sigmas, seed=1, settings=SETTINGS),
+        bea_cache_key("A", ages, sigmas, seed=2, settings=SETTINGS),
+        bea_cache_key("A", ages, sigmas, seed=1, settings=dict(SETTINGS, draws=1000)),
+        bea_cache_key("A", ages, sigmas, seed=1, settings=dict(SETTINGS, target_accept=0.95)),
+        bea_cache_key("A", np.where(np.arange(10) == 3, ages + 1e-9, ages), sigmas, seed=1, settings=SETTINGS),
+        bea_cache_key("A", ages, sigmas * 1.01, seed=1, settings=SETTINGS),
+    ]
+    assert len({key, *changed}) == len(changed) + 1
+
+
+def test_bad_key_ignores_input_order_only():
+    d, E, sd, q = np.array([5.0, 15.0, 30.0]), np.array([250.2, 250.7, 251.4]), np.array([0.05, 0.04, 0.06]), \
+        np.array([0.0, 10.0, 20.0])
+    key = bad_cache_key(d, E, sd, q, seed=1, settings=SETTINGS)
+    order = [2, 0, 1]
+    assert key == bad_cache_key(d[order], E[order], sd[order], q[::-1], seed=1, settings=SETTINGS)
+    assert key == bad_cache_key(list(d), list(E), list(sd), list(q), seed=1, settings=dict(reversed(SETTINGS.items())))
+    changed = [
+        bad_cache_key(d, E, sd[[1, 0, 2]], q, seed=1, settings=SETTINGS),
+        bad_cache_key(d, E + [0, 0, 1e-6], sd, q, seed=1, settings=SETTINGS),
+        bad_cache_key(d, E, sd, np.append(q, 25.0), seed=1, settings=SETTINGS),
+        bad_cache_key(d, E, sd, q, seed=2, settings=SETTINGS),
+        bad_cache_key(d, E, sd, q, seed=1, settings=dict(SETTINGS, tune=500)),
+    ]
+    assert len({key, *changed}) == len(changed) + 1
+
+
+def test_hash_key_distinguishes_kind_and_types():
+    assert hash_key("bea", x=1) != hash_key("bad", x=1)
+    assert hash_key("bea", x=np.arange(3, dtype=float)) != hash_key("bea", x=np.arange(3))
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    src = tmp_path / "blob.bin"
+    src.write_bytes(b"\0" * 4000)
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=10_000)
+    for i, key in enumerate(("aa01", "bb02")):
+        os.utime(cache.put("bea", key, {"i": i}, files={"blob.bin": str(src)}), (i + 1, i + 1))
+    assert cache.get("bea", "aa01") is not None     # 刷新 aa01：bb02 变成最久未用
+
+    cache.put("bea", "cc03", {"i": 2}, files={"blob.bin": str(src)})
+    assert cache.get("bea", "bb02") is None
+    assert cache.get_json("bea", "aa01") == {"i": 0} and cache.get_json("bea", "cc03") == {"i": 2}
+    assert cache.size_bytes() <= 10_000
+
+    off = ResultCache(str(tmp_path / "off"), enabled=False)
+    assert off.put("bea", "aa01", {}) is None and off.get("bea", "aa01") is None
+    assert not (tmp_path / "off").exists()
@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+
+from bea_bad.cache import ResultCache
+from bea_bad.checkpoint import Checkpoint
+
+
+def _checkpoint(tmp_path, cache=None, resume=False):
+    return Checkpoint(str(tmp_path / "out"), inputs={"zircon": None}, settings={"seed": 1}, resume=resume,
+                      cache=cache)
+
+
+def _draws(tmp_path):
+    src = tmp_path / "draws.nc"
+    src.write_bytes(b"x" * 1000)
+    return {"bea_posterior.nc": str(src)}
+
+
+def test_entry_already_in_cache_is_stored_as_pointer(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    ckpt = _checkpoint(tmp_path, cache)
+    cache.put("bea", "ab12", {"e_mean": 1.0}, files=_draws(tmp_path))
+    ckpt.store.put("bea", "ab12", {"e_mean": 1.0}, files=_draws(tmp_path))
+
+    own = ckpt.store._entry_dir("bea", "ab12")
+    assert os.listdir(own) == ["result.json"]
+    assert ckpt.store.get("bea", "ab12") == cache.get("bea", "ab12")
+    assert ckpt.store.get_json("bea", "ab12") == {"e_mean": 1.0}
+
+    # 缓存条目被淘汰：指针失效，视为未命中
+    shutil.rmtree(cache.get("bea", "ab12"))
+    assert ckpt.store.get("bea", "ab12") is None
+
+
+def test_full_entry_without_cache_and_resume(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), enabled=False)
+    ckpt = _checkpoint(tmp_path, cache)
+    ckpt.store.put("bea", "cd34", {"e_mean": 2.0}, files=_draws(tmp_path))
+    assert sorted(os.listdir(ckpt.store.get("bea", "cd34"))) == ["bea_posterior.nc", "result.json"]
+
+    resumed = _checkpoint(tmp_path, cache, resume=True)
+    assert resumed.resumed
+    assert resumed.store.get_json("bea", "cd34") == {"e_mean": 2.0}
+
+
+def test_finish_removes_checkpoint(tmp_path):
+    ckpt = _checkpoint(tmp_path)
+    ckpt.mark_done("bea_cross_check")
+    with open(os.path.join(ckpt.root, "manifest.json")) as f:
+        assert json.load(f)["stages"]["bea_cross_check"]["done"]
+    ckpt.finish()
+    assert not os.path.exists(ckpt.root)
+    assert not _checkpoint(tmp_path, resume=True).resumed
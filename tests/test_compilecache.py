@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# configure 必须在导入 pytensor 之前调用：每个用例在新的解释器里运行
+CODE = """
+import json, os, sys
+from bea_bad import compilecache
+path = compilecache.configure(*sys.argv[1:])
+print(json.dumps([path, os.environ.get("PYTENSOR_FLAGS"), os.environ.get(compilecache.ENV),
+                  "pytensor" in sys.modules]))
+"""
+
+
+def _configure(tmp_path, *args, **env):
+    base = {k: v for k, v in os.environ.items() if k not in ("PYTENSOR_FLAGS", "BEA_BAD_COMPILEDIR")}
+    out = subprocess.run([sys.executable, "-c", CODE, *args], cwd=ROOT, capture_output=True, text=True, check=True,
+                         env=dict(base, HOME=str(tmp_path), **env))
+    return json.loads(out.stdout)
+
+
+def test_default_leaves_pytensor_alone(tmp_path):
+    path, flags, env, imported = _configure(tmp_path)
+    assert flags is None and env is None and not imported
+    if sys.platform != "win32":
+        assert path == str(tmp_path / ".pytensor")
+
+
+def test_explicit_directory_is_exported(tmp_path):
+    target = tmp_path / "cc"
+    path, flags, env, _ = _configure(tmp_path, str(target), PYTENSOR_FLAGS="floatX=float64,base_compiledir=/x")
+    assert path == env == str(target) and target.is_dir()
+    assert flags == f"floatX=float64,base_compiledir={target}"
+
+    path, flags, env, _ = _configure(tmp_path, BEA_BAD_COMPILEDIR=str(target))
+    assert path == str(target) and flags == f"base_compiledir={target}"
+
+
+def test_existing_pytensor_flag_is_respected(tmp_path):
+    target = tmp_path / "from_flags"
+    path, flags, _, _ = _configure(tmp_path, PYTENSOR_FLAGS=f"floatX=float64,base_compiledir={target}")
+    assert path == str(target)
+    assert flags == f"floatX=float64,base_compiledir={target}"
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bea_bad.dataio import read_inputs, read_tiepoints
+
+from conftest import ROOT
+
+ZIRCON = os.path.join(ROOT, "zircon_depthdown.csv")
+TIEPOINTS = os.path.join(ROOT, "tiepoints_depthdown.csv")
+
+
+def _assert_same_inputs(a, b):
+    pd.testing.assert_frame_equal(a.zircon, b.zircon)
+    ta, tb = (x.tiepoints.set_index("ash_id")["depth_m"].sort_index() for x in (a, b))
+    pd.testing.assert_series_equal(ta, tb)
+
+
+def _compilation(path):
+    """示例 CSV 改写成 dai_example.xlsx 的汇编表布局（2σ、向下为负的 depth）。"""
+    z = pd.read_csv(ZIRCON).merge(pd.read_csv(TIEPOINTS), on="ash_id")
+    parts = z["ash_id"].str.split(":", n=1, expand=True)
+    pd.DataFrame({
+        "section": parts[0], "ash_bed_id": parts[1], "zircon_id": z["zircon_id"],
+        "age_ma": z["age_ma"], "age_2sigma_ma": 2 * z["sigma_ma"], "depth": -z["depth_m"],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_compilation_sheet_gives_tiepoints(tmp_path):
+    path = _compilation(tmp_path / "compilation.csv")
+    t = read_tiepoints(path).set_index("ash_id")["depth_m"]
+    expected = pd.read_csv(TIEPOINTS).set_index("ash_id")["depth_m"]
+    pd.testing.assert_series_equal(t.sort_index(), expected.sort_index())
+    _assert_same_inputs(read_inputs(path, path), read_inputs(ZIRCON, TIEPOINTS))
+
+
+def test_compilation_sheet_rejects_inconsistent_depths(tmp_path):
+    path = _compilation(tmp_path / "compilation.csv")
+    df = pd.read_csv(path)
+    df.loc[0, "depth"] -= 1.0
+    df.to_csv(path, index=False)
+    with pytest.raises(ValueError, match="不一致"):
+        read_tiepoints(path)
+
+
+def test_dai_example_xlsx():
+    pytest.importorskip("openpyxl")
+    path = os.path.join(ROOT, "dai_example.xlsx")
+    t = read_tiepoints(path).set_index("ash_id")["depth_m"]
+    expected = pd.read_csv(TIEPOINTS).set_index("ash_id")["depth_m"]
+    pd.testing.assert_series_equal(t.sort_index(), expected.sort_index())
+
+    data = read_inputs(path, path)
+    ref = read_inputs(ZIRCON, TIEPOINTS)
+    assert len(data.zircon) == len(ref.zircon)
+    for (a, x, s), (b, y, r) in zip(data.iter_ashes(), ref.iter_ashes()):
+        assert a == b
+        np.testing.assert_allclose(np.sort(x), np.sort(y))
+        np.testing.assert_allclose(np.sort(s), np.sort(r), rtol=1e-6)
+
+
+def test_parquet_inputs_match_csv(tmp_path):
+    pytest.importorskip("pyarrow")
+    z, t = tmp_path / "zircon.parquet", tmp_path / "tiepoints.parquet"
+    pd.read_csv(ZIRCON).to_parquet(z, row_group_size=7)
+    pd.read_csv(TIEPOINTS).to_parquet(t)
+    _assert_same_inputs(read_inputs(str(z), str(t)), read_inputs(ZIRCON, TIEPOINTS))
@@ -0,0 +1,61 @@
+import os
+
+import arviz as az
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from bea_bad.bad import summarize_draws
+from bea_bad.plot import main, plot_section_qa, render_sections
+from bea_bad.store import write_bea_draws, write_idata
+
+ASHES = ["A", "B", "C"]
+
+
+def _section(path, *, with_bea=True):
+    """合成剖面输出目录：tiepoint / query 汇总、bad_posterior.nc，可选 bea_posterior.nc。"""
+    os.makedirs(path)
+    rng = np.random.default_rng(0)
+    chains, draws, K = 2, 50, len(ASHES)
+    d_obs, E_obs, E_sd = np.array([5.0, 15.0, 30.0]), np.array([250.2, 250.7, 251.4]), np.full(K, 0.05)
+    d_true = d_obs + 0.03 * rng.standard_normal((chains, draws, K))
+    age0 = E_obs[0] + 0.05 * rng.standard_normal((chains, draws))
+    rates = rng.lognormal(np.log(0.05), 0.1, (chains, draws, K - 1))
+    tie, query = summarize_draws(d_true.reshape(-1, K), age0.ravel(), rates.reshape(-1, K - 1),
+                                 d_obs, E_obs, E_sd, np.linspace(0.0, 35.0, 36))
+    tie.to_csv(path / "tiepoint_summary.csv", index=False)
+    query.to_csv(path / "query_age_summary.csv", index=False)
+    write_idata(az.from_dict(posterior=dict(d_true=d_true, age0=age0, rates=rates)), str(path / "bad_posterior.nc"))
+    if with_bea:
+        write_bea_draws({a: xr.Dataset({"E": (("chain", "draw"), e + 0.05 * rng.standard_normal((chains, draws)))})
+                         for a, e in zip(ASHES, E_obs)}, str(path / "bea_posterior.nc"))
+    return path
+
+
+def test_section_qa_with_and_without_bea(tmp_path):
+    for name, with_bea in (("full", True), ("bad_only", False)):
+        section = _section(tmp_path / name, with_bea=with_bea)
+        paths = plot_section_qa(str(section), formats=("png", "svg"), max_curves=20)
+        assert paths == [str(section / "qa.png"), str(section / "qa.svg")]
+        assert all(os.path.getsize(p) > 0 for p in paths)
+
+
+def test_render_sections_reports_errors(tmp_path):
+    good = _section(tmp_path / "good")
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    out = render_sections([str(good), str(broken)], str(tmp_path / "figs"), jobs=1)
+    assert out[0]["error"] == "" and out[0]["paths"] == [str(tmp_path / "figs" / "good.png")]
+    assert out[1]["paths"] == [] and "tiepoint_summary.csv" in out[1]["error"]
+
+
+def test_main_batch_plots_ok_sections(tmp_path, capsys):
+    good = _section(tmp_path / "S1", with_bea=False)
+    (tmp_path / "S2").mkdir()
+    pd.DataFrame({"section_id": ["S1", "S2", "S3"], "status": ["ok", "ok", "failed"],
+                  "outdir": [str(good), str(tmp_path / "S2"), str(tmp_path / "S3")]}) \
+        .to_csv(tmp_path / "batch_summary.csv", index=False)
+    main(["--batch", str(tmp_path), "--jobs", "1", "--max_curves", "10"])
+    assert (good / "qa.png").exists()
+    printed = capsys.readouterr().out
+    assert "1/2 sections" in printed and "S2: FAILED" in printed
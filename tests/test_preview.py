@@ -0,0 +1,56 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from bea_bad.bad import _tie_age_draws
+from bea_bad.cli import add_pipeline_options
+from bea_bad.preview import preview_bad, run_preview
+
+
+def _pools(means, sd=0.05, P=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.asarray(means)[None, :] + sd * rng.standard_normal((P, len(means)))
+
+
+def _args(outdir):
+    ap = argparse.ArgumentParser()
+    add_pipeline_options(ap)
+    return ap.parse_args([], argparse.Namespace(
+        zircon=os.path.join(ROOT, "zircon_depthdown.csv"), tiepoints=os.path.join(ROOT, "tiepoints_depthdown.csv"),
+        query=None, outdir=str(outdir), preview=True,
+    ))
+
+
+def test_reversed_section_names_the_pairs():
+    # 年龄随深度递减：每个提议都不单调
+    pools = _pools([252.0, 251.5, 251.0], sd=0.01)
+    with pytest.raises(ValueError, match="A/B, B/C"):
+        preview_bad(np.array([1.0, 2.0, 3.0]), pools, max_proposals=5000, labels=["A", "B", "C"])
+
+
+def test_monotonic_section_matches_tie_means():
+    means = np.array([250.0, 250.5, 251.0, 251.5])
+    res = preview_bad(np.array([0.0, 10.0, 20.0, 30.0]), _pools(means), seed=1)
+    assert res.ess > 200 and 0 < res.acceptance <= 1
+    assert np.all(res.rates > 0) and np.all(np.diff(res.d_true, axis=1) > 0)
+    ages = _tie_age_draws(res.d_true, res.age0, res.rates)
+    assert np.all(np.diff(ages, axis=1) > 0)
+    np.testing.assert_allclose(ages.mean(axis=0), means, atol=0.05)
+    assert np.all(res.p_reversed < 0.01)
+
+
+def test_run_preview_writes_outputs(tmp_path):
+    run_preview(_args(tmp_path))
+    for name in ("bea_eruption_age_summary.csv", "tiepoint_summary.csv", "query_age_summary.csv",
+                 "age_depth_model.png", "run_report.json"):
+        assert (tmp_path / name).exists()
+
+
+def test_run_preview_keeps_full_results(tmp_path):
+    (tmp_path / "bad_posterior.nc").write_bytes(b"")
+    with pytest.raises(ValueError, match="已有完整运行"):
+        run_preview(_args(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["bad_posterior.nc"]
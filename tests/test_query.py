@@ -0,0 +1,62 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from bea_bad.query import AgeModel, make_http_server
+
+
+def _model(cache_size=4):
+    rng = np.random.default_rng(0)
+    n, K = 200, 4
+    d_tie = np.sort(rng.uniform(0.0, 40.0, size=(n, K)), axis=1)
+    rates = rng.lognormal(np.log(0.05), 0.2, size=(n, K - 1))
+    return AgeModel(d_tie, 250.0 + rng.normal(0.0, 0.05, n), rates, cache_size=cache_size)
+
+
+def test_ages_and_depths_round_trip():
+    m = _model()
+    age = m.ages([12.0, 25.0], draws=True)
+    depth = m.depths(age[:, 0], draws=True)
+    np.testing.assert_allclose(np.diag(depth), 12.0)
+
+
+def test_lru_cache_is_thread_safe_and_bounded():
+    m = _model(cache_size=4)
+    queries = [[float(d)] for d in np.linspace(5.0, 35.0, 16)] * 8
+    with ThreadPoolExecutor(8) as pool:
+        rows = list(pool.map(lambda q: m.ages(q)["age_mean_ma"].iloc[0], queries))
+    expected = [m.ages(q)["age_mean_ma"].iloc[0] for q in queries]
+    assert rows == expected
+    assert len(m._cache) <= 4
+
+
+@pytest.fixture
+def http_url():
+    server = make_http_server(_model(), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as r:
+            return r.status, json.load(r)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_http_get_answers_and_rejects_bad_numbers(http_url):
+    code, body = _get(f"{http_url}/age?depth=12,25")
+    assert code == 200 and [r["depth_m"] for r in body["rows"]] == [12.0, 25.0]
+    code, body = _get(f"{http_url}/age?depth=abc")
+    assert code == 400 and "abc" in body["error"]
+    code, body = _get(f"{http_url}/depth?age=251.0,x")
+    assert code == 400
+    assert _get(f"{http_url}/nowhere")[0] == 404
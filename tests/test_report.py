@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+from bea_bad.report import RunReport
+
+
+def test_run_report_flags_use_configured_thresholds():
+    stats = SimpleNamespace(row=lambda: {"divergences": 0, "rhat_max": 1.02, "ess_bulk_min": 300.0,
+                                         "ess_tail_min": 500.0})
+    res = SimpleNamespace(ash_id="A", n_used=5, timings={"wall_s": 1.0}, stats=stats)
+
+    strict = RunReport()
+    strict.add_bea([res])
+    assert strict.bea[0]["flags"] == ["rhat", "low_ess"]
+
+    loose = RunReport(rhat_max=1.05, ess_min=200.0)
+    loose.add_bea([res])
+    assert loose.bea[0]["flags"] == []
+    assert loose.to_dict()["thresholds"] == {"rhat_max": 1.05, "ess_min": 200.0}
@@ -0,0 +1,47 @@
+import numpy as np
+import pymc as pm
+from pymc.step_methods.hmc.quadpotential import QuadPotentialDiag
+
+from bea_bad.sampling import TuningState, _set_tuning_state, _tuning_state, run_sampler
+
+SAMPLING = dict(draws=100, chains=1, cores=1, seed=1, progressbar=False)
+
+
+def _model():
+    with pm.Model() as m:
+        pm.Normal("x", 1.0, 0.5)
+        pm.HalfNormal("s", 1.0)
+    return m
+
+
+def _warm(m):
+    return TuningState(step_size=0.9, mean={"x": [1.0], "s_log__": [-0.5]}, var={"x": [0.25], "s_log__": [0.4]},
+                       n_draws=400)
+
+
+def test_warm_start_uses_warm_tune_with_adaptive_potential():
+    m = _model()
+    step = pm.NUTS(model=m)
+    before = _tuning_state(step)
+    _, stats = run_sampler(m, tune=300, step=step, warm_start=_warm(m), warm_tune=50, **SAMPLING)
+    assert stats.tune == 50
+    # 采样结束后恢复 step 原来的调参初始值
+    assert all(np.all(a == b) for a, b in zip(_tuning_state(step), before))
+
+
+def test_potential_without_tuning_state_falls_back_to_cold_tune():
+    m = _model()
+    step = pm.NUTS(model=m, potential=QuadPotentialDiag(np.ones(2)))
+    assert _tuning_state(step) is None
+    assert not _set_tuning_state(step, (np.zeros(2), np.ones(2), 10, 0.5))
+
+    _, stats = run_sampler(m, tune=300, step=step, warm_start=_warm(m), warm_tune=50, **SAMPLING)
+    assert stats.tune == 300
+
+
+def test_partial_warm_start_keeps_full_tune():
+    m = _model()
+    step = pm.NUTS(model=m)
+    ws = TuningState(step_size=0.9, mean={"x": [1.0]}, var={"x": [0.25]}, n_draws=400)
+    _, stats = run_sampler(m, tune=300, step=step, warm_start=ws, warm_tune=50, **SAMPLING)
+    assert stats.tune == 300
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from bea_bad.sbc import SBCPrior, main, simulate_bad
+
+
+def test_simulated_sections_are_ordered():
+    sims = simulate_bad(SBCPrior(n_ties=4), 50, np.random.default_rng(0))
+    assert np.all(np.diff(sims["d_obs"], axis=1) > 0)
+    assert np.all(np.diff(sims["age_ties"], axis=1) > 0)
+
+
+def test_sbc_smoke(tmp_path):
+    main(["--models", "bea", "bad", "--bea_engines", "grid", "--n_sims", "2", "--n_ties", "3",
+          "--bad_draws", "60", "--bad_tune", "60", "--n_rank", "20", "--jobs", "1", "--outdir", str(tmp_path)])
+
+    fits = pd.read_csv(tmp_path / "sbc_fits.csv")
+    assert set(fits["model"]) == {"bea", "bad"}
+    assert set(fits.loc[fits["model"] == "bea", "param"]) == {"E", "tau"}
+    # 每个模拟：age0 + 2 个 rates + 3 个 d_true + 3 个 age_ties
+    assert (fits["model"] == "bad").sum() == 2 * 9
+    assert fits["rank"].between(0, fits["n_rank"]).all() and (fits["n_rank"] <= 20).all()
+    assert fits["pit"].between(0.0, 1.0).all()
+
+    summary = pd.read_csv(tmp_path / "sbc_summary.csv")
+    assert summary["coverage95"].between(0.0, 1.0).all()
+    with open(tmp_path / "sbc_report.json", encoding="utf-8") as f:
+        report = json.load(f)
+    assert [(t["model"], t["n_fits"]) for t in report["throughput"]] == [("bea", 2), ("bad", 2)]
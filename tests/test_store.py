@@ -0,0 +1,59 @@
+import arviz as az
+import numpy as np
+import pytest
+import xarray as xr
+
+from bea_bad.store import (
+    StoreSettings, bea_group, list_bea_ashes, load_bea_draws, read_draws, write_bea_draws, write_idata
+)
+
+CHAINS, DRAWS = 2, 300
+
+
+def _idata():
+    rng = np.random.default_rng(0)
+    return az.from_dict(
+        posterior=dict(age0=251.0 + 0.05 * rng.standard_normal((CHAINS, DRAWS)),
+                       rates=rng.lognormal(np.log(0.05), 0.3, (CHAINS, DRAWS, 3))),
+        sample_stats=dict(diverging=np.zeros((CHAINS, DRAWS), dtype=bool)),
+    )
+
+
+@pytest.mark.parametrize("settings", [
+    StoreSettings(), StoreSettings(float32=True), StoreSettings(thin=7),
+    StoreSettings(float32=True, thin=4, chunk_draws=50),
+])
+def test_idata_round_trip(tmp_path, settings):
+    idata = _idata()
+    path = write_idata(idata, str(tmp_path / "bad_posterior.nc"), settings)
+    kept = -(-DRAWS // settings.thin)
+    dtype = np.float32 if settings.float32 else np.float64
+    rtol = 1e-6 if settings.float32 else 0.0
+
+    for var in ("age0", "rates"):
+        full = idata.posterior[var].values[:, ::settings.thin]
+        got = read_draws(path, var)
+        assert got.shape == (CHAINS * kept,) + full.shape[2:] and got.dtype == dtype
+        np.testing.assert_allclose(got, full.reshape(got.shape), rtol=rtol)
+    # 按 draw / chain 切片只读一段
+    part = read_draws(path, "rates", draws=slice(2, 5), chains=slice(1, 2))
+    np.testing.assert_allclose(part, idata.posterior["rates"].values[1, ::settings.thin][2:5], rtol=rtol)
+
+    back = az.from_netcdf(path)
+    assert back.sample_stats["diverging"].dtype == bool
+    assert back.posterior.sizes["draw"] == kept
+
+
+def test_bea_draws_round_trip(tmp_path):
+    rng = np.random.default_rng(1)
+    posteriors = {a: xr.Dataset({"E": (("chain", "draw"), 251.0 + rng.standard_normal((CHAINS, DRAWS))),
+                                 "delta": (("chain", "draw", "grain"), rng.exponential(size=(CHAINS, DRAWS, n)))})
+                  for a, n in (("Gujiao:GJ-ASH-10", 5), ("ash/with slash", 8))}
+    path = write_bea_draws(posteriors, str(tmp_path / "bea_posterior.nc"), StoreSettings(float32=True, thin=3))
+    assert sorted(list_bea_ashes(path)) == sorted(posteriors)
+    for a, ds in posteriors.items():
+        E = read_draws(path, "E", group=bea_group(a))
+        assert E.shape == (CHAINS * DRAWS // 3,) and E.dtype == np.float32
+        np.testing.assert_allclose(E, ds["E"].values[:, ::3].ravel(), rtol=1e-6)
+        loaded = load_bea_draws(path, a)
+        assert loaded.attrs["ash_id"] == a and loaded["delta"].shape == (CHAINS, DRAWS // 3, ds.sizes["grain"])
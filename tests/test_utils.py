@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from scipy.stats import gaussian_kde
+
+from bea_bad.bea import KDE_GRID_SIZE
+from bea_bad.utils import binned_kde_on_grid, bootstrap_min_samples, select_grains
+
+
+def test_binned_kde_matches_gaussian_kde_on_example_ashes(example_ashes):
+    for ash, (ages, sigmas) in example_ashes.items():
+        ages, sigmas = select_grains(ages, sigmas)
+        if ages.size < 2:
+            continue
+        # 与 prepare_bea_inputs 相同的 bootstrap min 样本与先验网格
+        grid = np.linspace(ages.min() - 1.0, ages.min() + 0.5, KDE_GRID_SIZE)
+        mins = bootstrap_min_samples(ages, sigmas, n_boot=6000, seed=42)
+
+        exact = gaussian_kde(mins)(grid)
+        fast = binned_kde_on_grid(mins, grid)
+        assert np.max(np.abs(fast - exact)) <= 1e-4 * exact.max(), ash
+
+
+def test_binned_kde_narrow_bandwidth_falls_back_to_gaussian_kde():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0.0, 1e-3, size=500)
+    grid = np.linspace(-1.0, 1.0, 101)
+    np.testing.assert_allclose(binned_kde_on_grid(x, grid), gaussian_kde(x)(grid))
+
+
+def test_binned_kde_rejects_constant_samples():
+    with pytest.raises(ValueError):
+        binned_kde_on_grid(np.ones(10), np.linspace(0.0, 2.0, 50))